@@ -1,43 +1,35 @@
 # Chain of Thought (CoT) Prompting
-from openai import OpenAI
+from common.llm_client import get_client
 from dotenv import load_dotenv
 import os
 import json
-import requests
 from pydantic import BaseModel, Field # used to strictly define the expected output format of the model.
 from typing import Optional # for optional fields in the output format
+from AiAgents.engine import AgentEngine # run from the repo root: python -m AiAgents.Agent
+from AiAgents.tools import weather_runtime
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
-def get_weather(city):
-    url = f"https://wttr.in/{city.lower()}?format=%C+%t"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        return f"The Weather in {city} is {response.text}"
-
-    else:
-        return "Something went wrong!"
-    
-available_tools = {
-    "get_weather": get_weather
-}
+# get_weather lives in tools.py now - pooled http connections, 10s timeout, results cached for 10 minutes
+available_tools = weather_runtime()
 
 '''
 what pydantic does is :- 
 '''
+class ToolCall(BaseModel):
+    TOOL: str = Field(..., description="The tool to call")
+    INPUT: Optional[str] = Field(None, description="The input to the tool")
+
 class MyOutputFormat(BaseModel):
     STEP: str = Field(..., description="The current step in the reasoning process")
     CONTENT: Optional[str] = Field(None, description="The content of the response or thought") # optional[str] means it can be str or None.. and the default is None Field(None, ..)
     TOOL: Optional[str] = Field(None, description="The tool being used, if applicable")
     INPUT: Optional[str] = Field(None, description="The input to the tool, if applicable")
     OUTPUT: Optional[str] = Field(None, description="The output from the tool, if applicable")
+    CALLS: Optional[list[ToolCall]] = Field(None, description="Several tool calls to run at once, if applicable")
 
 SYSTEM_PROMPT = '''
 you are a advanced AI model that excels answering user queries.
@@ -46,6 +38,8 @@ you will PLAN your response before answering. and then provide the final ansewer
 if there's a code snippet involved, structure it properly, readable format.
 You can also call a tool if required from available list of tools
 for every tool call wait for the observe step which is output for the called tool
+if you need several independent tool calls, put them all in one TOOL step as "CALLS": [{{"TOOL": ..., "INPUT": ...}}, ...]
+they run at the same time and the observe step has one entry per call in "OUTPUTS"
 
 rules:
 - strictly respond in the following format:
@@ -107,40 +101,8 @@ Assistant: {{
 }}
 '''
 user_prompt = input("👉")
-message_history = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": user_prompt}
-    ]
-while True:
-    response = client.chat.completions.parse(
-        model="gemini-2.5-flash",
-        response_format=MyOutputFormat,
-        messages=message_history
-    )
-
-    raw_response = response.choices[0].message.content
-    message_history.append({"role": "assistant", "content": raw_response})
-
-    parsed_results = json.loads(raw_response)
-
-    if parsed_results.get("STEP") == "START":
-        print("🔥", parsed_results.get("CONTENT"))
-        continue
-    if parsed_results.get("STEP") == "PLAN":
-        print("🧠", parsed_results.get("CONTENT"))
-        continue
-    if parsed_results.get("STEP") == "TOOL":
-        res = available_tools.get(parsed_results.get("TOOL"))(parsed_results.get("INPUT"))
-        message_history.append({
-            "role": "user",
-            "content": f'''{{
-            "STEP": "OBSERVE",
-            "TOOL": "{parsed_results.get("TOOL")}",
-            "OUTPUT": "{res}"
-            }}'''
-        })
-        continue
-
-    if parsed_results.get("STEP") == "OUTPUT":
-        print("🤖", parsed_results.get("CONTENT"))
-        break
+
+# the START / PLAN / TOOL / OBSERVE / OUTPUT loop lives in engine.py now, with a token-bounded history
+agent = AgentEngine(client, SYSTEM_PROMPT, tools=available_tools, response_format=MyOutputFormat)
+agent.run(user_prompt)
+print("📊", agent.report())
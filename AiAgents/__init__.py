@@ -0,0 +1 @@
+# AiAgents package - the agent engine shared by the agent scripts and prompts/cotAutomated.py
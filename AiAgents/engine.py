@@ -0,0 +1,175 @@
+import json
+from functools import lru_cache
+
+import tiktoken
+
+'''
+agent engine - the START / PLAN / TOOL / OBSERVE / OUTPUT loop from Agent.py and
+prompts/cotAutomated.py, importable and with a bounded message history.
+
+the old loop appended every step to message_history and re-sent the whole list each iteration,
+so step n sends n messages -> total tokens grow quadratically with the number of steps.
+
+here every request is built from:
+- the system prompt + the user query   - always verbatim
+- a summary of older steps             - one short line per step (PLAN: ..., get_weather(goa) -> ...)
+- the last keep_recent step messages   - verbatim
+and the whole thing is kept under max_history_tokens (oldest summary lines go first, then recent
+messages are moved into the summary). so every request costs about the same -> linear total.
+
+every step records the prompt tokens it sent, see engine.step_tokens / engine.report().
+
+tools is either a plain {name: function} dict or a ToolRuntime (tools.py). a TOOL step can ask for
+several calls at once with "CALLS": [{"TOOL": ..., "INPUT": ...}, ...], the runtime runs them concurrently.
+'''
+
+SUMMARY_CHARS = 160  # per summarized step
+
+
+@lru_cache(maxsize=1)
+def encoding():
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def count_tokens(messages):
+    # ~4 tokens of chat formatting overhead per message, same estimate as the openai cookbook
+    return sum(len(encoding().encode(message["content"])) + 4 for message in messages)
+
+
+def shorten(text, limit=SUMMARY_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def summarize_step(message):
+    # one line per step, keeps what was decided / observed but not the full text
+    try:
+        step = json.loads(message["content"])
+    except (TypeError, ValueError):
+        return f"{message['role']}: {shorten(message['content'])}"
+    if not isinstance(step, dict):
+        return f"{message['role']}: {shorten(message['content'])}"
+    if step.get("STEP") == "TOOL":
+        calls = step.get("CALLS") or [step]
+        return "TOOL: " + ", ".join(f"{call.get('TOOL')}({call.get('INPUT')})" for call in calls)
+    if step.get("STEP") == "OBSERVE":
+        outputs = step.get("OUTPUTS") or [step]
+        return "OBSERVE: " + ", ".join(f"{output.get('TOOL')} -> {shorten(output.get('OUTPUT'))}" for output in outputs)
+    return f"{step.get('STEP')}: {shorten(step.get('CONTENT'))}"
+
+
+class HistoryPolicy:
+    def __init__(self, max_history_tokens=2000, keep_recent=6):
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent = keep_recent
+
+    def build(self, head, steps):
+        # head: system prompt + user query, steps: every message since -> the messages to send
+        keep = min(self.keep_recent, len(steps))
+        while True:
+            recent = steps[len(steps) - keep:]
+            summary_lines = [summarize_step(message) for message in steps[:len(steps) - keep]]
+            while True:
+                messages = head + self.summary_message(summary_lines) + recent
+                if count_tokens(messages) <= self.max_history_tokens or not summary_lines:
+                    break
+                summary_lines.pop(0)  # the oldest steps are the first to go
+            if count_tokens(messages) <= self.max_history_tokens or keep <= 1:
+                return messages
+            keep -= 1
+
+    def summary_message(self, lines):
+        if not lines:
+            return []
+        return [{"role": "user", "content": "summary of your earlier steps:\n" + "\n".join(f"- {line}" for line in lines)}]
+
+
+class AgentEngine:
+    def __init__(self, client, system_prompt, tools=None, model="gemini-2.5-flash", response_format=None,
+                 history_policy=None, max_steps=30, verbose=True):
+        self.client = client
+        self.system_prompt = system_prompt
+        self.tools = tools or {}
+        self.model = model
+        # a pydantic model -> client.chat.completions.parse(), otherwise json mode
+        self.response_format = response_format
+        self.history_policy = history_policy or HistoryPolicy()
+        self.max_steps = max_steps
+        self.verbose = verbose
+        self.step_tokens = []  # per step: {"step", "prompt_tokens", "messages"}
+
+    def complete(self, messages):
+        if isinstance(self.response_format, type):
+            return self.client.chat.completions.parse(model=self.model, response_format=self.response_format, messages=messages)
+        return self.client.chat.completions.create(
+            model=self.model, response_format=self.response_format or {"type": "json_object"}, messages=messages
+        )
+
+    def call_tool(self, name, tool_input):
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"unknown tool {name!r}, available tools: {', '.join(self.tools)}"
+        return tool(tool_input)
+
+    def call_tools(self, calls):
+        if hasattr(self.tools, "run_many"):
+            return self.tools.run_many(calls)  # ToolRuntime - concurrent, cached, with timeouts
+        return [self.call_tool(name, tool_input) for name, tool_input in calls]
+
+    def log(self, icon, text):
+        if self.verbose:
+            print(icon, text)
+
+    def run(self, user_prompt):
+        head = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        steps = []
+        self.step_tokens = []
+
+        for step_number in range(1, self.max_steps + 1):
+            messages = self.history_policy.build(head, steps)
+            response = self.complete(messages)
+            # the api's own count when it reports one, our estimate otherwise
+            usage = getattr(response, "usage", None)
+            self.step_tokens.append({
+                "step": step_number,
+                "prompt_tokens": getattr(usage, "prompt_tokens", None) or count_tokens(messages),
+                "messages": len(messages),
+            })
+
+            raw_response = response.choices[0].message.content
+            steps.append({"role": "assistant", "content": raw_response})
+            parsed_results = json.loads(raw_response)
+
+            step = parsed_results.get("STEP")
+            if step == "START":
+                self.log("🔥", parsed_results.get("CONTENT"))
+            elif step == "PLAN":
+                self.log("🧠", parsed_results.get("CONTENT"))
+            elif step == "TOOL":
+                calls = [(call.get("TOOL"), call.get("INPUT")) for call in parsed_results.get("CALLS") or [parsed_results]]
+                outputs = self.call_tools(calls)
+                for (name, tool_input), output in zip(calls, outputs):
+                    self.log("🛠️", f"{name}({tool_input}) -> {output}")
+                if len(calls) == 1:
+                    observation = {"STEP": "OBSERVE", "TOOL": calls[0][0], "OUTPUT": outputs[0]}
+                else:
+                    observation = {"STEP": "OBSERVE", "OUTPUTS": [
+                        {"TOOL": name, "INPUT": tool_input, "OUTPUT": output} for (name, tool_input), output in zip(calls, outputs)
+                    ]}
+                steps.append({"role": "user", "content": json.dumps(observation)})
+            elif step == "OUTPUT":
+                self.log("🤖", parsed_results.get("CONTENT"))
+                return parsed_results.get("CONTENT")
+
+        raise RuntimeError(f"agent did not reach an OUTPUT step in {self.max_steps} steps")
+
+    def report(self):
+        tokens = [step["prompt_tokens"] for step in self.step_tokens]
+        return {
+            "steps": len(tokens),
+            "prompt_tokens": sum(tokens),
+            "max_step_tokens": max(tokens, default=0),
+        }
@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+import json
+import os
+import threading
+import time
+
+import httpx
+
+'''
+tool runtime for the agent engine (engine.py).
+
+before, every tool was a plain function in the available_tools dict: one tool per LLM round trip,
+a fresh requests.get() per call, no timeout and no connection reuse.
+
+the runtime gives the tools:
+- concurrency  - all the calls of one TOOL step run together on an asyncio loop (run_many)
+- pooled http  - one shared httpx.AsyncClient (keep-alive connections) passed to every tool
+- timeouts     - per tool, a call that takes too long becomes an error observation for the LLM
+- ttl cache    - per tool, get_weather("delhi") twice within ttl seconds only hits the network once.
+                 only successful outputs are cached - a tool reports a failure by raising, the LLM gets
+                 an error observation and the next call tries again
+
+the loop runs in a background thread, so the (sync) agent loop can just call run_many() and the
+http connections stay alive between steps.
+
+WEATHER_URL points get_weather at another server, e.g. a local stub instead of wttr.in.
+'''
+
+WEATHER_URL = os.getenv("WEATHER_URL", "https://wttr.in")
+
+
+class ToolRuntime:
+    def __init__(self, default_timeout=10.0, max_connections=20):
+        self.default_timeout = default_timeout
+        self.max_connections = max_connections
+        self.tools = {}  # name -> {"func", "timeout", "ttl"}
+        self.cache = {}  # (name, input) -> (expires at, output)
+        self.cache_hits = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="tool-runtime", daemon=True)
+        self.thread.start()
+        self.http = None  # created on the runtime's loop, httpx clients are bound to one loop
+
+    def tool(self, name=None, timeout=None, ttl=0):
+        # @runtime.tool(timeout=5, ttl=600) - async tools get (http, input), sync tools just (input)
+        def register(func):
+            self.tools[name or func.__name__] = {"func": func, "timeout": timeout or self.default_timeout, "ttl": ttl}
+            return func
+        return register
+
+    async def _call(self, name, tool_input):
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"unknown tool {name!r}, available tools: {', '.join(self.tools)}"
+
+        key = (name, json.dumps(tool_input, sort_keys=True))
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.cache_hits += 1
+            return cached[1]
+
+        if self.http is None:
+            self.http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=None,  # every tool has its own timeout, enforced below
+            )
+        func = tool["func"]
+        try:
+            if inspect.iscoroutinefunction(func):
+                call = func(self.http, tool_input)
+            else:
+                call = asyncio.to_thread(func, tool_input)
+            output = await asyncio.wait_for(call, tool["timeout"])
+        except asyncio.TimeoutError:
+            return f"{name} timed out after {tool['timeout']}s"
+        except Exception as error:
+            return f"{name} failed: {error!r}"
+
+        if tool["ttl"]:
+            self.cache[key] = (time.monotonic() + tool["ttl"], output)
+        return output
+
+    async def _call_many(self, calls):
+        return await asyncio.gather(*(self._call(name, tool_input) for name, tool_input in calls))
+
+    def run_many(self, calls):
+        # calls: [(tool name, input), ...] -> outputs in the same order, all run concurrently
+        return asyncio.run_coroutine_threadsafe(self._call_many(list(calls)), self.loop).result()
+
+    def run(self, name, tool_input):
+        return self.run_many([(name, tool_input)])[0]
+
+    def close(self):
+        if self.http is not None:
+            asyncio.run_coroutine_threadsafe(self.http.aclose(), self.loop).result()
+            self.http = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def get_weather(http, city):
+    response = await http.get(f"{WEATHER_URL}/{city.lower()}?format=%C+%t")
+
+    if response.status_code != 200:
+        # raised, not returned - a transient upstream error must not sit in the cache for the whole ttl
+        raise RuntimeError(f"Something went wrong! weather service answered {response.status_code}")
+    return f"The Weather in {city} is {response.text}"
+
+
+def weather_runtime(ttl=600, timeout=10.0):
+    # the runtime Agent.py uses, weather doesn't change much in 10 minutes
+    runtime = ToolRuntime()
+    runtime.tool(timeout=timeout, ttl=ttl)(get_weather)
+    return runtime
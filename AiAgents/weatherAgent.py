@@ -1,4 +1,4 @@
-from openai import OpenAI
+from common.llm_client import get_client # run from the repo root: python -m AiAgents.weatherAgent
 from dotenv import load_dotenv
 import os
 import requests
@@ -7,10 +7,7 @@ load_dotenv()
 
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
 def get_weather(city):
     url = f"https://wttr.in/{city.lower()}?format=%C+%t"
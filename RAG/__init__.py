@@ -0,0 +1 @@
+# RAG package - indexing and retrieval helpers shared by RAG/ scripts and rag_queue
@@ -1,37 +1,35 @@
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-from langchain_qdrant import QdrantVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
-from openai import OpenAI
+from common.llm_client import get_client
+
+from .context import build_context
+from .embeddings import get_embedding_model
+from .vector_stores import connect_lexical_index, connect_vector_store, hybrid_search
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+# same pooled, rate limited client as the rag_queue worker
+client = get_client(api_key=API_KEY)
 
 
 # vector embeddings - using free local HuggingFace model (no API quota limits)
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+# shares its cache with the indexer, so popular queries skip the model
+embedding_model = get_embedding_model()
 
-vector_db = QdrantVectorStore.from_existing_collection(
-    embedding=embedding_model,
-    collection_name="learning-rag",
-    url="http://localhost:6333" # assuming Qdrant is running locally on default port
-)
+# Qdrant on localhost:6333 by default, VECTOR_STORE=local searches RAG/.index/ in-process instead
+vector_db = connect_vector_store(embedding_model)
+# bm25 index built next to the vectors by RAG/main.py, catches exact terms like api names
+lexical_index = connect_lexical_index()
 
 user_query = input("Search something: ")
 
-# perform similarity search - returns relevent chunks from the vector db
-search_results = vector_db.similarity_search(query=user_query)
+# perform hybrid search - dense similarity + bm25, fused into the 4 most relevent chunks
+search_results = hybrid_search(vector_db, lexical_index, [user_query], [embedding_model.embed_query(user_query)])[0]
 
-context = "\n\n\n".join(f"Page Content: {result.page_content}]\n Page Number: {result.metadata['page_label']}\nFile Location: {result.metadata['source']}"
- for result in search_results)
+# overlapping chunks of the same page are merged, and the whole context fits a token budget
+context = build_context(search_results)
 
 SYSTEM_PROMPT = f'''
 you are a helpful AI assistant. who answers user queries based on the provided context.
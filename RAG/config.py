@@ -0,0 +1,11 @@
+import os
+from pathlib import Path
+
+# shared settings for the indexing (RAG/main.py) and retrieval (RAG/chat.py, rag_queue) sides
+COLLECTION_NAME = os.getenv("RAG_COLLECTION", "learning-rag")  # the benchmarks use their own collection
+QDRANT_URL = "http://localhost:6333"  # assuming Qdrant is running locally on default port
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MAX_TOKENS = 256  # max_seq_length from the model's sentence_bert_config.json, longer texts get truncated
+
+# local state that lives next to the collection (manifests, caches ...), gitignored
+INDEX_DIR = Path(__file__).parent / ".index"
@@ -0,0 +1,106 @@
+import os
+from functools import lru_cache
+
+import tiktoken
+
+'''
+context packer - turns the retrieved chunks into the context part of the system prompt.
+
+neighbouring chunks of the same page overlap (the last sentences of a chunk start the next one,
+see splitter.py - or 400 of 1000 chars with the old character splitter). pasting every result as is
+sends that text to the LLM twice.
+
+here the results are:
+1. grouped by (source, page), the page's chunks put back in reading order (start_index)
+2. merged - the overlapping span at the start of a chunk is stripped, if it repeats the end of the previous one
+3. packed into a hard token budget (counted with tiktoken, see Basics/01_tokenization), most
+   relevant page first. the last page that doesn't fit is cut at a token boundary
+'''
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+SEPARATOR = "\n\n\n"
+MIN_OVERLAP = 20  # chars, shorter matches are probably just a coincidence
+MIN_PARTIAL_TOKENS = 50  # a cut page shorter than this isn't worth sending
+
+
+@lru_cache(maxsize=1)
+def encoding():
+    # loaded on first use, tiktoken downloads / reads the bpe file from its cache
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def count_tokens(text):
+    return len(encoding().encode(text))
+
+
+def overlap_length(previous, text):
+    # length of the longest suffix of previous that is also a prefix of text
+    head = text[:MIN_OVERLAP]
+    if len(head) < MIN_OVERLAP:
+        return 0
+    position = previous.find(head, max(0, len(previous) - len(text)))
+    while position != -1:
+        if text.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(head, position + 1)
+    return 0
+
+
+def merge_chunks(texts):
+    merged = texts[0]
+    for text in texts[1:]:
+        overlap = overlap_length(merged, text)
+        merged += text[overlap:] if overlap else "\n" + text
+    return merged
+
+
+def group_by_page(documents):
+    # (source, page) -> documents, pages ordered by their best ranked chunk
+    pages = {}
+    for document in documents:
+        key = (document.metadata.get("source"), document.metadata.get("page"))
+        chunks = pages.setdefault(key, [])
+        if all(chunk.page_content != document.page_content for chunk in chunks):
+            chunks.append(document)
+    for chunks in pages.values():
+        # reading order, chunks indexed before start_index existed keep their rank order
+        chunks.sort(key=lambda chunk: chunk.metadata.get("start_index", 0))
+    return list(pages.values())
+
+
+def format_page(chunks, content):
+    metadata = chunks[0].metadata
+    return f"Page Content: {content}]\n Page Number: {metadata.get('page_label')}\nFile Location: {metadata.get('source')}"
+
+
+def build_context(documents, max_tokens=CONTEXT_TOKEN_BUDGET):
+    blocks = []
+    used = 0
+    separator_tokens = count_tokens(SEPARATOR)
+    for chunks in group_by_page(documents):
+        content = merge_chunks([chunk.page_content for chunk in chunks])
+        block = format_page(chunks, content)
+        tokens = count_tokens(block) + (separator_tokens if blocks else 0)
+        if used + tokens <= max_tokens:
+            blocks.append(block)
+            used += tokens
+            continue
+
+        # doesn't fit - send the start of the page, if enough room is left for it to be useful
+        room = max_tokens - used - (separator_tokens if blocks else 0) - count_tokens(format_page(chunks, ""))
+        if room >= MIN_PARTIAL_TOKENS:
+            content_tokens = encoding().encode(content)[:room]
+            block = format_page(chunks, encoding().decode(content_tokens))
+            # bpe merges across the cut can differ a bit, shave tokens until the whole thing fits
+            while content_tokens and count_tokens(SEPARATOR.join([*blocks, block])) > max_tokens:
+                content_tokens = content_tokens[:-8]
+                block = format_page(chunks, encoding().decode(content_tokens))
+            if content_tokens:
+                blocks.append(block)
+        break
+
+    context = SEPARATOR.join(blocks)
+    while blocks and count_tokens(context) > max_tokens:
+        blocks.pop()  # token counts of the parts don't always add up exactly, the budget is a hard limit
+        context = SEPARATOR.join(blocks)
+    return context
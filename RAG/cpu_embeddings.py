@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import EMBEDDING_MAX_TOKENS, EMBEDDING_MODEL, INDEX_DIR
+
+'''
+cpu embedding backend for all-MiniLM-L6-v2, made for ingestion on cpu only nodes.
+
+HuggingFaceEmbeddings hands every batch to sentence-transformers as is, so a batch with one long
+chunk and 63 short ones gets all 64 padded to the long one - most of the matmuls are spent on
+padding. here:
+
+- length buckets  - every text is tokenized once, then the texts are sorted by token count and
+                    batched in that order, so a batch only holds texts of about the same length.
+                    each batch is padded to its own longest text, and a batch is cut early when
+                    batch size * length would go over max_batch_tokens (dynamic batching)
+- threads         - intra-op threads for torch / onnxruntime (EMBEDDING_THREADS, default: all cores)
+- onnx int8       - optional: the model exported to onnx once, weights dynamically quantized to int8
+                    and run with onnxruntime (RAG/.index/onnx/). int8 vectors are close to the float
+                    ones but not identical (the benchmark prints the cosine agreement), so they get
+                    their own embedding cache keys
+
+pooling is the same as the sentence-transformers pipeline of the model (mean over the attention
+mask, then L2 normalize, max 256 tokens), so the "torch" backend gives the same vectors as today.
+
+needs transformers + torch, and onnxruntime for backend="onnx":
+EMBEDDING_BACKEND=onnx python -m RAG.main
+python -m benchmarks.embeddings   # texts/sec per backend and batch size + cosine agreement
+'''
+
+MAX_SEQ_LENGTH = EMBEDDING_MAX_TOKENS
+ONNX_DIR = INDEX_DIR / "onnx"
+CPU_BACKENDS = ("torch", "onnx")
+
+
+def length_buckets(lengths, batch_size=64, max_batch_tokens=16384):
+    # -> batches of indices, texts of similar length together (longest first, so peak memory comes early)
+    order = np.argsort(lengths, kind="stable")[::-1]
+    batches, batch = [], []
+    for index in order:
+        # sorted longest first - the first text of a batch decides what it's padded to
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * lengths[batch[0]] > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(int(index))
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def pad_batch(token_ids, pad_id=0):
+    # dynamic padding - only up to the longest text of this batch
+    length = max(len(ids) for ids in token_ids)
+    input_ids = np.full((len(token_ids), length), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(token_ids), length), dtype=np.int64)
+    for row, ids in enumerate(token_ids):
+        input_ids[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+    return input_ids, attention_mask
+
+
+def mean_pool(hidden, attention_mask):
+    mask = attention_mask[..., None].astype(np.float32)
+    vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def export_onnx_int8(model_name=EMBEDDING_MODEL, directory=ONNX_DIR):
+    # one time: torch model -> onnx (dynamic batch / sequence axes) -> int8 weights. returns the int8 path
+    directory = directory / model_name.replace("/", "__")
+    int8_path = directory / "model_int8.onnx"
+    if int8_path.exists():
+        return int8_path
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    directory.mkdir(parents=True, exist_ok=True)
+    float_path = directory / "model.onnx"
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    inputs = ["input_ids", "attention_mask", "token_type_ids"]
+    torch.onnx.export(
+        model, tuple(sample[name] for name in inputs), str(float_path),
+        input_names=inputs, output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"} for name in inputs + ["last_hidden_state"]},
+        opset_version=17,
+    )
+    quantize_dynamic(str(float_path), str(int8_path), weight_type=QuantType.QInt8)
+    float_path.unlink()
+    return int8_path
+
+
+class CPUEmbeddings(Embeddings):
+    def __init__(self, model_name=EMBEDDING_MODEL, backend="torch", threads=None, batch_size=64,
+                 max_batch_tokens=16384, max_seq_length=MAX_SEQ_LENGTH):
+        if backend not in CPU_BACKENDS:
+            raise ValueError(f"unknown cpu embedding backend {backend!r}, expected one of {CPU_BACKENDS}")
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads or int(os.getenv("EMBEDDING_THREADS", 0)) or os.cpu_count()
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_seq_length = max_seq_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        if backend == "onnx":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.session = onnxruntime.InferenceSession(
+                str(export_onnx_int8(model_name)), options, providers=["CPUExecutionProvider"]
+            )
+            self.input_names = {node.name for node in self.session.get_inputs()}
+        else:
+            import torch
+            from transformers import AutoModel
+
+            torch.set_num_threads(self.threads)
+            self.model = AutoModel.from_pretrained(model_name).eval()
+
+    @property
+    def cache_name(self):
+        # int8 vectors are close to, but not the same as the float ones - they get their own cache keys
+        return f"{self.model_name}#onnx-int8" if self.backend == "onnx" else self.model_name
+
+    def forward(self, input_ids, attention_mask):
+        # -> last hidden state as a numpy array (batch, sequence, 384)
+        token_type_ids = np.zeros_like(input_ids)
+        if self.backend == "onnx":
+            feed = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+            return self.session.run(None, {name: value for name, value in feed.items() if name in self.input_names})[0]
+
+        import torch
+
+        with torch.inference_mode():
+            output = self.model(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask),
+                token_type_ids=torch.from_numpy(token_type_ids),
+            )
+        return output.last_hidden_state.numpy()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        # tokenized once, unpadded - the lengths decide the buckets
+        token_ids = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length)["input_ids"]
+        lengths = np.array([len(ids) for ids in token_ids])
+
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for batch in length_buckets(lengths, self.batch_size, self.max_batch_tokens):
+            input_ids, attention_mask = pad_batch([token_ids[index] for index in batch], self.tokenizer.pad_token_id or 0)
+            pooled = mean_pool(self.forward(input_ids, attention_mask), attention_mask)
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            vectors[batch] = pooled  # back in the original order
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from .config import EMBEDDING_MODEL, INDEX_DIR
+
+'''
+content addressed embedding cache.
+
+every vector is stored under sha256(model name + text), so the same chunk / query is only ever
+embedded once - no matter if it came from RAG/main.py, RAG/chat.py or the rag_queue worker.
+
+lookups go: in-memory LRU -> sqlite on disk -> the actual model (only for the misses).
+vectors are stored as raw float32 bytes, and the disk store evicts the least recently used
+rows once it grows past max_disk_entries.
+'''
+
+DEFAULT_CACHE_PATH = INDEX_DIR / "embeddings.sqlite3"
+SQLITE_BATCH = 500  # stay below sqlite's max number of "?" params per statement
+TOUCH_FLUSH = 10_000  # pending last_used updates written out even without an eviction pass
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, model, model_name, path=DEFAULT_CACHE_PATH, memory_size=10_000, max_disk_entries=1_000_000):
+        self.model = model
+        self.model_name = model_name
+        self.path = path
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._conn_pid = None
+        self._writes_since_evict = 0
+        self._touched = {}  # key -> last read, not written to sqlite yet
+
+    @property
+    def conn(self):
+        # sqlite connections must not be shared across fork(), so every process opens its own
+        if self.path is None:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def stats(self):
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+        }
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _load_from_disk(self, keys):
+        found = {}
+        conn = self.conn
+        if conn is None or not keys:
+            return found
+        for start in range(0, len(keys), SQLITE_BATCH):
+            batch = keys[start:start + SQLITE_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        # the rows we just read are touched in memory only - an UPDATE + commit per read would make
+        # every cache hit a wal write. written in bulk before the next eviction pass (flush_touched)
+        now = time.time()
+        for key in found:
+            self._touched[key] = now
+        if len(self._touched) >= TOUCH_FLUSH:
+            self.flush_touched()
+            conn.commit()
+        return found
+
+    def flush_touched(self):
+        # last_used of the rows read since the last flush, one executemany. the caller commits
+        if self._touched and self.conn is not None:
+            self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                  [(used, key) for key, used in self._touched.items()])
+        self._touched = {}
+
+    def _store_on_disk(self, items):
+        conn = self.conn
+        if conn is None or not items:
+            return
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+        )
+        self._writes_since_evict += len(items)
+        # counting rows on every write is slow, so only check the size limit every 1000 writes
+        if self._writes_since_evict >= 1000:
+            self._writes_since_evict = 0
+            self.flush_touched()  # so the rows that were read recently aren't the ones evicted
+            (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_disk_entries:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_disk_entries,),
+                )
+        conn.commit()
+
+    def _embed(self, texts, compute):
+        keys = [self.key(text) for text in texts]
+        vectors = {}
+
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    vectors[key] = self.memory[key]
+            self.hits += len(vectors)
+
+            missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+            from_disk = self._load_from_disk(missing)
+            self.disk_hits += len(from_disk)
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+                vectors[key] = vector
+
+        # the model runs outside the lock, only on unique texts that nobody has embedded yet
+        todo = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                todo.setdefault(key, text)
+        if todo:
+            computed = compute(list(todo.values()))
+            with self.lock:
+                self.misses += len(todo)
+                for key, vector in zip(todo, computed):
+                    self._remember(key, vector)
+                    vectors[key] = vector
+                self._store_on_disk(list(zip(todo, computed)))
+
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), self.model.embed_documents)
+
+    def embed_query(self, text):
+        # MiniLM embeds queries and documents the same way, so both share one cache entry per text
+        return self._embed([text], lambda texts: [self.model.embed_query(texts[0])])[0]
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL, cache=True, cache_path=DEFAULT_CACHE_PATH, backend=None, **cache_options):
+    # vector embeddings - using free local HuggingFace model (no API quota limits)
+    # backend (EMBEDDING_BACKEND): huggingface, or the length bucketed cpu engine - torch / onnx (cpu_embeddings.py)
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "huggingface")
+    if backend == "huggingface":
+        model, cache_name = HuggingFaceEmbeddings(model_name=model_name), model_name
+    else:
+        from .cpu_embeddings import CPUEmbeddings
+
+        model = CPUEmbeddings(model_name, backend=backend)
+        cache_name = model.cache_name
+    if not cache:
+        return model
+    return CachedEmbeddings(model, cache_name, path=cache_path, **cache_options)
@@ -0,0 +1,335 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from pypdf import PdfReader
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+from .config import COLLECTION_NAME, QDRANT_URL
+from .manifest import IndexManifest, chunk_fingerprint, default_manifest_path, point_id
+from .quantization import qdrant_quantization_config
+from .splitter import TokenTextSplitter
+
+'''
+ingestion engine for big pdf corpora.
+
+the pipeline has 3 stages and each one runs in parallel with the others:
+1. parse  - pdfs are cut into page ranges, and a process pool extracts + splits the pages
+            (splitter.py - pages are streamed through the splitter one at a time)
+2. embed  - chunks are streamed into fixed size batches and embedded batch by batch (main process)
+3. upsert - embedded batches are pushed to qdrant from a background thread, so the next batch
+            gets embedded while the previous one is still uploading
+
+every stage only holds a bounded amount of work (max pending parse tasks, one embed batch,
+max pending upserts) so memory stays flat no matter how many pdfs are in the corpus.
+
+with incremental=True a local manifest (see manifest.py) is used to skip unchanged pdfs without
+parsing them, embed + upsert only new / changed chunks, and delete the chunks that disappeared.
+
+with a lexical_index (see lexical.py) every upserted / deleted chunk also goes into the bm25 index.
+an incremental run that finds the bm25 index missing or empty (first run with it, deleted index
+dir ...) backfills it: every pdf is parsed again and the unchanged chunks go into the bm25 index
+too, without being embedded again.
+'''
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    skipped_files: int = 0
+    unchanged_chunks: int = 0
+    deleted_chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_sec(self):
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def report(self):
+        report = (f"files: {self.files} | pages: {self.pages} | chunks: {self.chunks} | "
+                  f"{self.seconds:.1f}s | {self.pages_per_sec:.1f} pages/sec | {self.chunks_per_sec:.1f} chunks/sec")
+        if self.skipped_files or self.unchanged_chunks or self.deleted_chunks:
+            report += (f" | skipped files: {self.skipped_files} | unchanged chunks: {self.unchanged_chunks}"
+                       f" | deleted chunks: {self.deleted_chunks}")
+        return report
+
+
+def find_pdfs(root):
+    root = Path(root)
+    if root.is_file():
+        return [root]
+    return sorted(root.rglob("*.pdf"))
+
+
+def plan_page_ranges(pdf_paths, pages_per_task=16):
+    # only reads the page count here, the actual text extraction happens in the process pool
+    for path in pdf_paths:
+        path = str(path)
+        total_pages = len(PdfReader(path).pages)
+        for start in range(0, total_pages, pages_per_task):
+            yield path, start, min(start + pages_per_task, total_pages)
+
+
+def iter_pages(reader, start, end):
+    # one page extracted at a time - the splitter pulls the next page when it's done with this one
+    for page_number in range(start, end):
+        yield page_number, reader.pages[page_number].extract_text() or ""
+
+
+def parse_page_range(path, start, end, splitter=None):
+    # runs inside the process pool, so it has to be a top level function (picklable)
+    splitter = splitter or TokenTextSplitter()
+    reader = PdfReader(path)
+    labels = reader.page_labels
+
+    chunks = []
+    # every page is split on its own, same as split_documents() on PyPDFLoader output
+    for page_number, chunk, start_index in splitter.split_pages(iter_pages(reader, start, end)):
+        page_label = labels[page_number] if page_number < len(labels) else str(page_number + 1)
+        metadata = {
+            "source": path,
+            "page": page_number,
+            "page_label": page_label,
+            "total_pages": len(reader.pages),
+            # start_index lets the context packer (context.py) put a page's chunks back in reading order
+            "start_index": start_index,
+            "fingerprint": chunk_fingerprint(path, page_label, chunk),
+        }
+        chunks.append((chunk, metadata))
+
+    return end - start, chunks
+
+
+class IngestionEngine:
+    def __init__(
+        self,
+        embedding_model,
+        collection_name=COLLECTION_NAME,
+        url=QDRANT_URL,
+        client=None,
+        parse_workers=None,
+        pages_per_task=16,
+        embed_batch_size=64,
+        max_pending_upserts=2,
+        splitter=None,
+        incremental=False,
+        manifest_path=None,
+        local_store=None,
+        quantization="none",
+        lexical_index=None,
+    ):
+        self.embedding_model = embedding_model
+        self.collection_name = collection_name
+        # with a LocalVectorStore the chunks go to RAG/.index/ instead of qdrant
+        self.local_store = local_store
+        self.client = None if local_store is not None else client or QdrantClient(url=url)
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.embed_batch_size = embed_batch_size
+        self.max_pending_upserts = max_pending_upserts
+        # splitter.py - token sized chunks by default, CharacterSplitter for the old 1000 char ones
+        self.splitter = splitter or TokenTextSplitter()
+        self.incremental = incremental
+        self.manifest_path = manifest_path or default_manifest_path(collection_name)
+        # int8 / binary - qdrant keeps quantized copies of the vectors in ram (see quantization.py)
+        self.quantization = quantization
+        # bm25 index (lexical.py) kept in sync with every upsert / delete, for hybrid search
+        self.lexical_index = lexical_index
+        self.collection_ready = False  # ingest_page_range checks the collection once per engine
+
+    def ensure_collection(self, vector_size):
+        if self.local_store is not None:
+            return  # created on the first upsert
+        quantization_config = qdrant_quantization_config(self.quantization)
+        if not self.client.collection_exists(self.collection_name):
+            try:
+                self.client.create_collection(
+                    collection_name=self.collection_name,
+                    vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+                    quantization_config=quantization_config,
+                )
+            except UnexpectedResponse:
+                # distributed ingestion - another worker created it in the meantime
+                if not self.client.collection_exists(self.collection_name):
+                    raise
+        elif quantization_config is not None:
+            self.client.update_collection(self.collection_name, quantization_config=quantization_config)
+
+    def iter_chunks(self, pdf_paths, stats):
+        # keeps at most 2 tasks per parse worker in flight, results come back in submission order
+        max_pending_tasks = self.parse_workers * 2
+        tasks = plan_page_ranges(pdf_paths, self.pages_per_task)
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(parse_page_range, *task, self.splitter))
+                if len(pending) >= max_pending_tasks:
+                    yield from self._collect(pending.popleft(), stats)
+            while pending:
+                yield from self._collect(pending.popleft(), stats)
+
+    def _collect(self, future, stats):
+        pages, chunks = future.result()
+        stats.pages += pages
+        yield from chunks
+
+    def iter_batches(self, chunks):
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= self.embed_batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def build_points(self, batch, vectors):
+        return [
+            models.PointStruct(
+                # deterministic id, re-indexing the same chunk overwrites it instead of duplicating it
+                id=point_id(metadata["fingerprint"]),
+                vector=vector,
+                # same payload layout as QdrantVectorStore, so chat.py / worker.py can read it back
+                payload={"page_content": text, "metadata": metadata},
+            )
+            for (text, metadata), vector in zip(batch, vectors)
+        ]
+
+    def upsert(self, points):
+        if self.lexical_index is not None:
+            self.lexical_index.add([point.id for point in points], [point.payload["page_content"] for point in points])
+        if self.local_store is not None:
+            self.local_store.upsert(
+                ids=[point.id for point in points],
+                vectors=[point.vector for point in points],
+                texts=[point.payload["page_content"] for point in points],
+                metadatas=[point.payload["metadata"] for point in points],
+            )
+            return
+        self.client.upsert(collection_name=self.collection_name, points=points)
+
+    def delete(self, fingerprints):
+        ids = [point_id(fingerprint) for fingerprint in fingerprints]
+        if self.lexical_index is not None:
+            self.lexical_index.delete(ids)
+        if self.local_store is not None:
+            self.local_store.delete(ids)
+            return
+        for start in range(0, len(ids), 1000):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.PointIdsList(points=ids[start:start + 1000]),
+            )
+
+    def skip_unchanged(self, chunks, manifest, seen, stats, backfill=False):
+        # chunks that were already indexed keep their point, only the new ones go on to the embedder.
+        # backfill -> the unchanged ones still go into the bm25 index
+        indexed = {}
+        for text, metadata in chunks:
+            source = metadata["source"]
+            if source not in indexed:
+                indexed[source] = manifest.fingerprints(source)
+                seen[source] = set()
+            seen[source].add(metadata["fingerprint"])
+            if metadata["fingerprint"] in indexed[source]:
+                stats.unchanged_chunks += 1
+                if backfill:
+                    self.lexical_index.add([point_id(metadata["fingerprint"])], [text])
+                continue
+            yield text, metadata
+
+    def ingest_page_range(self, path, start, end):
+        # one page range in this process, no pool and no background upload - the unit of work of the
+        # distributed ingestion jobs (rag_queue/queues/ingest.py). -> (pages, chunks embedded)
+        # the point ids come from the chunk fingerprints, so running a range twice just overwrites it
+        pages, chunks = parse_page_range(path, start, end, self.splitter)
+        for batch in self.iter_batches(chunks):
+            vectors = self.embedding_model.embed_documents([text for text, _ in batch])
+            if not self.collection_ready:
+                self.ensure_collection(len(vectors[0]))
+                self.collection_ready = True
+            self.upsert(self.build_points(batch, vectors))
+        return pages, len(chunks)
+
+    def ingest(self, paths):
+        pdf_paths = find_pdfs(paths)
+        stats = IngestStats(files=len(pdf_paths))
+        started = time.perf_counter()
+
+        manifest = None
+        seen = {}  # source -> fingerprints found in this run
+        backfill = False
+        if self.incremental:
+            manifest = IndexManifest(self.manifest_path)
+            backfill = self.lexical_index is not None and not self.lexical_index.docs and bool(manifest.files)
+            if backfill:
+                print("bm25 index is empty, backfilling it from the unchanged chunks (every pdf gets parsed)")
+            changed = [path for path in pdf_paths if backfill or not manifest.is_unchanged(str(path))]
+            stats.skipped_files = len(pdf_paths) - len(changed)
+            current = {str(path) for path in pdf_paths}
+            removed = [source for source in manifest.sources_under(paths) if source not in current]
+            pdf_paths = changed
+
+        chunks = self.iter_chunks(pdf_paths, stats)
+        if manifest is not None:
+            chunks = self.skip_unchanged(chunks, manifest, seen, stats, backfill)
+
+        with ThreadPoolExecutor(max_workers=1) as uploader:
+            pending_upserts = deque()
+            collection_ready = False
+
+            for batch in self.iter_batches(chunks):
+                vectors = self.embedding_model.embed_documents([text for text, _ in batch])
+
+                if not collection_ready:
+                    self.ensure_collection(len(vectors[0]))
+                    collection_ready = True
+
+                # wait for the oldest upload before queueing a new one, keeps memory bounded
+                if len(pending_upserts) >= self.max_pending_upserts:
+                    pending_upserts.popleft().result()
+                pending_upserts.append(uploader.submit(self.upsert, self.build_points(batch, vectors)))
+
+                stats.chunks += len(batch)
+                stats.seconds = time.perf_counter() - started
+                print(f"\r{stats.report()}", end="", flush=True)
+
+            while pending_upserts:
+                pending_upserts.popleft().result()
+
+        if manifest is not None:
+            for path in pdf_paths:
+                source = str(path)
+                fingerprints = seen.get(source, set())
+                stale = manifest.fingerprints(source) - fingerprints
+                if stale:
+                    self.delete(stale)
+                    stats.deleted_chunks += len(stale)
+                manifest.update(source, fingerprints)
+            for source in removed:
+                stale = manifest.fingerprints(source)
+                if stale:
+                    self.delete(stale)
+                    stats.deleted_chunks += len(stale)
+                manifest.remove(source)
+
+        if self.lexical_index is not None:
+            self.lexical_index.flush()
+        if manifest is not None:
+            # only saved after everything is upserted, a crashed run just redoes the changed files
+            manifest.save()
+
+        stats.seconds = time.perf_counter() - started
+        print(f"\r{stats.report()}")
+        return stats
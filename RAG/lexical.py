@@ -0,0 +1,268 @@
+import json
+import math
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from .config import COLLECTION_NAME, INDEX_DIR
+
+'''
+lexical (BM25) inverted index, built next to the vectors at ingestion time.
+
+dense search is great for "how does node handle async io", but misses exact terms like
+`fs.readFileSync` or `process.nextTick` - BM25 gets those right. retrieval fuses both rankings
+with reciprocal rank fusion (see hybrid_search in vector_stores.py).
+
+on disk (RAG/.index/<collection>.lexical/) the index is a list of immutable segments:
+- terms.json    - term -> [start, count] into the posting arrays
+- postings.npy  - uint32 doc numbers (local to the segment), sorted per term
+- freqs.npy     - uint16 term frequency for every posting
+- lengths.npy   - uint32 number of tokens per doc
+- ids.json      - doc number -> point id (same ids as qdrant / the local vector store)
+the .npy files are memory-mapped, so a search only pages in the posting lists of its terms.
+
+updates are incremental: new chunks are buffered and written as a new segment on flush(),
+deleted / overwritten chunks are just marked dead in meta.json. once there are more than
+max_segments segments, they are merged into one and the dead docs are dropped for good.
+
+a segment is written into a temp dir and renamed into place (os.replace) once it's complete, and
+its name carries a random suffix - a crashed writer leaves no half written segment behind, and two
+writers on the same index never write into each other's segment dir. meta.json is replaced the
+same way, the last flush() wins (a second writer's segment is then just an unreferenced dir).
+a reader with no index on disk yet searches an empty one and picks it up once meta.json shows up.
+'''
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_$]+(?:\.[a-z0-9_$]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was what when where which who why with".split()
+)
+
+
+def tokenize(text):
+    # dotted api names are kept whole and split, so "fs.readFile" matches "fs.readfile", "fs" and "readfile"
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if "." in token:
+            tokens.extend(part for part in token.split(".") if part not in STOPWORDS)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings, k, c=60):
+    # rankings: lists of ids, best first. an id scores sum(1 / (c + rank)) over the lists it's in
+    scores = Counter()
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking):
+            scores[id_] += 1 / (c + rank + 1)
+    return [id_ for id_, _ in scores.most_common(k)]
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self.terms = json.loads((path / "terms.json").read_text())
+        self.ids = json.loads((path / "ids.json").read_text())
+        self.postings = np.load(path / "postings.npy", mmap_mode="r")
+        self.freqs = np.load(path / "freqs.npy", mmap_mode="r")
+        self.lengths = np.load(path / "lengths.npy", mmap_mode="r")
+
+    def posting_list(self, term):
+        start, count = self.terms.get(term, (0, 0))
+        return self.postings[start:start + count], self.freqs[start:start + count]
+
+    @staticmethod
+    def write(path, ids, term_docs, lengths):
+        # term_docs: term -> list of (doc number, term frequency), doc numbers ascending
+        final_path, path = path, path.with_name(f".tmp-{path.name}")
+        path.mkdir(parents=True)
+        terms, postings, freqs = {}, [], []
+        start = 0
+        for term in sorted(term_docs):
+            docs = term_docs[term]
+            terms[term] = [start, len(docs)]
+            postings.extend(doc for doc, _ in docs)
+            freqs.extend(min(freq, 65535) for _, freq in docs)
+            start += len(docs)
+        np.save(path / "postings.npy", np.asarray(postings, dtype=np.uint32))
+        np.save(path / "freqs.npy", np.asarray(freqs, dtype=np.uint16))
+        np.save(path / "lengths.npy", np.asarray(lengths, dtype=np.uint32))
+        (path / "terms.json").write_text(json.dumps(terms))
+        (path / "ids.json").write_text(json.dumps(ids))
+        os.replace(path, final_path)
+
+
+class LexicalIndex:
+    def __init__(self, collection_name=COLLECTION_NAME, path=INDEX_DIR, k1=1.2, b=0.75, max_segments=8):
+        self.dir = Path(path) / f"{collection_name}.lexical"
+        self.k1 = k1
+        self.b = b
+        self.max_segments = max_segments
+
+        self.segments = {}  # name -> Segment
+        self.dead = {}  # name -> set of dead doc numbers
+        self.location = {}  # point id -> (segment name, doc number) of its live copy
+        self.next_segment = 0
+        self.pending = {}  # point id -> token counts, written on flush()
+        self.loaded_mtime = None
+        self.load()
+
+    @property
+    def meta_path(self):
+        return self.dir / "meta.json"
+
+    def exists(self):
+        return self.meta_path.exists()
+
+    def load(self):
+        self.segments, self.dead, self.location = {}, {}, {}
+        if not self.exists():
+            self._refresh_stats()
+            return
+        self.loaded_mtime = self.meta_path.stat().st_mtime_ns
+        meta = json.loads(self.meta_path.read_text())
+        self.next_segment = meta["next_segment"]
+        for name in meta["segments"]:
+            segment = Segment(self.dir / name)
+            dead = set(meta["dead"].get(name, ()))
+            self.segments[name] = segment
+            self.dead[name] = dead
+            for doc, id_ in enumerate(segment.ids):
+                if doc not in dead:
+                    self.location[id_] = (name, doc)
+        self._refresh_stats()
+
+    def reload_if_changed(self):
+        # long running readers (the rq worker) pick up segments written by a later ingestion run
+        if not self.pending and self.exists() and self.meta_path.stat().st_mtime_ns != self.loaded_mtime:
+            self.load()
+
+    def _refresh_stats(self):
+        # corpus stats for BM25. df also counts dead docs until the next merge, close enough
+        self.docs = len(self.location)
+        total_length = sum(int(np.asarray(segment.lengths, dtype=np.int64).sum()) for segment in self.segments.values())
+        dead_length = sum(int(self.segments[name].lengths[doc]) for name, docs in self.dead.items() for doc in docs)
+        self.avg_length = (total_length - dead_length) / self.docs if self.docs else 0.0
+
+    def _segment_name(self):
+        name = f"segment-{self.next_segment:06d}-{uuid.uuid4().hex[:8]}"
+        self.next_segment += 1
+        return name
+
+    def _save_meta(self):
+        tmp_path = self.meta_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({
+            "segments": list(self.segments),
+            "next_segment": self.next_segment,
+            "dead": {name: sorted(dead) for name, dead in self.dead.items() if dead},
+        }))
+        os.replace(tmp_path, self.meta_path)
+        self.loaded_mtime = self.meta_path.stat().st_mtime_ns
+
+    def add(self, ids, texts):
+        for id_, text in zip(ids, texts):
+            self._kill(id_)
+            self.pending[id_] = Counter(tokenize(text))
+
+    def delete(self, ids):
+        for id_ in ids:
+            self.pending.pop(id_, None)
+            self._kill(id_)
+
+    def _kill(self, id_):
+        location = self.location.pop(id_, None)
+        if location is not None:
+            name, doc = location
+            self.dead[name].add(doc)
+
+    def flush(self):
+        # pending docs -> one new segment, then merge if there are too many segments
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if self.pending:
+            name = self._segment_name()
+            ids, lengths, term_docs = [], [], {}
+            for doc, (id_, counts) in enumerate(self.pending.items()):
+                ids.append(id_)
+                lengths.append(sum(counts.values()))
+                for term, freq in counts.items():
+                    term_docs.setdefault(term, []).append((doc, freq))
+            Segment.write(self.dir / name, ids, term_docs, lengths)
+            self.segments[name] = Segment(self.dir / name)
+            self.dead[name] = set()
+            for doc, id_ in enumerate(ids):
+                self.location[id_] = (name, doc)
+            self.pending = {}
+        if len(self.segments) > self.max_segments:
+            self.merge()
+        self._save_meta()
+        self._refresh_stats()
+
+    def merge(self):
+        # rewrites every live doc into one segment, dead docs are gone after this
+        name = self._segment_name()
+        ids, lengths, term_docs = [], [], {}
+        for old_name, segment in self.segments.items():
+            remap = np.full(len(segment.ids), -1, dtype=np.int64)
+            for doc, id_ in enumerate(segment.ids):
+                if doc not in self.dead[old_name]:
+                    remap[doc] = len(ids)
+                    ids.append(id_)
+                    lengths.append(int(segment.lengths[doc]))
+            for term in segment.terms:
+                docs, freqs = segment.posting_list(term)
+                docs = remap[docs]
+                alive = docs >= 0
+                term_docs.setdefault(term, []).extend(zip(docs[alive].tolist(), freqs[alive].tolist()))
+        Segment.write(self.dir / name, ids, term_docs, lengths)
+
+        old_names = list(self.segments)
+        self.segments = {name: Segment(self.dir / name)}
+        self.dead = {name: set()}
+        self.location = {id_: (name, doc) for doc, id_ in enumerate(ids)}
+        self._save_meta()
+        for old_name in old_names:
+            shutil.rmtree(self.dir / old_name, ignore_errors=True)
+
+    def search(self, query, k=10):
+        # -> list of (point id, bm25 score), best first
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+        idf = {}
+        for term in terms:
+            df = sum(segment.terms.get(term, (0, 0))[1] for segment in self.segments.values())
+            if df:
+                idf[term] = math.log(1 + (self.docs - df + 0.5) / (df + 0.5))
+
+        hits = []
+        for name, segment in self.segments.items():
+            scores = None
+            for term, term_idf in idf.items():
+                docs, freqs = segment.posting_list(term)
+                if not len(docs):
+                    continue
+                if scores is None:
+                    scores = np.zeros(len(segment.ids), dtype=np.float32)
+                freqs = freqs.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * segment.lengths[docs] / self.avg_length)
+                scores[docs] += term_idf * freqs * (self.k1 + 1) / (freqs + norm)
+            if scores is None:
+                continue
+            if self.dead[name]:
+                scores[list(self.dead[name])] = 0
+            top = min(k, len(scores))
+            candidates = np.argpartition(-scores, top - 1)[:top]
+            hits.extend((float(scores[doc]), segment.ids[doc]) for doc in candidates if scores[doc] > 0)
+
+        hits.sort(reverse=True)
+        return [(id_, score) for score, id_ in hits[:k]]
+
+    def search_many(self, queries, k=10):
+        self.reload_if_changed()
+        return [self.search(query, k) for query in queries]
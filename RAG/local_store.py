@@ -0,0 +1,345 @@
+import json
+import math
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from .config import COLLECTION_NAME, INDEX_DIR
+from .quantization import make_quantizer, memory_report, recall_at_k
+
+'''
+embedded, in-process vector store - a drop-in for QdrantVectorStore without the network hop.
+
+same surface as QdrantVectorStore: from_documents(), from_existing_collection(), similarity_search() ...
+so RAG/chat.py and the rag_queue worker can switch with VECTOR_STORE=local (see vector_stores.py).
+
+on disk, every collection is a directory (RAG/.index/<collection>/):
+- meta.json      - dim, dtype (float32 or float16), rows, capacity
+- vectors.bin    - the vectors as one memory-mapped (capacity x dim) matrix, l2-normalized,
+                   so cosine similarity is just a dot product
+- payloads.jsonl - sidecar file, one json line per write {row, id, page_content, metadata},
+                   the last line for a row wins. only the top-k hits are read back from it
+
+search is a vectorized numpy matmul + argpartition top-k, done in blocks so a float16 matrix
+never gets fully upcast in memory. with use_hnsw=True and hnswlib installed, collections with
+more than hnsw_threshold vectors are searched through an hnsw graph instead.
+
+with quantization="int8" / "binary" the search runs over compact codes kept in ram, and only the
+top k * oversampling candidates are rescored against the memory-mapped float vectors (quantization.py).
+'''
+
+BLOCK_ROWS = 65_536
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, embedding, collection_name=COLLECTION_NAME, path=INDEX_DIR, dtype="float32",
+                 use_hnsw=False, hnsw_threshold=50_000, quantization="none", oversampling=4.0):
+        self.embedding = embedding
+        self.collection_name = collection_name
+        self.dir = Path(path) / collection_name
+        self.dtype = np.dtype(dtype)
+        self.use_hnsw = use_hnsw
+        self.hnsw_threshold = hnsw_threshold
+        self.quantization = quantization
+        self.oversampling = oversampling
+
+        self.dim = None
+        self.rows = 0
+        self.capacity = 0
+        self.matrix = None
+        self.id_to_row = {}
+        self.row_ids = []
+        self.payload_offsets = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.hnsw = None
+        self.quantizer = None
+        self.codes = None
+        self.load()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @property
+    def meta_path(self):
+        return self.dir / "meta.json"
+
+    @property
+    def vectors_path(self):
+        return self.dir / "vectors.bin"
+
+    @property
+    def payloads_path(self):
+        return self.dir / "payloads.jsonl"
+
+    def exists(self):
+        return self.meta_path.exists()
+
+    def load(self):
+        if not self.exists():
+            return
+        meta = json.loads(self.meta_path.read_text())
+        self.dim, self.rows, self.capacity = meta["dim"], meta["rows"], meta["capacity"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dim))
+
+        # rebuild row -> payload offset and id -> row from the sidecar, later lines win
+        self.payload_offsets = [None] * self.rows
+        self.row_ids = [None] * self.rows
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.id_to_row = {}
+        with open(self.payloads_path, "rb") as payloads:
+            offset = 0
+            for line in payloads:
+                record = json.loads(line)
+                row = record["row"]
+                if row < self.rows:
+                    if record.get("deleted"):
+                        self.alive[row] = False
+                        self.id_to_row.pop(self.row_ids[row], None)
+                    else:
+                        self.payload_offsets[row] = offset
+                        self.row_ids[row] = record["id"]
+                        self.id_to_row[record["id"]] = row
+                        self.alive[row] = True
+                offset += len(line)
+        self.hnsw = None
+        self.codes = None
+
+    def _save_meta(self):
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({
+            "dim": self.dim, "dtype": self.dtype.name, "rows": self.rows, "capacity": self.capacity,
+        }))
+        os.replace(tmp_path, self.meta_path)
+
+    def _grow(self, needed_rows):
+        if needed_rows <= self.capacity:
+            return
+        # double the capacity, so appending n vectors one batch at a time stays O(n)
+        capacity = max(needed_rows, self.capacity * 2, 1024)
+        if self.matrix is not None:
+            self.matrix.flush()
+        with open(self.vectors_path, "ab") as vectors:
+            vectors.truncate(capacity * self.dim * self.dtype.itemsize)
+        self.matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        self.capacity = capacity
+
+    def upsert(self, ids, vectors, texts, metadatas):
+        vectors = _normalize(vectors)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self.payloads_path.touch()
+
+        # existing ids are overwritten in place, new ones are appended at the end
+        rows = []
+        for id_ in ids:
+            row = self.id_to_row.get(id_)
+            if row is None:
+                row = self.rows
+                self.rows += 1
+                self.row_ids.append(id_)
+                self.payload_offsets.append(None)
+                self.id_to_row[id_] = row
+            rows.append(row)
+        self._grow(self.rows)
+        self.matrix[rows] = vectors.astype(self.dtype)
+        self.alive[rows] = True
+
+        with open(self.payloads_path, "ab") as payloads:
+            offset = payloads.tell()
+            for row, id_, text, metadata in zip(rows, ids, texts, metadatas):
+                line = (json.dumps({"row": row, "id": id_, "page_content": text, "metadata": metadata}) + "\n").encode("utf-8")
+                payloads.write(line)
+                self.payload_offsets[row] = offset
+                offset += len(line)
+
+        self.matrix.flush()
+        self._save_meta()
+        self.hnsw = None
+        self.codes = None
+        return list(ids)
+
+    def delete(self, ids=None, **kwargs):
+        rows = [self.id_to_row.pop(id_) for id_ in ids or () if id_ in self.id_to_row]
+        if not rows:
+            return False
+        self.alive[rows] = False
+        with open(self.payloads_path, "ab") as payloads:
+            for row in rows:
+                payloads.write((json.dumps({"row": row, "deleted": True}) + "\n").encode("utf-8"))
+        self.hnsw = None
+        self.codes = None
+        return True
+
+    def count(self):
+        return int(self.alive[:self.rows].sum())
+
+    def _payload(self, row):
+        with open(self.payloads_path, "rb") as payloads:
+            payloads.seek(self.payload_offsets[row])
+            return json.loads(payloads.readline())
+
+    def _document(self, row):
+        payload = self._payload(row)
+        metadata = {**payload["metadata"], "_id": payload["id"], "_collection_name": self.collection_name}
+        return Document(page_content=payload["page_content"], metadata=metadata)
+
+    def get_by_ids(self, ids, /):
+        return [self._document(self.id_to_row[id_]) for id_ in ids if id_ in self.id_to_row]
+
+    def _hnsw_index(self):
+        import hnswlib
+
+        if self.hnsw is None:
+            rows = np.flatnonzero(self.alive[:self.rows])
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.init_index(max_elements=max(len(rows), 1), ef_construction=200, M=16)
+            index.add_items(np.asarray(self.matrix[rows], dtype=np.float32), rows)
+            index.set_ef(64)
+            self.hnsw = index
+        return self.hnsw
+
+    def _quantized_codes(self):
+        if self.codes is None:
+            blocks = (
+                np.asarray(self.matrix[start:min(start + BLOCK_ROWS, self.rows)], dtype=np.float32)
+                for start in range(0, self.rows, BLOCK_ROWS)
+            )
+            self.quantizer = make_quantizer(self.quantization, blocks)
+            self.codes = np.concatenate([
+                self.quantizer.encode(np.asarray(self.matrix[start:min(start + BLOCK_ROWS, self.rows)], dtype=np.float32))
+                for start in range(0, self.rows, BLOCK_ROWS)
+            ])
+        return self.codes
+
+    def _top_k(self, score_block, queries, k):
+        # blocked top-k over all rows: score_block(start, end) -> (n, block) scores, dead rows masked out
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, self.rows, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, self.rows)
+            scores = np.asarray(score_block(start, end), dtype=np.float32)
+            scores[:, ~self.alive[start:end]] = -np.inf
+            top = min(k, end - start)
+            candidates = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+
+        order = np.argsort(-best_scores, axis=1)[:, :k]
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def search_rows(self, queries, k, rescore=True):
+        # queries: (n, dim) -> per query a list of (row, score), best first
+        queries = _normalize(np.atleast_2d(queries))
+        k = min(k, self.count())
+        if k == 0:
+            return [[] for _ in queries]
+
+        if self.quantization != "none":
+            codes = self._quantized_codes()
+            candidates, scores = self._top_k(
+                lambda start, end: self.quantizer.scores(codes[start:end], queries).T, queries,
+                max(k, math.ceil(k * self.oversampling)) if rescore else k,
+            )
+            if rescore:
+                # exact scores for the few candidates only, read from the full precision vectors
+                results = []
+                for query, rows, code_scores in zip(queries, candidates, scores):
+                    rows = np.sort(rows[np.isfinite(code_scores)])  # sorted rows read the memmap sequentially
+                    exact = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+                    order = np.argsort(-exact)[:k]
+                    results.append([(int(rows[i]), float(exact[i])) for i in order])
+                return results
+            return [
+                [(int(row), float(score)) for row, score in zip(rows, row_scores) if np.isfinite(score)]
+                for rows, row_scores in zip(candidates, scores)
+            ]
+
+        if self.use_hnsw and self.count() >= self.hnsw_threshold:
+            try:
+                labels, distances = self._hnsw_index().knn_query(queries, k=k)
+                return [[(int(row), 1.0 - float(distance)) for row, distance in zip(*hit)] for hit in zip(labels, distances)]
+            except ImportError:
+                pass  # hnswlib is optional, brute force it is
+
+        rows, scores = self._top_k(lambda start, end: queries @ np.asarray(self.matrix[start:end], dtype=np.float32).T, queries, k)
+        return [
+            [(int(row), float(score)) for row, score in zip(row_list, score_list) if np.isfinite(score)]
+            for row_list, score_list in zip(rows, scores)
+        ]
+
+    def quantization_report(self, k=10, samples=100):
+        # memory saved by the codes + recall@k against exact float search, stored vectors as queries
+        if self.quantization == "none" or not self.count():
+            return None
+        alive_rows = np.flatnonzero(self.alive[:self.rows])
+        sample_rows = np.random.default_rng(0).choice(alive_rows, size=min(samples, len(alive_rows)), replace=False)
+        queries = np.asarray(self.matrix[np.sort(sample_rows)], dtype=np.float32)
+
+        quantization, self.quantization = self.quantization, "none"
+        try:
+            exact = [[row for row, _ in hits] for hits in self.search_rows(queries, k)]
+        finally:
+            self.quantization = quantization
+        codes_only = [[row for row, _ in hits] for hits in self.search_rows(queries, k, rescore=False)]
+        rescored = [[row for row, _ in hits] for hits in self.search_rows(queries, k)]
+
+        report = memory_report(self.count(), self.dim, self.quantization)
+        report[f"recall@{k}_codes_only"] = round(recall_at_k(exact, codes_only), 4)
+        report[f"recall@{k}_rescored"] = round(recall_at_k(exact, rescored), 4)
+        return report
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return [(self._document(row), score) for row, score in self.search_rows([embedding], k)[0]]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search_by_vectors(self, embeddings, k=4):
+        # batched search - one matmul for all the queries
+        return [[self._document(row) for row, _ in hits] for hits in self.search_rows(embeddings, k)]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        vectors = self.embedding.embed_documents(texts)
+        return self.upsert(ids, vectors, texts, metadatas)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, collection_name=COLLECTION_NAME,
+                   path=INDEX_DIR, dtype="float32", **kwargs):
+        store = cls(embedding, collection_name=collection_name, path=path, dtype=dtype, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_existing_collection(cls, embedding, collection_name=COLLECTION_NAME, path=INDEX_DIR, **kwargs):
+        store = cls(embedding, collection_name=collection_name, path=path, **kwargs)
+        if not store.exists():
+            raise ValueError(f"local collection {collection_name!r} not found in {path}")
+        return store
@@ -1,50 +1,110 @@
+import argparse
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
 import os
 from dotenv import load_dotenv
 
+from .config import COLLECTION_NAME, QDRANT_URL
+from .embeddings import get_embedding_model
+from .ingest import IngestionEngine
+from .lexical import LexicalIndex
+from .local_store import LocalVectorStore
+from .quantization import QUANTIZATION_MODES, qdrant_quantization_report
+from .splitter import CHUNK_TOKENS, OVERLAP_TOKENS, CharacterSplitter, TokenTextSplitter
+
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-pdf_path = Path(__file__).parent / "nodeJsNotes.pdf" # here, Path(__file__) gives the current file path i.e. RAG/main.py.. so its parent is RAG/ .. and then we append nodeJsNotes.pdf to it.
+# here, Path(__file__) gives the current file path i.e. RAG/main.py.. so its parent is RAG/ .. which has nodeJsNotes.pdf in it.
+DEFAULT_CORPUS = Path(__file__).parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="index a pdf file or a whole directory of pdfs into qdrant")
+    parser.add_argument("path", nargs="?", default=DEFAULT_CORPUS, help="pdf file or directory (searched recursively)")
+    parser.add_argument("--workers", type=int, default=None, help="parse processes (default: cpu count)")
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding / upsert batch")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="always recompute every vector")
+    parser.add_argument("--embedding-backend", choices=("huggingface", "torch", "onnx"), default=None,
+                        help="torch / onnx - length bucketed cpu engine, onnx = int8 (default: EMBEDDING_BACKEND or huggingface)")
+    parser.add_argument("--local", action="store_true",
+                        help="index into the embedded local vector store (RAG/.index/) instead of qdrant")
+    parser.add_argument("--float16", action="store_true", help="store local vectors as float16 (half the memory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed new / changed chunks and delete stale ones (tracked in RAG/.index/)")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default="none",
+                        help="search over int8 / binary codes and rescore the best candidates in full precision")
+    parser.add_argument("--no-lexical", action="store_true", help="skip the bm25 index used for hybrid search")
+    parser.add_argument("--splitter", choices=("tokens", "chars"), default="tokens",
+                        help="tokens - chunks sized in embedding model tokens on sentence boundaries, chars - the old 1000 char chunks")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="max tokens per chunk (tokens splitter)")
+    parser.add_argument("--overlap-tokens", type=int, default=OVERLAP_TOKENS, help="max tokens repeated from the prev chunk")
+    args = parser.parse_args()
 
-#load the pdf in the python program
-loader = PyPDFLoader(file_path=pdf_path)
-docs = loader.load()
+    # vector embeddings - using free local HuggingFace model (no API quota limits)
+    # wrapped in the embedding cache, chunks that were embedded before skip the model entirely
+    embedding_model = get_embedding_model(cache=not args.no_embedding_cache, backend=args.embedding_backend)
+    print("Using local HuggingFace embeddings - no API calls needed!")
 
-# print(docs[0])
+    # parse pages in a process pool -> embed in fixed size batches -> upsert to qdrant in the background
+    # chunks fit the model's 256 token window, the overlap repeats the last sentences of the prev chunk
+    # (--splitter chars: chunk_size=1000, chunk_overlap=400 like before)
+    if args.splitter == "tokens":
+        splitter = TokenTextSplitter(chunk_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens)
+    else:
+        splitter = CharacterSplitter(chunk_size=1000, chunk_overlap=400)
+    local_store = LocalVectorStore(
+        embedding_model,
+        collection_name=COLLECTION_NAME,
+        dtype="float16" if args.float16 else "float32",
+        quantization=args.quantization,
+    ) if args.local else None
+    engine = IngestionEngine(
+        embedding_model=embedding_model,
+        collection_name=COLLECTION_NAME,
+        url=QDRANT_URL,  # assuming Qdrant is running locally on default port
+        parse_workers=args.workers,
+        pages_per_task=args.pages_per_task,
+        embed_batch_size=args.batch_size,
+        splitter=splitter,
+        incremental=args.incremental,
+        local_store=local_store,
+        quantization=args.quantization,
+        lexical_index=None if args.no_lexical else LexicalIndex(COLLECTION_NAME),
+    )
+    engine.ingest(args.path)
+    if args.quantization != "none":
+        # memory saved + recall@10 of the quantized search vs exact search
+        if local_store is not None:
+            print("quantization:", local_store.quantization_report())
+        else:
+            print("quantization:", qdrant_quantization_report(engine.client, COLLECTION_NAME, args.quantization))
+    if hasattr(embedding_model, "stats"):
+        print("embedding cache:", embedding_model.stats())
+    bump_index_generation()
 
-#split doc into smaller chunks
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size = 1000,
-    chunk_overlap = 400, # also includes overlapping part of prev chunk.. so to get a little content of the prev chunk too
-)
+    print("indexing completed.")
 
-chunks = text_splitter.split_documents(documents=docs)
 
-print(f"Total Chunks: {len(chunks)}")
-print(chunks[0])  #print first chunk
+def bump_index_generation():
+    # cached answers of the rag_queue workers were built from the old index - start the cache over.
+    # indexing works without redis, so no redis is only a warning
+    from redis.exceptions import RedisError
+    from rag_queue.cache.answer_cache import bump_generation
+    from rag_queue.client.rq_client import redis_connection
 
-# vector embeddings - using free local HuggingFace model (no API quota limits)
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
-print("Using local HuggingFace embeddings - no API calls needed!")
+    try:
+        bump_generation(redis_connection, COLLECTION_NAME)
+    except RedisError as error:
+        print(f"⚠️ couldn't reset the answer cache ({error}), cached answers may predate this index")
 
-# connect to Qdrant vector db
-vector_store = QdrantVectorStore.from_documents(
-    documents=chunks,
-    embedding=embedding_model,
-    collection_name="learning-rag",
-    url="http://localhost:6333"  # assuming Qdrant is running locally on default port
-)
 
-print("indexing completed.")
+if __name__ == "__main__":
+    main()
 
 '''
+run it from the repo root: python -m RAG.main [path/to/pdfs]
+
 rn this code is sync in nature. it blocks further execution until indexing is done.
 and that's not how its done in production systems.
 
@@ -52,4 +112,7 @@ in production systems, we use async processing and task queues.
 so we need to make it async and push the indexing tasks to a task queue like Celery or RQ.
 
 async - lets do this in background, dont block the main thread, and let user do what they want to do.
-'''
\ No newline at end of file
+
+-> rag_queue does this now: POST /ingest fans a corpus out into page range jobs on the rq workers
+   (rag_queue/queues/ingest.py), GET /ingest/{ingest_id} shows the progress.
+'''
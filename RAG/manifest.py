@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+from .config import INDEX_DIR
+
+'''
+fingerprints for incremental re-indexing.
+
+every chunk gets a fingerprint = sha256(source, page_label, content). the qdrant point id is
+derived from the fingerprint, so upserting the same chunk twice just overwrites the same point.
+
+the manifest is a local json file that remembers, per pdf:
+- signature    - size + mtime of the file, if it didn't change we don't even open the pdf
+- fingerprints - every chunk fingerprint we indexed for it, so we know what to skip / delete
+'''
+
+POINT_ID_NAMESPACE = uuid.UUID("6f1c3f3e-8a4b-4c55-9a52-3b1f0d7e2a10")
+
+
+def chunk_fingerprint(source, page_label, text):
+    digest = hashlib.sha256()
+    for part in (str(source), str(page_label), text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")  # separator, so ("ab", "c") and ("a", "bc") hash differently
+    return digest.hexdigest()
+
+
+def point_id(fingerprint):
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, fingerprint))
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def default_manifest_path(collection_name):
+    return INDEX_DIR / f"{collection_name}.manifest.json"
+
+
+class IndexManifest:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        if self.path.exists():
+            self.files = json.loads(self.path.read_text(encoding="utf-8")).get("files", {})
+
+    def is_unchanged(self, source):
+        entry = self.files.get(source)
+        return entry is not None and entry["signature"] == file_signature(source)
+
+    def fingerprints(self, source):
+        return set(self.files.get(source, {}).get("fingerprints", ()))
+
+    def update(self, source, fingerprints):
+        self.files[source] = {"signature": file_signature(source), "fingerprints": sorted(fingerprints)}
+
+    def remove(self, source):
+        self.files.pop(source, None)
+
+    def sources_under(self, root):
+        root = Path(root).resolve()
+        return [source for source in self.files if root == Path(source).resolve() or root in Path(source).resolve().parents]
+
+    def save(self):
+        # write to a temp file and swap it in, so a crash never leaves a half written manifest
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"files": self.files}), encoding="utf-8")
+        os.replace(tmp_path, self.path)
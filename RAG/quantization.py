@@ -0,0 +1,120 @@
+import numpy as np
+from qdrant_client import models
+
+'''
+quantized vectors - search over compact codes, then rescore the best candidates in full precision.
+
+a MiniLM vector is 384 float32 = 1536 bytes. with quantization the search runs over:
+- int8   - 1 byte per dim (4x smaller), per-dimension min/max scaling
+- binary - 1 bit per dim (32x smaller), just the sign of every dimension
+
+both lose a bit of precision, so the top (k * oversampling) candidates from the codes are
+rescored against the original float vectors (which stay on disk / memory-mapped) and only
+then cut down to k. the report functions measure the memory saved and recall@k vs exact search.
+
+qdrant has the same thing built in (scalar / binary quantization + rescore), so for the qdrant
+backend we only build its configs here. the local store (local_store.py) uses the quantizers.
+'''
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+# number of set bits for every possible byte, used for the hamming distance of binary codes
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+class ScalarQuantizer:
+    def __init__(self, low, high):
+        self.low = low.astype(np.float32)
+        self.scale = np.maximum(high - low, 1e-12).astype(np.float32) / 255
+
+    @classmethod
+    def fit(cls, blocks):
+        low, high = None, None
+        for block in blocks:
+            block_low, block_high = block.min(axis=0), block.max(axis=0)
+            low = block_low if low is None else np.minimum(low, block_low)
+            high = block_high if high is None else np.maximum(high, block_high)
+        return cls(low, high)
+
+    def encode(self, vectors):
+        return np.clip(np.rint((vectors - self.low) / self.scale), 0, 255).astype(np.uint8)
+
+    def scores(self, codes, queries):
+        # dot(code * scale + low, q) == code @ (scale * q) + low @ q, no need to decode the codes
+        return codes.astype(np.float32) @ (queries * self.scale).T + queries @ self.low
+
+
+class BinaryQuantizer:
+    @classmethod
+    def fit(cls, blocks):
+        return cls()
+
+    def encode(self, vectors):
+        return np.packbits(vectors > 0, axis=-1)
+
+    def scores(self, codes, queries):
+        # fewer differing sign bits -> more similar. returned as "similarity" (higher is better)
+        query_codes = self.encode(queries)
+        return -np.stack([POPCOUNT[codes ^ query_code].sum(axis=1, dtype=np.int32) for query_code in query_codes], axis=1)
+
+
+def make_quantizer(mode, blocks):
+    if mode == "int8":
+        return ScalarQuantizer.fit(blocks)
+    if mode == "binary":
+        return BinaryQuantizer.fit(blocks)
+    raise ValueError(f"unknown quantization {mode!r}, expected one of {QUANTIZATION_MODES}")
+
+
+def memory_report(vectors, dim, mode):
+    full_bytes = vectors * dim * 4
+    code_bytes = vectors * {"int8": dim, "binary": (dim + 7) // 8}.get(mode, dim * 4)
+    return {
+        "vectors": vectors,
+        "float32_mb": round(full_bytes / 2**20, 2),
+        f"{mode}_mb": round(code_bytes / 2**20, 2),
+        "saved_pct": round(100 * (1 - code_bytes / full_bytes), 1) if full_bytes else 0.0,
+    }
+
+
+def recall_at_k(exact, approximate):
+    # exact / approximate: one list of ids per query
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approximate))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+
+def qdrant_quantization_config(mode):
+    if mode == "int8":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True,
+        ))
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def qdrant_search_params(mode, oversampling=4.0, rescore=True):
+    if mode in (None, "none"):
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+    )
+
+
+def qdrant_quantization_report(client, collection_name, mode, k=10, samples=100, oversampling=4.0):
+    # stored vectors double as the sample queries, exact=True is the full precision ground truth
+    points, _ = client.scroll(collection_name, limit=samples, with_vectors=True, with_payload=False)
+    queries = [point.vector for point in points]
+
+    def run(search_params):
+        return [
+            [hit.id for hit in client.query_points(collection_name, query=query, limit=k, search_params=search_params).points]
+            for query in queries
+        ]
+
+    exact = run(models.SearchParams(exact=True))
+    report = memory_report(client.count(collection_name).count, len(queries[0]) if queries else 0, mode)
+    report[f"recall@{k}_codes_only"] = round(recall_at_k(exact, run(qdrant_search_params(mode, oversampling, rescore=False))), 4)
+    report[f"recall@{k}_rescored"] = round(recall_at_k(exact, run(qdrant_search_params(mode, oversampling))), 4)
+    return report
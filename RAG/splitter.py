@@ -0,0 +1,145 @@
+import re
+from collections import deque
+from functools import lru_cache
+
+from .config import EMBEDDING_MAX_TOKENS, EMBEDDING_MODEL
+
+'''
+streaming splitters for the ingestion path - pages in, chunks out, one page at a time.
+
+both take a generator of (page_number, text) and yield (page_number, chunk, start_index) lazily,
+so only the page being split is in memory, never the whole document. chunks are slices of the
+page text and start_index is where the slice starts, same as add_start_index=True before
+(the context packer uses it to put a page's chunks back in reading order).
+
+- TokenTextSplitter  - the default. chunk size is counted in tokens of the embedding model's own
+                       tokenizer, so a chunk always fits the model's 256 token window (a 1000 char
+                       chunk could be anything from ~150 to 400+ tokens - the long ones got silently
+                       truncated by the model, the short ones wasted half the window).
+                       chunks end on sentence boundaries, a sentence only gets cut (on a word
+                       boundary) when it alone is longer than a chunk
+- CharacterSplitter  - the old RecursiveCharacterTextSplitter, chunk_size / chunk_overlap in characters
+
+how the token splitter stays linear:
+- every sentence of a page is tokenized exactly once (one batched tokenizer call per page)
+- chunks are packed greedily from the sentence token counts, nothing gets re-tokenized
+- the overlap is the last sentences of the previous chunk, kept in a deque with their counts -
+  a sentence goes in and out of the deque once, so overlap regions are never scanned again
+the token count of a chunk is exact: bert style tokenizers split on whitespace first, so the tokens
+of "a b" are the tokens of "a" + the tokens of "b".
+
+needs transformers (the fast tokenizer of the model), the parse processes load it once each.
+'''
+
+CHUNK_TOKENS = EMBEDDING_MAX_TOKENS - 2  # [CLS] + [SEP] take 2 of the 256
+OVERLAP_TOKENS = 64
+# end of a sentence (. ! ? followed by whitespace) or a paragraph break
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name=EMBEDDING_MODEL):
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+def sentence_spans(text):
+    # -> (start, end) of every sentence, surrounding whitespace left out. one regex pass
+    start = 0
+    for match in SENTENCE_BREAK.finditer(text):
+        yield from strip_span(text, start, match.start())
+        start = match.end()
+    yield from strip_span(text, start, len(text))
+
+
+def strip_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if end > start:
+        yield start, end
+
+
+class TokenTextSplitter:
+    def __init__(self, chunk_tokens=CHUNK_TOKENS, overlap_tokens=OVERLAP_TOKENS, model_name=EMBEDDING_MODEL, tokenizer=None):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError(f"overlap_tokens ({overlap_tokens}) has to be smaller than chunk_tokens ({chunk_tokens})")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.model_name = model_name
+        self._tokenizer = tokenizer
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer or load_tokenizer(self.model_name)
+
+    def __getstate__(self):
+        # sent to the parse processes - they load the tokenizer themselves instead of unpickling it
+        state = self.__dict__.copy()
+        state["_tokenizer"] = None
+        return state
+
+    def pieces(self, text):
+        # -> (start, end, tokens) per sentence, sentences longer than a chunk cut into chunk sized pieces
+        spans = list(sentence_spans(text))
+        if not spans:
+            return []
+        encodings = self.tokenizer([text[start:end] for start, end in spans],
+                                   add_special_tokens=False, return_offsets_mapping=True)
+
+        pieces = []
+        for index, (start, end) in enumerate(spans):
+            offsets = encodings["offset_mapping"][index]
+            if len(offsets) <= self.chunk_tokens:
+                pieces.append((start, end, len(offsets)))
+                continue
+            # cut on word boundaries only, a word's "##" tokens stay together so the counts stay exact
+            words = encodings.word_ids(index)
+            first = 0
+            while first < len(offsets):
+                last = min(first + self.chunk_tokens, len(offsets))
+                if last < len(offsets):
+                    cut = last
+                    while cut > first + 1 and words[cut] == words[cut - 1]:
+                        cut -= 1
+                    last = cut if cut > first + 1 else last  # one word longer than a chunk - cut it anyway
+                piece_end = offsets[last][0] if last < len(offsets) else len(text[start:end])
+                pieces.append((start + offsets[first][0], start + len(text[start:start + piece_end].rstrip()), last - first))
+                first = last
+        return pieces
+
+    def split_text(self, text):
+        # -> (chunk, start_index), greedy packing of whole pieces, the tail of a chunk starts the next one
+        window, tokens = deque(), 0
+        for piece in self.pieces(text):
+            if window and tokens + piece[2] > self.chunk_tokens:
+                yield text[window[0][0]:window[-1][1]], window[0][0]
+                # keep the last sentences as overlap, as long as they fit next to the new piece
+                while window and (tokens > self.overlap_tokens or tokens + piece[2] > self.chunk_tokens):
+                    tokens -= window.popleft()[2]
+            window.append(piece)
+            tokens += piece[2]
+        if window:
+            yield text[window[0][0]:window[-1][1]], window[0][0]
+
+    def split_pages(self, pages):
+        for page_number, text in pages:
+            for chunk, start_index in self.split_text(text):
+                yield page_number, chunk, start_index
+
+
+class CharacterSplitter:
+    def __init__(self, chunk_size=1000, chunk_overlap=400):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_pages(self, pages):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap,
+                                                       add_start_index=True)
+        for page_number, text in pages:
+            for document in text_splitter.create_documents([text]):
+                yield page_number, document.page_content, document.metadata["start_index"]
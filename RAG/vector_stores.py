@@ -0,0 +1,105 @@
+import os
+
+from langchain_core.documents import Document
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import models
+
+from .config import COLLECTION_NAME, QDRANT_URL
+from .lexical import LexicalIndex, reciprocal_rank_fusion
+from .local_store import LocalVectorStore
+from .quantization import qdrant_search_params
+
+'''
+picks the vector store backend for the retrieval side (RAG/chat.py, rag_queue worker).
+
+VECTOR_STORE=qdrant (default) - QdrantVectorStore on QDRANT_URL
+VECTOR_STORE=local            - LocalVectorStore in RAG/.index/, no external service needed
+                                (index into it with: python -m RAG.main --local)
+
+HYBRID_SEARCH=1 (default) fuses the dense results with BM25 hits from the lexical index that
+RAG/main.py builds next to the vectors (lexical.py), HYBRID_SEARCH=0 is dense only.
+
+VECTOR_QUANTIZATION=int8|binary searches over quantized vectors and rescores the top
+k * QUANTIZATION_OVERSAMPLING candidates in full precision (index with --quantization for qdrant).
+'''
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = 4  # each ranking contributes k * HYBRID_CANDIDATES candidates to the fusion
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANTIZATION_OVERSAMPLING = float(os.getenv("QUANTIZATION_OVERSAMPLING", "4.0"))
+
+
+def connect_vector_store(embedding, backend=None, collection_name=COLLECTION_NAME):
+    backend = backend or VECTOR_STORE
+    if backend == "local":
+        return LocalVectorStore.from_existing_collection(
+            embedding=embedding,
+            collection_name=collection_name,
+            quantization=VECTOR_QUANTIZATION,
+            oversampling=QUANTIZATION_OVERSAMPLING,
+        )
+    if backend == "qdrant":
+        return QdrantVectorStore.from_existing_collection(
+            embedding=embedding,
+            collection_name=collection_name,
+            url=QDRANT_URL  # assuming Qdrant is running locally on default port
+        )
+    raise ValueError(f"unknown VECTOR_STORE {backend!r}, expected 'qdrant' or 'local'")
+
+
+def connect_lexical_index(collection_name=COLLECTION_NAME):
+    # None when hybrid search is off -> plain dense search. an index that isn't built yet searches
+    # as empty, and is picked up by search_many once RAG/main.py wrote it
+    if not HYBRID_SEARCH:
+        return None
+    return LexicalIndex(collection_name)
+
+
+def batch_search(vector_store, embeddings, k=4):
+    # one request for many query vectors -> one list of documents per query
+    if isinstance(vector_store, LocalVectorStore):
+        return vector_store.similarity_search_by_vectors(embeddings, k=k)
+
+    responses = vector_store.client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=[
+            models.QueryRequest(
+                query=embedding,
+                limit=k,
+                with_payload=True,
+                params=qdrant_search_params(VECTOR_QUANTIZATION, QUANTIZATION_OVERSAMPLING),
+            )
+            for embedding in embeddings
+        ],
+    )
+    return [
+        [
+            Document(
+                page_content=point.payload["page_content"],
+                metadata={**point.payload["metadata"], "_id": point.id, "_collection_name": vector_store.collection_name},
+            )
+            for point in response.points
+        ]
+        for response in responses
+    ]
+
+
+def hybrid_search(vector_store, lexical_index, queries, embeddings, k=4):
+    # dense + bm25 rankings for every query, fused with reciprocal rank fusion -> k documents per query
+    if lexical_index is None:
+        return batch_search(vector_store, embeddings, k=k)
+    candidates = k * HYBRID_CANDIDATES
+    dense = batch_search(vector_store, embeddings, k=candidates)
+    lexical = lexical_index.search_many(queries, k=candidates)
+
+    documents = {document.metadata["_id"]: document for results in dense for document in results}
+    fused = [
+        reciprocal_rank_fusion([[document.metadata["_id"] for document in results], [id_ for id_, _ in hits]], k)
+        for results, hits in zip(dense, lexical)
+    ]
+    # chunks only bm25 found still need their payload, one lookup for the whole batch
+    missing = list({id_ for ids in fused for id_ in ids if id_ not in documents})
+    if missing:
+        documents.update((document.metadata["_id"], document) for document in vector_store.get_by_ids(missing))
+    return [[documents[id_] for id_ in ids if id_ in documents] for ids in fused]
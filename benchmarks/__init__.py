@@ -0,0 +1 @@
+# benchmarks package - load generator, fake llm server and fixtures for the rag_queue stack
@@ -0,0 +1,107 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from pypdf import PdfReader
+
+from RAG.config import EMBEDDING_MODEL
+from RAG.ingest import parse_page_range
+
+'''
+embedding throughput benchmark - texts/sec per backend and batch size, on real ingestion chunks.
+
+- huggingface  - HuggingFaceEmbeddings, what everything used so far (batch size = encode batch_size)
+- torch        - RAG/cpu_embeddings.py, length bucketed batches + dynamic padding
+- onnx         - the same with the int8 onnx model (exported on the first run)
+
+the first backend is the reference: every other backend's vectors are compared to it text by text,
+mean / min cosine is printed next to the throughput. exits with 1 when a backend's min cosine is
+below --min-agreement, so a faster backend can't quietly change what search returns.
+
+python -m benchmarks.embeddings
+python -m benchmarks.embeddings --backends huggingface onnx --batch-sizes 16 64 256 --threads 4
+'''
+
+DEFAULT_PDF = Path(__file__).parent.parent / "RAG" / "nodeJsNotes.pdf"
+
+
+def load_texts(path, limit):
+    pages = len(PdfReader(path).pages)
+    _, chunks = parse_page_range(str(path), 0, pages)
+    return [chunk for chunk, _ in chunks][:limit]
+
+
+def build(backend, threads):
+    if backend == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, encode_kwargs={})
+    from RAG.cpu_embeddings import CPUEmbeddings
+
+    return CPUEmbeddings(EMBEDDING_MODEL, backend=backend, threads=threads)
+
+
+def set_batch_size(model, batch_size):
+    if hasattr(model, "encode_kwargs"):
+        model.encode_kwargs["batch_size"] = batch_size
+    else:
+        model.batch_size = batch_size
+
+
+def cosine(a, b):
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="embedding texts/sec per backend and batch size")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PDF, help="pdf to take the chunks from")
+    parser.add_argument("--backends", nargs="+", default=["huggingface", "torch", "onnx"],
+                        help="the first one is the reference for the cosine agreement")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32, 64, 128])
+    parser.add_argument("--texts", type=int, default=512, help="number of chunks embedded per run")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads (default: EMBEDDING_THREADS or all cores)")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="min cosine to the reference vectors")
+    parser.add_argument("--output", help="save the results as json")
+    args = parser.parse_args()
+
+    texts = load_texts(args.path, args.texts)
+    print(f"📄 {len(texts)} chunks, {sum(map(len, texts)) / len(texts):.0f} chars on average")
+
+    results, reference, code = [], None, 0
+    for backend in args.backends:
+        model = build(backend, args.threads)
+        model.embed_documents(texts[:8])  # warm up - first call allocates buffers / builds the graph
+        vectors = None
+        for batch_size in args.batch_sizes:
+            set_batch_size(model, batch_size)
+            started = time.perf_counter()
+            vectors = model.embed_documents(texts)
+            seconds = time.perf_counter() - started
+            results.append({"backend": backend, "batch_size": batch_size, "texts_per_sec": round(len(texts) / seconds, 1)})
+            print(f"{backend:<12} batch {batch_size:>4}  {len(texts) / seconds:>9.1f} texts/sec")
+
+        if reference is None:
+            reference = vectors
+            continue
+        agreement = cosine(reference, vectors)
+        print(f"{backend:<12} cosine to {args.backends[0]}: mean {agreement.mean():.5f}, min {agreement.min():.5f}")
+        for row in results:
+            if row["backend"] == backend:
+                row.update(mean_cosine=round(float(agreement.mean()), 5), min_cosine=round(float(agreement.min()), 5))
+        if agreement.min() < args.min_agreement:
+            print(f"🐢 {backend} vectors drift from {args.backends[0]} (min cosine {agreement.min():.4f} < {args.min_agreement})")
+            code = 1
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"texts": len(texts), "results": results}, file, indent=2)
+        print(f"saved to {args.output}")
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
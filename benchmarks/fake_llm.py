@@ -0,0 +1,132 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+'''
+fake OpenAI compatible LLM server - the generation stage without the provider, its quota or its bill.
+
+answers POST .../chat/completions (plain and stream=true) after a configurable latency, so the
+worker's real code path runs end to end. point the worker at it with:
+
+LLM_BASE_URL=http://localhost:8080/v1/ GEMINI_API_KEY=fake python -m rag_queue.queues.prefork
+
+--error-rate makes a share of the requests fail with 429 / 503, to exercise the client's retries.
+json mode requests get a {"STEP": "OUTPUT", ...} answer, so the agent loops finish too.
+'''
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, same as the real api
+    latency_ms = 300
+    jitter_ms = 50
+    tokens_per_sec = 100
+    answer_tokens = 60
+    error_rate = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        with self.lock:
+            FakeLLMHandler.requests += 1
+
+        if random.random() < self.error_rate:
+            status = random.choice((429, 503))
+            self.send_json(status, {"error": {"message": "fake overload", "code": status}}, {"Retry-After": "0.1"})
+            return
+
+        time.sleep(max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000)
+        answer = self.answer(request)
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in request.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.answer_tokens,
+                 "total_tokens": prompt_tokens + self.answer_tokens}
+        if request.get("stream"):
+            self.stream(request, answer)
+        else:
+            self.send_json(200, {
+                "id": f"fake-{self.requests}", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}],
+                "usage": usage,
+            })
+
+    def answer(self, request):
+        question = next((m["content"] for m in reversed(request.get("messages", [])) if m.get("role") == "user"), "")
+        words = " ".join(["lorem"] * max(self.answer_tokens - 8, 0))
+        text = f"fake answer to: {str(question)[:80]} {words}"
+        if (request.get("response_format") or {}).get("type") in ("json_object", "json_schema"):
+            return json.dumps({"STEP": "OUTPUT", "CONTENT": text})
+        return text
+
+    def stream(self, request, answer):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = answer.split(" ")
+        for index, word in enumerate(words):
+            chunk = {
+                "id": f"fake-{self.requests}", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": word if index == 0 else " " + word},
+                             "finish_reason": "stop" if index == len(words) - 1 else None}],
+            }
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(1 / self.tokens_per_sec)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def serve(host="127.0.0.1", port=8080, **settings):
+    # settings override the FakeLLMHandler class attributes (latency_ms, error_rate, ...)
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), settings)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fake OpenAI compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=300, help="mean time to the first byte")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-sec", type=float, default=100, help="streaming speed")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429 / 503")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                   tokens_per_sec=args.tokens_per_sec, answer_tokens=args.answer_tokens, error_rate=args.error_rate)
+    print(f"🤖 fake llm on http://{args.host}:{args.port}/v1/ ({args.latency_ms}ms ± {args.jitter_ms}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
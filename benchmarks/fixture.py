@@ -0,0 +1,96 @@
+import argparse
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from RAG.config import INDEX_DIR
+from RAG.embeddings import get_embedding_model
+from RAG.ingest import IngestionEngine
+from RAG.lexical import LexicalIndex
+from RAG.local_store import LocalVectorStore
+
+from .stats import finish, print_report, summarize
+
+'''
+local vector store fixture + the ingestion stage of the benchmark.
+
+indexes pdfs (RAG/nodeJsNotes.pdf by default) into a separate local collection ("bench"), with
+the real embedding model, so the worker can be benchmarked without qdrant:
+
+python -m benchmarks.fixture
+RAG_COLLECTION=bench VECTOR_STORE=local python -m rag_queue.queues.prefork ...
+
+every embed batch and every upsert is timed, and reported as the "embed" / "upsert" stages.
+'''
+
+BENCH_COLLECTION = "bench"
+
+
+class TimedIngestionEngine(IngestionEngine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.samples = {"embed": [], "upsert": []}
+        self.embedding_model = TimedEmbeddings(self.embedding_model, self.samples["embed"])
+
+    def upsert(self, points):
+        started = time.perf_counter()
+        super().upsert(points)
+        self.samples["upsert"].append((time.perf_counter() - started) * 1000)
+
+
+class TimedEmbeddings:
+    def __init__(self, model, samples):
+        self.model = model
+        self.samples = samples
+
+    def embed_documents(self, texts):
+        started = time.perf_counter()
+        vectors = self.model.embed_documents(texts)
+        self.samples.append((time.perf_counter() - started) * 1000)
+        return vectors
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+def build_fixture(path, collection_name=BENCH_COLLECTION, embedding_cache=False, batch_size=64, workers=None):
+    # always from scratch, so every run measures the same amount of work
+    shutil.rmtree(INDEX_DIR / collection_name, ignore_errors=True)
+    shutil.rmtree(INDEX_DIR / f"{collection_name}.lexical", ignore_errors=True)
+
+    embedding_model = get_embedding_model(cache=embedding_cache)
+    engine = TimedIngestionEngine(
+        embedding_model=embedding_model,
+        collection_name=collection_name,
+        parse_workers=workers,
+        embed_batch_size=batch_size,
+        local_store=LocalVectorStore(embedding_model, collection_name=collection_name),
+        lexical_index=LexicalIndex(collection_name),
+    )
+    stats = engine.ingest(path)
+    return stats, engine.samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="build the local vector store fixture, report the ingestion stage")
+    parser.add_argument("path", nargs="?", default=Path(__file__).parent.parent / "RAG" / "nodeJsNotes.pdf",
+                        help="pdf file or directory")
+    parser.add_argument("--collection", default=BENCH_COLLECTION)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--embedding-cache", action="store_true", help="reuse cached vectors (measures the cache, not the model)")
+    parser.add_argument("--output", help="save the summary as json")
+    parser.add_argument("--compare", help="baseline json from a previous --output run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stats, samples = build_fixture(args.path, args.collection, args.embedding_cache, args.batch_size, args.workers)
+    summary = summarize(samples)
+    extra = {"chunks": stats.chunks, "pages_per_sec": round(stats.pages_per_sec, 1), "chunks_per_sec": round(stats.chunks_per_sec, 1)}
+    print_report(f"ingestion ({args.collection})", summary, extra)
+    sys.exit(finish(summary, args.output, args.compare, args.tolerance, extra))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from redis import Redis
+from rq.job import Job
+
+from .stats import finish, print_report, summarize
+
+'''
+load generator - replays a jsonl query log against rag_queue/server.py at a fixed rate.
+
+every line of the log is {"query": "..."}. requests are sent open loop: request i goes out at
+start + i / qps no matter how slow the earlier ones are, so a slow server shows up as growing
+latency instead of a silently lower request rate.
+
+a request is POST /chat + long-poll GET /job-status until the job is done. afterwards the jobs
+are read back from redis for the per stage numbers:
+- enqueue      - the POST /chat round trip
+- queue_wait   - enqueued_at -> started_at, time spent waiting for a free worker
+- embed, search, prompt, llm, job - the worker's spans (job.meta["timings"], see rag_queue/metrics.py)
+- end_to_end   - POST /chat -> result seen by the client
+answer cache hits skip most of the spans, they're counted separately. requests that got another
+request's job id (coalesced, see rag_queue/single_flight.py) add their end_to_end, the job's
+own numbers are counted once. a 404 on /job-status means the job was shed by its ttl or expired.
+
+usage (fake llm + fixture + worker + server running, see README):
+python -m benchmarks.load benchmarks/queries.jsonl --qps 5 --duration 60 --output run.json
+python -m benchmarks.load benchmarks/queries.jsonl --qps 5 --duration 60 --compare run.json
+'''
+
+DEFAULT_LOG = Path(__file__).parent / "queries.jsonl"
+
+
+def read_queries(path):
+    with open(path) as file:
+        return [json.loads(line)["query"] for line in file if line.strip()]
+
+
+def job_id_from(response_body):
+    # /chat answers with ["status: queued", "job_id: <id>"] (a set, so in any order)
+    for item in response_body:
+        if item.startswith("job_id: "):
+            return item[len("job_id: "):]
+    raise ValueError(f"no job id in /chat response {response_body!r}")
+
+
+async def run_one(http, query, timeout):
+    started = time.perf_counter()
+    response = await http.post("/chat", params={"query": query})
+    enqueue_ms = (time.perf_counter() - started) * 1000
+    if response.status_code == 429:  # shed by the admission control
+        return {"job_id": None, "status": "rejected", "enqueue_ms": enqueue_ms, "end_to_end_ms": None}
+    response.raise_for_status()
+    job_id = job_id_from(response.json())
+
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        wait = min(30, max(1, deadline - time.perf_counter()))
+        response = await http.get("/job-status", params={"job_id": job_id, "wait": wait})
+        if response.status_code == 404:  # dropped by its queue ttl (shed) or expired before we saw the result
+            return {"job_id": job_id, "status": "expired", "enqueue_ms": enqueue_ms, "end_to_end_ms": None}
+        response.raise_for_status()
+        status = response.json()
+        if status["status"] in ("finished", "failed", "stopped", "canceled"):
+            return {"job_id": job_id, "status": status["status"], "enqueue_ms": enqueue_ms,
+                    "end_to_end_ms": (time.perf_counter() - started) * 1000}
+    return {"job_id": job_id, "status": "timeout", "enqueue_ms": enqueue_ms, "end_to_end_ms": None}
+
+
+async def generate_load(base_url, queries, qps, total, timeout, connections):
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        started = time.perf_counter()
+        tasks = []
+        for index, query in enumerate(itertools.islice(itertools.cycle(queries), total)):
+            delay = started + index / qps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(run_one(http, query, timeout)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return results, time.perf_counter() - started
+
+
+def collect_samples(results, connection):
+    samples = {"enqueue": [], "queue_wait": [], "embed": [], "search": [], "prompt": [], "llm": [], "job": [], "end_to_end": []}
+    counts = {"ok": 0, "failed": 0, "rejected": 0, "expired": 0, "errors": 0, "cache_hits": 0, "coalesced": 0}
+    finished = [result for result in results if isinstance(result, dict)]
+    counts["errors"] = len(results) - len(finished)
+    job_ids = list(dict.fromkeys(result["job_id"] for result in finished if result["job_id"]))
+    jobs = {job.id: job for job in Job.fetch_many(job_ids, connection=connection) if job}
+    seen = set()  # coalesced requests share a job (single_flight.py) - its timings count once
+
+    for result in finished:
+        samples["enqueue"].append(result["enqueue_ms"])
+        if result["status"] in ("rejected", "expired"):
+            counts[result["status"]] += 1
+            continue
+        if result["status"] != "finished":
+            counts["failed"] += 1
+            continue
+        counts["ok"] += 1
+        samples["end_to_end"].append(result["end_to_end_ms"])
+        if result["job_id"] in seen:
+            counts["coalesced"] += 1
+            continue
+        seen.add(result["job_id"])
+        job = jobs.get(result["job_id"])
+        if job is None:
+            continue
+        if job.enqueued_at and job.started_at:
+            samples["queue_wait"].append((job.started_at - job.enqueued_at).total_seconds() * 1000)
+        timings = job.meta.get("timings") or {}
+        if timings.get("outcome", "").endswith("_cache"):
+            counts["cache_hits"] += 1
+            continue
+        for stage in ("embed", "search", "prompt", "llm", "job"):
+            if f"{stage}_ms" in timings:
+                samples[stage].append(timings[f"{stage}_ms"])
+    return samples, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay a jsonl query log against the rag_queue api")
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG, help='jsonl file, one {"query": ...} per line')
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--qps", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load (qps * duration requests)")
+    parser.add_argument("--requests", type=int, default=None, help="send exactly this many requests instead")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a single request may take")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--output", help="save the summary as json")
+    parser.add_argument("--compare", help="baseline json from a previous --output run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    queries = read_queries(args.log)
+    total = args.requests or max(1, int(args.qps * args.duration))
+    print(f"🚀 {total} requests at {args.qps} qps against {args.url} ({len(queries)} distinct queries)")
+    results, seconds = asyncio.run(generate_load(args.url, queries, args.qps, total, args.timeout, args.connections))
+
+    error = next((result for result in results if isinstance(result, BaseException)), None)
+    if error is not None:
+        print(f"⚠️ first request error: {error!r}")
+    samples, counts = collect_samples(results, Redis(host=args.redis_host, port=args.redis_port))
+    summary = summarize(samples)
+    extra = {**counts, "seconds": round(seconds, 2), "throughput_rps": round(counts["ok"] / seconds, 2) if seconds else 0.0}
+    print_report(f"rag_queue load ({args.qps} qps)", summary, extra)
+    sys.exit(finish(summary, args.output, args.compare, args.tolerance, extra))
+
+
+if __name__ == "__main__":
+    main()
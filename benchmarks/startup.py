@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .stats import finish, print_report, summarize
+
+'''
+startup benchmark for the rag_queue api server - how fast a fresh pod can take requests.
+
+- import   - `import rag_queue.server` in a fresh interpreter, without the interpreter's own startup
+- startup  - `uvicorn rag_queue.server:app` launched -> first 200 on GET /
+- rss      - resident memory of the running server process (linux /proc)
+also checks that none of HEAVY_MODULES got imported: the server only enqueues jobs by dotted path,
+the model / qdrant / llm client only live in the worker.
+
+exits with 1 when the median startup is over --budget-ms or a heavy module was imported, so CI can
+run it next to the other checks:
+
+python -m benchmarks.startup
+python -m benchmarks.startup --runs 10 --budget-ms 1000 --output startup.json
+
+the import part also runs with the tests (tests/test_startup.py).
+'''
+
+MODULE = "rag_queue.server"
+APP = "rag_queue.server:app"
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "onnxruntime", "langchain", "langchain_core",
+                 "langchain_huggingface", "langchain_qdrant", "qdrant_client", "openai", "tiktoken")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - started) * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module=MODULE):
+    output = subprocess.run([sys.executable, "-c", CHILD.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module=MODULE, top=10):
+    # -X importtime, only the packages imported directly by the module (1 level deep), by cumulative time
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None  # no /proc (macos ...)
+
+
+def measure_startup(app=APP, timeout=30):
+    # -> (ms until the first 200 on GET /, resident memory in mb)
+    port = free_port()
+    # one client made up front - a new one per poll would add its own setup time to every attempt
+    http = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=0.5)
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+                               cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with {process.returncode}: {process.stderr.read().decode()[-500:]}")
+            try:
+                if http.get("/").status_code == 200:
+                    return (time.perf_counter() - started) * 1000, rss_mb(process.pid)
+            except httpx.TransportError:
+                time.sleep(0.005)
+        raise TimeoutError(f"server didn't answer within {timeout}s")
+    finally:
+        http.close()
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import time, startup time and memory of the api server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="max median startup (launch -> first 200)")
+    parser.add_argument("--output", help="save the summary as json")
+    parser.add_argument("--compare", help="baseline json from a previous --output run")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    samples = {"import": [], "startup": []}
+    heavy, memory = set(), []
+    for _ in range(args.runs):
+        result = measure_import()
+        samples["import"].append(result["ms"])
+        heavy.update(result["heavy"])
+        startup_ms, rss = measure_startup()
+        samples["startup"].append(startup_ms)
+        if rss is not None:
+            memory.append(rss)
+
+    print(f"\nslowest imports of {MODULE} (cumulative ms)")
+    for ms, name in slowest_imports():
+        print(f"{ms:>10.1f}  {name}")
+
+    summary = summarize(samples)
+    extra = {"rss_mb": round(max(memory), 1) if memory else None, "heavy_modules": sorted(heavy)}
+    print_report(f"{APP} startup ({args.runs} runs)", summary, extra)
+
+    code = finish(summary, args.output, args.compare, args.tolerance, extra)
+    if heavy:
+        print(f"🐢 the server imports {', '.join(sorted(heavy))} - those belong in the worker")
+        code = 1
+    if summary["startup"]["p50_ms"] > args.budget_ms:
+        print(f"🐢 median startup {summary['startup']['p50_ms']}ms is over the {args.budget_ms:.0f}ms budget")
+        code = 1
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
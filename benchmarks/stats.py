@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+
+'''
+latency stats shared by the benchmark scripts.
+
+every script collects {stage: [ms, ms, ...]} and prints the same p50 / p95 / p99 table.
+--output saves the summary as json, --compare checks it against a saved baseline and
+exits with 1 when a stage got slower than the tolerance allows - so it can gate a deploy.
+'''
+
+
+def summarize(samples):
+    summary = {}
+    for stage, values in samples.items():
+        if not values:
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        summary[stage] = {
+            "count": int(len(values)),
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
+    return summary
+
+
+def print_report(title, summary, extra=None):
+    print(f"\n{title}")
+    print(f"{'stage':<14}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for stage, row in summary.items():
+        print(f"{stage:<14}{row['count']:>8}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    for key, value in (extra or {}).items():
+        print(f"{key}: {value}")
+
+
+def compare(summary, baseline, tolerance=0.2, metric="p95_ms"):
+    # -> list of "stage: 120ms -> 180ms (+50%)" for every stage slower than baseline * (1 + tolerance)
+    regressions = []
+    for stage, row in summary.items():
+        before = baseline.get(stage, {}).get(metric)
+        if before and row[metric] > before * (1 + tolerance):
+            regressions.append(f"{stage} {metric}: {before}ms -> {row[metric]}ms (+{(row[metric] / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def finish(summary, output=None, baseline_path=None, tolerance=0.2, extra=None):
+    # writes / compares the summary, returns the process exit code
+    if output:
+        with open(output, "w") as file:
+            json.dump({"stages": summary, **(extra or {})}, file, indent=2)
+        print(f"saved to {output}")
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)["stages"]
+        regressions = compare(summary, baseline, tolerance)
+        for regression in regressions:
+            print("🐢 regression:", regression)
+        if regressions:
+            return 1
+        print(f"✅ no stage slower than baseline + {tolerance:.0%}")
+    return 0
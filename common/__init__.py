@@ -0,0 +1 @@
+# common package - helpers shared by every part of the sandbox (scripts, RAG, rag_queue)
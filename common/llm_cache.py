@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+'''
+deterministic LLM response cache, used by the pooled client (llm_client.py).
+
+the scripts in prompts/ and the agent loops send the exact same chat.completions payloads again
+and again while developing. every response is stored under sha256 of the canonical request
+(endpoint, model, messages, response_format, sampling params...) in a sqlite file, so the same
+request is answered from disk.
+
+LLM_CACHE picks the mode:
+- off    (default) - no caching
+- on     - read-through, a miss goes to the provider and is stored
+- record - always call the provider and (over)write the stored response
+- replay - only serve from the cache, a miss raises CacheMiss. runs fully offline
+
+streamed responses are stored as their list of chunks and replayed chunk by chunk.
+the file is kept under LLM_CACHE_MAX_MB, least recently used responses are evicted first.
+'''
+
+CACHE_MODES = ("off", "on", "record", "replay")
+DEFAULT_CACHE_PATH = Path(__file__).parent / ".cache" / "llm_responses.sqlite3"
+# per-call transport options, they don't change what the model answers
+NON_KEY_PARAMS = ("stream", "timeout", "extra_headers", "extra_query", "extra_body", "stream_options")
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+def canonical(value):
+    # pydantic response_format classes -> their json schema, so the key is stable across runs
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        return {"schema": value.__name__, "json_schema": value.model_json_schema()}
+    if isinstance(value, dict):
+        return {key: canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return value
+
+
+def request_key(endpoint, kwargs):
+    request = {key: value for key, value in kwargs.items() if key not in NON_KEY_PARAMS}
+    payload = json.dumps({"endpoint": endpoint, "stream": bool(kwargs.get("stream")), **canonical(request)},
+                         sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, mode="on", max_bytes=256 * 2**20):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"unknown LLM_CACHE mode {mode!r}, expected one of {CACHE_MODES}")
+        self.path = Path(path)
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._conn_pid = None
+        self._writes_since_evict = 0
+
+    @classmethod
+    def from_env(cls):
+        mode = os.getenv("LLM_CACHE", "off")
+        if mode == "off":
+            return None
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            mode=mode,
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", 256)) * 2**20),
+        )
+
+    @property
+    def conn(self):
+        # same as the embedding cache - one sqlite connection per process
+        if self._conn is None or self._conn_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @property
+    def reads(self):
+        return self.mode in ("on", "replay")
+
+    @property
+    def writes(self):
+        return self.mode in ("on", "record")
+
+    def get(self, key):
+        # -> the stored json (a response, or a list of stream chunks), None on a miss
+        if not self.reads:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key, endpoint, response):
+        if not self.writes:
+            return
+        data = json.dumps(response, separators=(",", ":"))
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, response, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, data, len(data), now, now),
+            )
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= 100:
+                self._writes_since_evict = 0
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        # walk from the least recently used, deleting until we're 10% below the limit
+        to_free = total - int(self.max_bytes * 0.9)
+        keys = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            keys.append((key,))
+            to_free -= size
+            if to_free <= 0:
+                break
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,235 @@
+import os
+import random
+import threading
+import time
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ParsedChatCompletion
+
+from .llm_cache import CacheMiss, ResponseCache, request_key
+
+'''
+one shared, pooled LLM client for every script and the rag_queue worker.
+
+before, every module built its own OpenAI(base_url=".../v1beta/") with default settings, so
+nothing limited how hard a process hit the provider, and under load the workers just kept
+bouncing off 429s. get_client() returns a client with the same .chat.completions.create() /
+.parse() surface, plus:
+
+- connection pool  - one tuned httpx.Client (keep-alive) shared by every call in the process
+- rate limits      - token buckets on requests/min (LLM_RPM) and tokens/min (LLM_TPM), off unless
+                     set - the provider's limits depend on the account, so there's no safe default.
+                     tokens are estimated before the call (~4 chars per token + max_tokens) and
+                     corrected with the real usage once the response is back
+- concurrency      - a global semaphore, at most LLM_CONCURRENCY calls in flight per process
+- retries          - 429 / 5xx / connection errors are retried with full jitter exponential
+                     backoff (LLM_MAX_RETRIES), honouring Retry-After when the server sends it
+                     (capped at backoff_cap, a bogus header can't park a worker for minutes)
+
+the limits are per process - with N rq workers, set LLM_RPM / LLM_TPM to (provider limit / N).
+LLM_BASE_URL points it at another OpenAI compatible server, e.g. a local fake one.
+LLM_CACHE=on|record|replay answers repeated requests from a local response cache (llm_cache.py).
+'''
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/"
+DEFAULT_COMPLETION_TOKENS = 512  # charged up front when the call doesn't set max_tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        # blocks until `amount` is available. more than the capacity waits for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        # positive -> the call cost more than estimated, negative -> give the difference back
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def estimate_tokens(kwargs):
+    chars = 0
+    for message in kwargs.get("messages", ()):
+        content = message.get("content") or ""
+        if isinstance(content, list):  # multimodal - only the text parts, images are billed differently
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        chars += len(content)
+    completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return chars // 4 + completion
+
+
+def is_retryable(error):
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Completions:
+    def __init__(self, llm):
+        self.llm = llm
+
+    def create(self, **kwargs):
+        return self.llm.cached_call("create", self.llm.openai.chat.completions.create, kwargs)
+
+    def parse(self, **kwargs):
+        return self.llm.cached_call("parse", self.llm.openai.chat.completions.parse, kwargs)
+
+
+class Chat:
+    def __init__(self, llm):
+        self.completions = Completions(llm)
+
+
+class PooledLLMClient:
+    def __init__(self, api_key=None, base_url=None, rpm=None, tpm=None, concurrency=None, max_retries=None,
+                 max_connections=None, timeout=60.0, backoff_base=1.0, backoff_cap=30.0, cache=None):
+        rpm = rpm or int(os.getenv("LLM_RPM", 0))  # 0 -> no limit
+        tpm = tpm or int(os.getenv("LLM_TPM", 0))
+        concurrency = concurrency or int(os.getenv("LLM_CONCURRENCY", 8))
+        max_connections = max_connections or concurrency * 2
+
+        self.http = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=60),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+        )
+        self.openai = OpenAI(
+            api_key=api_key or os.getenv("GEMINI_API_KEY"),
+            base_url=base_url or os.getenv("LLM_BASE_URL", GEMINI_BASE_URL),
+            http_client=self.http,
+            max_retries=0,  # retries happen here, so they go through the rate limits too
+        )
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", 5))
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.chat = Chat(self)
+
+        self.retries = 0
+        self.throttled = 0
+
+    def cached_call(self, endpoint, method, kwargs):
+        if self.cache is None:
+            return self.call(method, kwargs)
+
+        key = request_key(endpoint, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.restore(endpoint, kwargs, cached)
+        if self.cache.mode == "replay":
+            raise CacheMiss(f"no cached response for this {kwargs.get('model')} request ({key[:12]}), LLM_CACHE=replay")
+
+        response = self.call(method, kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(key, endpoint, response)
+        self.cache.set(key, endpoint, response.model_dump(mode="json"))
+        return response
+
+    def restore(self, endpoint, kwargs, data):
+        if kwargs.get("stream"):
+            return (ChatCompletionChunk.model_validate(chunk) for chunk in data)
+        if endpoint == "parse":
+            return ParsedChatCompletion[kwargs["response_format"]].model_validate(data)
+        return ChatCompletion.model_validate(data)
+
+    def _record_stream(self, key, endpoint, stream):
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk.model_dump(mode="json"))
+            yield chunk
+        self.cache.set(key, endpoint, chunks)  # only complete streams are stored
+
+    def call(self, method, kwargs):
+        estimate = estimate_tokens(kwargs)
+        for attempt in range(self.max_retries + 1):
+            if self.requests is not None:
+                self.requests.acquire()
+            if self.tokens is not None:
+                self.tokens.acquire(estimate)
+            self.slots.acquire()
+            try:
+                response = method(**kwargs)
+            except Exception as error:
+                self.slots.release()
+                if self.tokens is not None:
+                    self.tokens.adjust(-estimate)  # nothing was generated, give the tokens back
+                if not is_retryable(error) or attempt == self.max_retries:
+                    raise
+                if getattr(error, "status_code", None) == 429:
+                    self.throttled += 1
+                self.retries += 1
+                # full jitter - spreads the retries of many workers instead of retrying in lockstep
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                time.sleep(max(delay, min(retry_after(error) or 0, self.backoff_cap)))
+                continue
+
+            self.slots.release()
+            if kwargs.get("stream"):
+                return self._stream(response)
+            usage = getattr(response, "usage", None)
+            if self.tokens is not None and usage is not None and getattr(usage, "total_tokens", None):
+                self.tokens.adjust(usage.total_tokens - estimate)
+            return response
+
+    def _stream(self, stream):
+        # the body only starts on the first next(), so the slot is taken while the stream is read -
+        # a stream that's never iterated never holds one
+        with self.slots:
+            try:
+                yield from stream
+            finally:
+                stream.close()  # abandoned halfway - the connection goes back to the pool
+
+    def stats(self):
+        stats = {"retries": self.retries, "throttled": self.throttled}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client(api_key=None, base_url=None):
+    # one client per process, so every caller shares the connection pool, the limits and the semaphore.
+    # a forked rq worker builds its own, sockets and locks must not be shared across fork()
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = PooledLLMClient(api_key=api_key, base_url=base_url)
+            _client_pid = os.getpid()
+        return _client
@@ -2,14 +2,11 @@ import os
 import base64
 import requests
 from dotenv import load_dotenv
-from openai import OpenAI
+from common.llm_client import get_client # run from the repo root: python -m multiModal.main
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
 # Download and encode image
 image_url = "https://images.pexels.com/photos/34298347/pexels-photo-34298347.jpeg"
@@ -1,5 +1,5 @@
 # Chain of Thought (CoT) Prompting
-from openai import OpenAI
+from common.llm_client import get_client # run from the repo root: python -m prompts.cot
 from dotenv import load_dotenv
 import os
 import json
@@ -7,10 +7,7 @@ import json
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
 SYSTEM_PROMPT = '''
 you are a advanced AI model that excels answering user queries.
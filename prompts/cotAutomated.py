@@ -1,16 +1,14 @@
 # Chain of Thought (CoT) Prompting
-from openai import OpenAI
+from common.llm_client import get_client
 from dotenv import load_dotenv
 import os
 import json
+from AiAgents.engine import AgentEngine # run from the repo root: python -m prompts.cotAutomated
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
 SYSTEM_PROMPT = '''
 you are a advanced AI model that excels answering user queries.
@@ -45,32 +43,11 @@ Assistant: {{
 }}
 '''
 user_prompt = input("👉")
-message_history = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": user_prompt}
-    ]
-while True:
-    response = client.chat.completions.create(
-        model="gemini-2.5-flash",
-        response_format={"type": "json_object"},
-        messages=message_history
-    )
 
-
-    raw_response = response.choices[0].message.content
-    message_history.append({"role": "assistant", "content": raw_response})
-
-    parsed_results = json.loads(raw_response)
-
-    if parsed_results.get("STEP") == "START":
-        print("🔥", parsed_results.get("CONTENT"))
-        continue
-    if parsed_results.get("STEP") == "PLAN":
-        print("🧠", parsed_results.get("CONTENT"))
-        continue
-    if parsed_results.get("STEP") == "OUTPUT":
-        print("🤖", parsed_results.get("CONTENT"))
-        break
+# same loop as before (START -> PLAN... -> OUTPUT), but the history sent each step stays under a token budget
+agent = AgentEngine(client, SYSTEM_PROMPT)
+agent.run(user_prompt)
+print("📊", agent.report())
 
 
 # response = client.chat.completions.create(
@@ -1,14 +1,11 @@
 # persona based prompting
-from openai import OpenAI
+from common.llm_client import get_client # run from the repo root: python -m prompts.persona
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
 SYSTEM_PROMPT = ''''
 You are a AI persona assistant named Uzair.
@@ -1,15 +1,12 @@
 # Structured Outputs with few Short prompting
-from openai import OpenAI
+from common.llm_client import get_client # run from the repo root: python -m prompts.structuredOutputs
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-client = OpenAI(
-    api_key = API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 
 SYSTEM_PROMPT = '''You are an expert in coding and respond questions related to coding only.
 If the user asks something other than coding, reply with, I can only help you with coding questions.
@@ -1,14 +1,11 @@
-from openai import OpenAI
+from common.llm_client import get_client # run from the repo root: python -m prompts.systemPrompt
 from dotenv import load_dotenv
 import os
 
 load_dotenv() # Load environment variables from a .env file, without it the API key won't be found
 API_KEY = os.getenv("GEMINI_API_KEY") # Get the Gemini API key from environment variables
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+client = get_client(api_key=API_KEY)
 response = client.chat.completions.create(
     model="gemini-2.5-flash",
     messages=[
@@ -0,0 +1,123 @@
+import math
+import os
+import time
+
+from rq.job import Job
+from rq.worker_registration import WORKERS_BY_QUEUE_KEY
+
+from .metrics import RECENT_JOBS_KEY
+
+'''
+admission control + load shedding for /chat and /chat/batch.
+
+without it a traffic spike just grows the queue, and every user waits minutes - including the
+ones that only asked one question. so before enqueueing, the server estimates how long the new
+job would wait:
+
+    estimated wait = (jobs queued at the same or a higher priority + new jobs) * mean job time / workers
+
+- mean job time  - average of the last RECENT_JOBS jobs (the workers push it, see metrics.record)
+- workers        - rq workers registered on that queue
+and answers 429 + Retry-After when that's over the priority's MAX_WAIT (or the queue is deeper
+than MAX_DEPTH, in case the job time is way off). high priority only queues behind high priority
+work, so interactive users keep getting in while bulk traffic is told to come back later.
+
+jobs that are still queued after their priority's JOB_TTL are dropped by rq (the job key expires
+before a worker picks it up, dequeue skips it) - the client gave up on them long ago anyway.
+their ids stay in the queue list until then, so LLEN would count them as work ahead. at most every
+PURGE_INTERVAL seconds the snapshot checks the PURGE_SCAN oldest ids of every queue (the head of
+the list, where expired ones are - a queue has one ttl) and LREMs the ones whose job key is gone.
+'''
+
+MAX_WAIT = {
+    "high": float(os.getenv("ADMISSION_MAX_WAIT_HIGH", 15)),
+    "default": float(os.getenv("ADMISSION_MAX_WAIT", 60)),
+    "low": float(os.getenv("ADMISSION_MAX_WAIT_LOW", 600)),
+}
+JOB_TTL = {"high": 120, "default": 600, "low": 3600}  # seconds a job may sit in the queue
+MAX_DEPTH = int(os.getenv("ADMISSION_MAX_DEPTH", 10000))  # per queue
+DEFAULT_JOB_SECONDS = 2.0  # until the first jobs finished
+PURGE_INTERVAL = 5.0  # seconds between expired id purges
+PURGE_SCAN = 1000  # ids checked per queue and purge
+
+
+class Overloaded(Exception):
+    def __init__(self, priority, estimated_wait, retry_after):
+        super().__init__(f"{priority} queue is full, estimated wait {estimated_wait:.0f}s")
+        self.priority = priority
+        self.estimated_wait = estimated_wait
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, connection, queues, max_wait=None, max_depth=MAX_DEPTH, default_job_seconds=DEFAULT_JOB_SECONDS):
+        self.connection = connection
+        self.queues = queues  # {priority: Queue}, highest priority first
+        self.max_wait = max_wait or MAX_WAIT
+        self.max_depth = max_depth
+        self.default_job_seconds = default_job_seconds
+        self.purged_at = None
+
+    def purge_expired(self):
+        # -> number of expired job ids removed from the queues. 3 round trips, whatever the queue sizes
+        pipeline = self.connection.pipeline(transaction=False)
+        for queue in self.queues.values():
+            pipeline.lrange(queue.key, 0, PURGE_SCAN - 1)
+        heads = [[job_id.decode() for job_id in job_ids] for job_ids in pipeline.execute()]
+
+        for job_ids in heads:
+            for job_id in job_ids:
+                pipeline.exists(Job.key_for(job_id))
+        alive = iter(pipeline.execute())
+
+        purged = 0
+        for queue, job_ids in zip(self.queues.values(), heads):
+            for job_id in job_ids:
+                if not next(alive):
+                    pipeline.lrem(queue.key, 1, job_id)
+                    purged += 1
+        if purged:
+            pipeline.execute()
+        return purged
+
+    def snapshot(self):
+        # queue depths, workers per queue and recent job times in one round trip (+ the periodic purge)
+        now = time.monotonic()
+        if self.purged_at is None or now - self.purged_at >= PURGE_INTERVAL:
+            self.purge_expired()
+            self.purged_at = now
+        pipeline = self.connection.pipeline(transaction=False)
+        for queue in self.queues.values():
+            pipeline.llen(queue.key)
+        for queue in self.queues.values():
+            pipeline.scard(WORKERS_BY_QUEUE_KEY % queue.name)
+        pipeline.lrange(RECENT_JOBS_KEY, 0, -1)
+        replies = pipeline.execute()
+
+        count = len(self.queues)
+        depths = dict(zip(self.queues, replies[:count]))
+        workers = dict(zip(self.queues, replies[count:2 * count]))
+        recent = [float(seconds) for seconds in replies[-1]]
+        job_seconds = sum(recent) / len(recent) if recent else self.default_job_seconds
+        return depths, workers, job_seconds
+
+    def estimate_wait(self, priority, count=1, snapshot=None):
+        depths, workers, job_seconds = snapshot or self.snapshot()
+        ahead = 0
+        for name in self.queues:
+            ahead += depths[name]
+            if name == priority:
+                break
+        # no worker registered yet (dev setups start the server first) - count it as one
+        return (ahead + count) * job_seconds / max(workers[priority], 1)
+
+    def admit(self, priority, count=1):
+        # -> estimated wait in seconds, raises Overloaded when the job(s) should be turned away
+        snapshot = self.snapshot()
+        wait = self.estimate_wait(priority, count, snapshot)
+        depths, _, job_seconds = snapshot
+        if wait > self.max_wait[priority] or depths[priority] + count > self.max_depth:
+            # roughly when enough of the backlog is gone for this request to fit
+            retry_after = max(1, math.ceil(max(wait - self.max_wait[priority], job_seconds)))
+            raise Overloaded(priority, wait, retry_after)
+        return wait
@@ -0,0 +1,160 @@
+import hashlib
+import re
+import time
+
+import numpy as np
+
+'''
+answer cache for process_query, stored in the same redis (valkey) the queue uses.
+
+2 levels:
+- exact    - key is the normalized query text ("What is Node.js?" == "what is node.js")
+- semantic - if there's no exact match, the query embedding is compared (cosine) against the
+             embeddings of cached queries, and an answer is reused when it's above the threshold
+
+redis layout (scope = rag:answer:{collection}:{store}:{generation}):
+- {scope}:entry:{hash} -> hash {query, answer, vector}, expires after ttl seconds
+- {scope}:index        -> sorted set of entry hashes, scored by the time they were cached.
+                          used for the semantic scan + size based eviction (oldest first)
+
+an answer is only as good as the index it was retrieved from: workers on another collection or
+vector store never share entries, and every finished ingestion bumps the collection's generation
+(bump_generation, rag:index_generation:{collection}) so answers built from the old corpus aren't
+served anymore - they just expire with their ttl. the generation is re-read every
+GENERATION_CHECK seconds, not on every lookup.
+'''
+
+GENERATION_KEY = "rag:index_generation:{}"
+GENERATION_CHECK = 5.0
+
+
+def normalize_query(query):
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def bump_generation(connection, collection):
+    # called when an ingestion into the collection finished -> the answer cache starts over
+    return connection.incr(GENERATION_KEY.format(collection))
+
+
+class AnswerCache:
+    def __init__(self, connection, ttl=3600, max_entries=1000, similarity_threshold=0.95, prefix="rag:answer",
+                 collection="default", store="qdrant", generation_check=GENERATION_CHECK):
+        self.connection = connection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.prefix = prefix
+        self.collection = collection
+        self.store = store
+        self.generation_check = generation_check
+        self.stats_key = f"{prefix}:stats"
+        self._scope, self._scope_checked = None, 0.0
+        # entry hash -> normalized vector, so every lookup doesn't pull all vectors out of redis again
+        self.vectors = {}
+
+    def scope(self):
+        now = time.monotonic()
+        if self._scope is None or now - self._scope_checked >= self.generation_check:
+            generation = int(self.connection.get(GENERATION_KEY.format(self.collection)) or 0)
+            scope = f"{self.prefix}:{self.collection}:{self.store}:{generation}"
+            if scope != self._scope:
+                self.vectors.clear()  # the vectors of the old generation's entries
+            self._scope, self._scope_checked = scope, now
+        return self._scope
+
+    @property
+    def index_key(self):
+        return f"{self.scope()}:index"
+
+    def entry_key(self, entry_id):
+        return f"{self.scope()}:entry:{entry_id}"
+
+    def entry_id(self, query):
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def _count(self, field):
+        self.connection.hincrby(self.stats_key, field, 1)
+
+    def stats(self):
+        return {key.decode(): int(value) for key, value in self.connection.hgetall(self.stats_key).items()}
+
+    def _live_entries(self):
+        # drop whatever is older than the ttl from the index, the entry keys themselves expire on their own
+        self.connection.zremrangebyscore(self.index_key, "-inf", time.time() - self.ttl)
+        return [entry_id.decode() for entry_id in self.connection.zrange(self.index_key, 0, -1)]
+
+    def contains(self, query):
+        return bool(self.connection.exists(self.entry_key(self.entry_id(query))))
+
+    def get_exact(self, query):
+        answer = self.connection.hget(self.entry_key(self.entry_id(query)), "answer")
+        if answer is None:
+            return None
+        self._count("exact_hits")
+        return answer.decode("utf-8")
+
+    def get_similar(self, embedding):
+        entry_ids = self._live_entries()
+        if not entry_ids:
+            self._count("misses")
+            return None
+
+        missing = [entry_id for entry_id in entry_ids if entry_id not in self.vectors]
+        if missing:
+            pipeline = self.connection.pipeline(transaction=False)
+            for entry_id in missing:
+                pipeline.hget(self.entry_key(entry_id), "vector")
+            for entry_id, blob in zip(missing, pipeline.execute()):
+                if blob is not None:
+                    self.vectors[entry_id] = np.frombuffer(blob, dtype=np.float32)
+
+        live = set(entry_ids)
+        for entry_id in list(self.vectors):
+            if entry_id not in live:
+                del self.vectors[entry_id]
+
+        candidates = [entry_id for entry_id in entry_ids if entry_id in self.vectors]
+        if not candidates:
+            self._count("misses")
+            return None
+
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        scores = np.stack([self.vectors[entry_id] for entry_id in candidates]) @ query_vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            self._count("misses")
+            return None
+
+        answer = self.connection.hget(self.entry_key(candidates[best]), "answer")
+        if answer is None:  # expired in between
+            self._count("misses")
+            return None
+        self._count("semantic_hits")
+        return answer.decode("utf-8")
+
+    def set(self, query, embedding, answer):
+        entry_id = self.entry_id(query)
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)  # stored normalized, so cosine is just a dot product
+
+        pipeline = self.connection.pipeline()
+        pipeline.hset(self.entry_key(entry_id), mapping={
+            "query": normalize_query(query),
+            "answer": answer,
+            "vector": vector.tobytes(),
+        })
+        pipeline.expire(self.entry_key(entry_id), self.ttl)
+        pipeline.zadd(self.index_key, {entry_id: time.time()})
+        pipeline.execute()
+        self.vectors[entry_id] = vector
+
+        # size based eviction - oldest entries go first
+        overflow = self.connection.zcard(self.index_key) - self.max_entries
+        if overflow > 0:
+            evicted = [entry_id.decode() for entry_id, _ in self.connection.zpopmin(self.index_key, overflow)]
+            self.connection.delete(*[self.entry_key(entry_id) for entry_id in evicted])
+            for entry_id in evicted:
+                self.vectors.pop(entry_id, None)
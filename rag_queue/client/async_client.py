@@ -0,0 +1,117 @@
+import time
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from rq.job import Job
+from rq.results import Result
+
+from ..token_stream import token_stream_key
+
+'''
+asyncio redis client for the api server.
+
+the sync `Redis` in rq_client.py blocks a threadpool thread per request. this one is pooled and
+async, so a single server process can keep thousands of long-poll / sse requests waiting at once.
+
+waiting for a job doesn't poll either: rq appends every job result to a redis stream
+(rq:results:<job_id>), so we just XREAD BLOCK on that stream and wake up when the worker writes it.
+'''
+
+# blocking pool - when all connections are busy, requests wait for a free one instead of erroring out
+async_redis = Redis(connection_pool=BlockingConnectionPool(
+    host='localhost', port=6379, max_connections=500, timeout=30
+    ))
+
+
+async def job_exists(job_id):
+    return bool(await async_redis.exists(Job.key_for(job_id)))
+
+
+async def job_status(job_id):
+    status = await async_redis.hget(Job.key_for(job_id), "status")
+    return status.decode() if status else None
+
+
+def _to_result(job_id, entry):
+    result_id, payload = entry
+    # restore() only decodes the payload, the connection is never used here
+    return Result.restore(job_id, result_id.decode(), payload, connection=None)
+
+
+async def latest_result(job_id):
+    entries = await async_redis.xrevrange(Result.get_key(job_id), "+", "-", count=1)
+    result = _to_result(job_id, entries[0]) if entries else None
+    # a "retried" result means the job went back to the queue, so it's not done yet
+    return None if result is None or result.type == Result.Type.RETRIED else result
+
+
+async def wait_for_result(job_id, timeout):
+    # blocks until the worker writes a final result, or timeout (seconds) runs out -> None
+    deadline = time.monotonic() + timeout
+    last_id = "0-0"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        response = await async_redis.xread({Result.get_key(job_id): last_id}, block=max(int(remaining * 1000), 1))
+        if not response:
+            return None
+        _, entries = response[0]
+        last_id = entries[-1][0]
+        result = _to_result(job_id, entries[-1])
+        if result.type != Result.Type.RETRIED:
+            return result
+
+
+async def iter_job_events(job_id, ping_every):
+    # yields ("token", delta) while the job streams, then ("result", Result) once it's done.
+    # one XREAD BLOCK listens on both the token stream and the results stream at the same time,
+    # and ("ping", None) comes out whenever nothing happened for ping_every seconds
+    tokens_key, results_key = token_stream_key(job_id), Result.get_key(job_id)
+    last_ids = {tokens_key: "0-0", results_key: "0-0"}
+    while True:
+        response = await async_redis.xread(last_ids, block=int(ping_every * 1000))
+        if not response:
+            yield "ping", None
+            continue
+
+        entries_by_key = {key.decode(): entries for key, entries in response}
+        for entry_id, fields in entries_by_key.get(tokens_key, []):
+            last_ids[tokens_key] = entry_id
+            yield "token", fields[b"delta"].decode("utf-8")
+        for entry in entries_by_key.get(results_key, []):
+            last_ids[results_key] = entry[0]
+            result = _to_result(job_id, entry)
+            if result.type != Result.Type.RETRIED:
+                yield "result", result
+                return
+
+
+async def jobs_payloads(job_ids):
+    # status + latest result of many jobs in one pipelined round trip, instead of 2-3 per job
+    async with async_redis.pipeline(transaction=False) as pipeline:
+        for job_id in job_ids:
+            pipeline.hget(Job.key_for(job_id), "status")
+            pipeline.xrevrange(Result.get_key(job_id), "+", "-", count=1)
+        replies = await pipeline.execute()
+
+    payloads = []
+    for job_id, status, entries in zip(job_ids, replies[::2], replies[1::2]):
+        if status is None:
+            payloads.append({"job_id": job_id, "status": "not_found", "result": None})
+            continue
+        result = _to_result(job_id, entries[0]) if entries else None
+        if result is not None and result.type == Result.Type.RETRIED:
+            result = None
+        payloads.append(result_payload(job_id, result, status=status.decode()))
+    return payloads
+
+
+def result_payload(job_id, result, status=None):
+    if result is None:
+        return {"job_id": job_id, "status": status, "result": None}
+    if result.type == Result.Type.SUCCESSFUL:
+        return {"job_id": job_id, "status": "finished", "result": result.return_value}
+    # keep only the last line of the traceback, the rest is for the worker logs
+    error = (result.exc_string or "").strip().splitlines()[-1:] or [None]
+    status = "stopped" if result.type == Result.Type.STOPPED else "failed"
+    return {"job_id": job_id, "status": status, "result": None, "error": error[0]}
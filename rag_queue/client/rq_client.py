@@ -1,8 +1,25 @@
 from rq import Queue
 from redis import Redis
 
-queue = Queue(connection=Redis(
+# one connection for the queue and everything else that lives in redis (answer cache ...)
+redis_connection = Redis(
     host='localhost', port=6379
-    ))
+    )
 
-# queue.enqueue() # takes (fnc, *args)
\ No newline at end of file
+# workers drain these in order - interactive /chat first, bulk /chat/batch only when nothing else waits
+QUEUE_NAMES = ("high", "default", "low")
+queues = {name: Queue(name, connection=redis_connection) for name in QUEUE_NAMES}
+queue = queues["default"]
+
+# distributed ingestion (POST /ingest) - its own queue, after the chat ones, so indexing a corpus
+# only uses workers that have no chat job to run, and doesn't count towards /chat admission control
+INGEST_QUEUE = "ingest"
+ingest_queue = Queue(INGEST_QUEUE, connection=redis_connection)
+WORKER_QUEUES = QUEUE_NAMES + (INGEST_QUEUE,)
+
+# jobs are enqueued by dotted path, only the worker process imports it (and its model, clients ...)
+PROCESS_QUERY = "rag_queue.queues.worker.process_query"
+PLAN_INGEST = "rag_queue.queues.ingest.plan_ingest"
+INGEST_PAGE_RANGE = "rag_queue.queues.ingest.ingest_page_range"
+
+# queue.enqueue() # takes (fnc, *args)
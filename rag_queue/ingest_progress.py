@@ -0,0 +1,116 @@
+import json
+import time
+
+'''
+progress of a distributed ingestion (POST /ingest -> queues/ingest.py), shared by every worker.
+
+redis layout, everything under rag:ingest:{ingest_id}:
+- the hash itself  - state, files, pages_total, tasks_total (written once by the plan job) and the
+                     counters the page range jobs increment: tasks_done, tasks_failed, pages_done,
+                     chunks_embedded
+- :tasks           - set of the task job ids already counted, so a job that runs twice (requeued
+                     after a worker died ...) doesn't count its pages twice
+- :failures        - the last MAX_FAILURES failed tasks (path, pages, error)
+
+state: planning -> running -> finished (every task done or failed), or failed when planning failed.
+task_done / task_failed return True for the one task that finished the ingestion.
+the keys expire PROGRESS_TTL after the last update.
+'''
+
+PROGRESS_TTL = 7 * 24 * 3600
+MAX_FAILURES = 100
+
+
+class IngestProgress:
+    def __init__(self, connection, prefix="rag:ingest", ttl=PROGRESS_TTL):
+        self.connection = connection
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def key(self, ingest_id, suffix=""):
+        return f"{self.prefix}:{ingest_id}{suffix}"
+
+    def _touch(self, pipeline, ingest_id):
+        pipeline.hset(self.key(ingest_id), "updated_at", time.time())
+        for suffix in ("", ":tasks", ":failures"):
+            pipeline.expire(self.key(ingest_id, suffix), self.ttl)
+
+    def start(self, ingest_id, paths):
+        pipeline = self.connection.pipeline()
+        pipeline.hset(self.key(ingest_id), mapping={"state": "planning", "paths": json.dumps(paths), "created_at": time.time()})
+        self._touch(pipeline, ingest_id)
+        pipeline.execute()
+
+    def planned(self, ingest_id, files, pages, tasks):
+        pipeline = self.connection.pipeline()
+        pipeline.hset(self.key(ingest_id), mapping={"state": "running", "files": files, "pages_total": pages, "tasks_total": tasks})
+        self._touch(pipeline, ingest_id)
+        pipeline.execute()
+
+    def plan_failed(self, ingest_id, error):
+        pipeline = self.connection.pipeline()
+        pipeline.hset(self.key(ingest_id), mapping={"state": "failed", "error": repr(error)})
+        self._touch(pipeline, ingest_id)
+        pipeline.execute()
+
+    def _first_time(self, ingest_id, task_id):
+        return self.connection.sadd(self.key(ingest_id, ":tasks"), task_id) == 1
+
+    def _finished(self, pipeline, ingest_id):
+        # read in the same transaction as the increment, so exactly one task sees the last count
+        pipeline.hmget(self.key(ingest_id), "tasks_done", "tasks_failed", "tasks_total")
+        done, failed, total = (int(count or 0) for count in pipeline.execute()[-1])
+        return total > 0 and done + failed == total
+
+    def task_done(self, ingest_id, task_id, pages, chunks):
+        if not self._first_time(ingest_id, task_id):
+            return False
+        pipeline = self.connection.pipeline()
+        pipeline.hincrby(self.key(ingest_id), "tasks_done", 1)
+        pipeline.hincrby(self.key(ingest_id), "pages_done", pages)
+        pipeline.hincrby(self.key(ingest_id), "chunks_embedded", chunks)
+        self._touch(pipeline, ingest_id)
+        return self._finished(pipeline, ingest_id)
+
+    def task_failed(self, ingest_id, task_id, path, start, end, error):
+        if not self._first_time(ingest_id, task_id):
+            return False
+        failure = {"task": task_id, "path": path, "pages": [start, end], "error": repr(error)}
+        pipeline = self.connection.pipeline()
+        pipeline.hincrby(self.key(ingest_id), "tasks_failed", 1)
+        pipeline.lpush(self.key(ingest_id, ":failures"), json.dumps(failure))
+        pipeline.ltrim(self.key(ingest_id, ":failures"), 0, MAX_FAILURES - 1)
+        self._touch(pipeline, ingest_id)
+        return self._finished(pipeline, ingest_id)
+
+    def get(self, ingest_id):
+        # -> progress dict, None for an unknown (or expired) ingest id
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.hgetall(self.key(ingest_id))
+        pipeline.lrange(self.key(ingest_id, ":failures"), 0, -1)
+        fields, failures = pipeline.execute()
+        if not fields:
+            return None
+        fields = {name.decode(): value.decode() for name, value in fields.items()}
+        counts = {name: int(fields.get(name, 0)) for name in
+                  ("files", "pages_total", "pages_done", "chunks_embedded", "tasks_total", "tasks_done", "tasks_failed")}
+
+        state = fields["state"]
+        if state == "running" and counts["tasks_done"] + counts["tasks_failed"] >= counts["tasks_total"]:
+            state = "finished"
+        # a running ingestion is measured up to now, a finished one up to its last task
+        until = float(fields["updated_at"]) if state in ("finished", "failed") else time.time()
+        seconds = max(until - float(fields["created_at"]), 0.0)
+        pages_per_sec = counts["pages_done"] / seconds if seconds else 0.0
+        remaining = counts["pages_total"] - counts["pages_done"]
+        return {
+            "ingest_id": ingest_id,
+            "state": state,
+            "paths": json.loads(fields["paths"]),
+            **counts,
+            "seconds": round(seconds, 1),
+            "pages_per_sec": round(pages_per_sec, 2),
+            "eta_seconds": round(remaining / pages_per_sec, 1) if state == "running" and pages_per_sec else None,
+            "error": fields.get("error"),
+            "failures": [json.loads(failure) for failure in failures],
+        }
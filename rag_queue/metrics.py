@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+
+'''
+per-stage latency of the rag pipeline, exported in the prometheus text format on GET /metrics.
+
+the worker times every stage of a job with Trace.span():
+- embed     - query embedding (or its share of a batched forward pass, see batch_worker.py)
+- search    - dense + bm25 search
+- prompt    - context packing + prompt assembly
+- llm       - the chat completion, streamed or not
+- job       - the whole process_query call, cache hits included
+plus the queue wait (enqueued_at -> started_at) that rq already stores on the job.
+
+workers are separate processes (prefork pool, several machines...), so nothing is kept in memory:
+each finished job adds its observations to redis hashes in one pipelined round trip
+(rag:metrics:<name>), and the server renders those hashes - every worker ends up in one histogram.
+no prometheus_client needed, the format is a few lines of text.
+'''
+
+METRICS_PREFIX = "rag:metrics:"
+# seconds - from a warm embedding lookup up to a slow llm answer
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# the last RECENT_JOBS job durations, the admission control's estimate of the current job time
+RECENT_JOBS_KEY = f"{METRICS_PREFIX}recent_job_seconds"
+RECENT_JOBS = 100
+
+# name -> (type, help, label)
+METRICS = {
+    "rag_queue_stage_seconds": ("histogram", "time spent in each stage of a rag job", "stage"),
+    "rag_queue_queue_wait_seconds": ("histogram", "enqueue to start of a job, time spent waiting for a free worker", None),
+    "rag_queue_jobs_total": ("counter", "finished jobs by outcome (answered, exact_cache, semantic_cache, failed)", "outcome"),
+    "rag_queue_rejected_total": ("counter", "requests turned away with 429 by the admission control", "priority"),
+    "rag_queue_coalesced_total": ("counter", "requests attached to an identical in-flight job instead of enqueueing", "priority"),
+}
+
+
+def metric_key(name):
+    return f"{METRICS_PREFIX}{name}"
+
+
+class Trace:
+    # the spans of one job, flushed to redis once it's done (record())
+    def __init__(self):
+        self.spans = {}
+        self.outcome = "failed"  # until the job says otherwise
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def timings(self):
+        return {"outcome": self.outcome, **{f"{stage}_ms": round(seconds * 1000, 3) for stage, seconds in self.spans.items()}}
+
+
+def queue_wait(job):
+    # seconds between enqueue and the worker picking the job up, None outside of a worker
+    if job is None or job.enqueued_at is None or job.started_at is None:
+        return None
+    return max((job.started_at - job.enqueued_at).total_seconds(), 0.0)
+
+
+def observe(pipeline, name, value, label=""):
+    # histogram buckets are stored per bucket and summed up when rendering
+    bucket = next((str(le) for le in BUCKETS if value <= le), "+Inf")
+    key = metric_key(name)
+    pipeline.hincrby(key, f"{label}|{bucket}", 1)
+    pipeline.hincrbyfloat(key, f"{label}|sum", value)
+    pipeline.hincrby(key, f"{label}|count", 1)
+
+
+def record(connection, trace, wait=None):
+    pipeline = connection.pipeline(transaction=False)
+    for stage, seconds in trace.spans.items():
+        observe(pipeline, "rag_queue_stage_seconds", seconds, stage)
+    if wait is not None:
+        observe(pipeline, "rag_queue_queue_wait_seconds", wait)
+    pipeline.hincrby(metric_key("rag_queue_jobs_total"), trace.outcome, 1)
+    if "job" in trace.spans:
+        pipeline.lpush(RECENT_JOBS_KEY, trace.spans["job"])
+        pipeline.ltrim(RECENT_JOBS_KEY, 0, RECENT_JOBS - 1)
+    pipeline.execute()
+
+
+def increment(connection, name, label, amount=1):
+    # counters bumped by the server (rejected / coalesced requests)
+    connection.hincrby(metric_key(name), label, amount)
+
+
+def format_labels(label_name, label, **extra):
+    pairs = ([(label_name, label)] if label_name else []) + list(extra.items())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+
+
+def render(hashes, queue_depths=None):
+    # hashes: {metric name: {field: value}} as read from redis -> prometheus text format
+    lines = []
+    for name, (kind, description, label_name) in METRICS.items():
+        fields = {field.decode() if isinstance(field, bytes) else field: float(value)
+                  for field, value in (hashes.get(name) or {}).items()}
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for label, value in sorted(fields.items()):
+                lines.append(f"{name}{format_labels(label_name, label)} {int(value)}")
+            continue
+        for label in sorted({field.rsplit("|", 1)[0] for field in fields}):
+            cumulative = 0.0
+            for le in [str(le) for le in BUCKETS] + ["+Inf"]:
+                cumulative += fields.get(f"{label}|{le}", 0.0)
+                lines.append(f"{name}_bucket{format_labels(label_name, label, le=le)} {int(cumulative)}")
+            lines.append(f"{name}_sum{format_labels(label_name, label)} {fields.get(f'{label}|sum', 0.0)}")
+            lines.append(f"{name}_count{format_labels(label_name, label)} {int(fields.get(f'{label}|count', 0.0))}")
+
+    lines += ["# HELP rag_queue_queue_depth jobs waiting in the queue", "# TYPE rag_queue_queue_depth gauge"]
+    for queue_name, depth in (queue_depths or {}).items():
+        lines.append(f'rag_queue_queue_depth{{queue="{queue_name}"}} {depth}')
+    return "\n".join(lines) + "\n"
+
+
+async def export(connection, queue_depths=None):
+    # one pipelined read of every metric hash (async redis, used by the server)
+    async with connection.pipeline(transaction=False) as pipeline:
+        for name in METRICS:
+            pipeline.hgetall(metric_key(name))
+        hashes = await pipeline.execute()
+    return render(dict(zip(METRICS, hashes)), queue_depths)
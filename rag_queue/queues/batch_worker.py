@@ -0,0 +1,95 @@
+import os
+import time
+
+from rq import SimpleWorker
+from rq.job import Job
+
+from ..client.rq_client import PROCESS_QUERY, QUEUE_NAMES
+
+'''
+micro-batching rq worker.
+
+a normal worker pops 1 job, embeds 1 query, does 1 qdrant search, calls the llm, repeat.
+under bursty load that's dozens of tiny model calls + network round trips in a row.
+
+this worker pops 1 job as usual, then peeks (LRANGE, nothing is popped) at up to BATCH_SIZE - 1
+jobs queued right behind it on the same queue. the process_query jobs among them get embedded in
+one forward pass and searched with one batched qdrant request (worker.prefetch_retrieval), and the
+popped job runs through the normal rq job lifecycle.
+
+the results go to redis, one list per job id (worker.PREFETCH_RESULT_KEY, expires after
+PREFETCH_TTL), so whichever worker process ends up running a peeked job - this one, a prefork
+sibling or another machine - takes its retrieval from there instead of doing it again. a job is
+only prefetched by the worker that claims it first (PREFETCH_CLAIM_KEY, the popped job included),
+and a job that's popped while its claim is still being worked on waits for the result with one
+BLPOP of at most PREFETCH_WAIT seconds.
+
+the peeked jobs stay in redis - any worker can take them, a crash loses nothing, a high priority
+job that comes in next is still the next one popped, and admission control still sees them in
+the queue length.
+
+there is no polling for stragglers: when the queue is empty the popped job just runs, when a
+burst is still coming in (fewer than BATCH_SIZE - 1 queued) the worker waits BATCH_WAIT_MS once
+and looks again.
+
+usage (from the root repo dir):
+BATCH_SIZE=32 BATCH_WAIT_MS=20 rq worker high default low ingest -w rag_queue.queues.batch_worker.BatchingWorker
+'''
+
+PREFETCH_CLAIM_KEY = "rag:prefetch:{}"  # job id -> claimed by the worker that prefetches its retrieval
+PREFETCH_CLAIM_TTL = 60
+
+class BatchingWorker(SimpleWorker):
+    def __init__(self, *args, batch_size=None, batch_wait_ms=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size or int(os.getenv("BATCH_SIZE", 32))
+        self.batch_wait_ms = batch_wait_ms if batch_wait_ms is not None else int(os.getenv("BATCH_WAIT_MS", 20))
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        if result is not None:
+            self.prefetch(*result)
+        return result
+
+    def peek(self, queue):
+        # -> ids of the jobs queued behind the one just popped, on its own queue only. they are left where they are
+        job_ids = queue.get_job_ids(0, self.batch_size - 2)
+        if job_ids and len(job_ids) < self.batch_size - 1 and self.batch_wait_ms:
+            time.sleep(self.batch_wait_ms / 1000)  # a burst is coming in, give the rest of it one chance
+            job_ids = queue.get_job_ids(0, self.batch_size - 2)
+        return job_ids
+
+    def claim(self, job_ids):
+        # one round trip, a job another worker already prefetches (or prefetched) is left out
+        pipeline = self.connection.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipeline.set(PREFETCH_CLAIM_KEY.format(job_id), self.name, nx=True, ex=PREFETCH_CLAIM_TTL)
+        return [job_id for job_id, won in zip(job_ids, pipeline.execute()) if won]
+
+    def queries(self, jobs):
+        return {job.id: job.args[0] for job in jobs if job is not None and job.func_name == PROCESS_QUERY and job.args}
+
+    def release(self, job_ids):
+        if job_ids:
+            self.connection.delete(*[PREFETCH_CLAIM_KEY.format(job_id) for job_id in job_ids])
+
+    def prefetch(self, job, queue):
+        if queue.name not in QUEUE_NAMES or not self.queries([job]):
+            return  # ingest jobs run on their own
+        from . import worker
+
+        claimed = self.claim([job.id] + self.peek(queue))
+        peeked = [job_id for job_id in claimed if job_id != job.id]
+        jobs = ([job] if job.id in claimed else []) + Job.fetch_many(peeked, connection=self.connection, serializer=self.serializer)
+        queries = self.queries(jobs)
+        if len(queries) < 2:
+            self.release(claimed)  # nothing to batch, process_query does its own retrieval
+            return
+        try:
+            worker.prefetch_retrieval(self.connection, queries)
+        except Exception:
+            # the jobs will just do their own retrieval
+            self.log.exception("Worker %s: batched retrieval failed", self.name)
+            worker.prefetch_failed(self.connection, queries)
+        else:
+            self.log.info("Worker %s: prefetched retrieval for %d queued jobs", self.name, len(queries))
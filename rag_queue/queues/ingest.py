@@ -0,0 +1,106 @@
+import os
+
+from rq import Queue, get_current_job
+
+from RAG.config import COLLECTION_NAME, QDRANT_URL
+from RAG.embeddings import get_embedding_model
+from RAG.ingest import IngestionEngine, find_pdfs, plan_page_ranges
+from ..cache.answer_cache import bump_generation
+from ..client.rq_client import INGEST_PAGE_RANGE, ingest_queue, redis_connection
+from ..ingest_progress import IngestProgress
+
+'''
+distributed ingestion - RAG/main.py's indexing as rq jobs, spread over every worker.
+
+POST /ingest enqueues one plan job (the parent) on the ingest queue, its job id is the ingest id:
+1. plan_ingest       - finds the pdfs, reads their page counts and fans out one ingest_page_range
+                       job per pages_per_task pages (enqueue_many, one pipeline per 500 jobs).
+                       a pdf that can't be read is counted as a failed task, a path without
+                       any pdf fails the whole plan (nothing is enqueued)
+2. ingest_page_range - parse + split + embed + upsert of one page range in the worker
+                       (IngestionEngine.ingest_page_range), then counts it in the progress hash
+every worker on the ingest queue picks up page ranges, so N workers index a corpus ~N times faster.
+GET /ingest/{ingest_id} reads the progress (ingest_progress.py). the task that finishes the
+ingestion bumps the collection's index generation, which starts the answer cache over.
+
+upserts are idempotent - point ids come from the chunk fingerprints, a range that runs twice (or a
+file that's ingested again) overwrites its own points. the paths have to exist on the workers.
+only qdrant: the local store, bm25 index and --incremental manifest are files owned by one process,
+RAG/main.py is still the way to build those.
+'''
+
+TASK_TIMEOUT = int(os.getenv("INGEST_TASK_TIMEOUT", 600))  # seconds for one page range (cpu embedding is slow)
+RESULT_TTL = 24 * 3600
+ENQUEUE_BATCH = 500
+
+progress = IngestProgress(redis_connection)
+engine = None  # built on the first page range this worker runs
+
+
+def init():
+    global engine
+    if engine is not None:
+        return
+    from . import worker
+
+    # a prefork pool already loaded the model for the chat jobs (worker.warmup) - share it
+    engine = IngestionEngine(
+        embedding_model=worker.embedding_model or get_embedding_model(),
+        collection_name=COLLECTION_NAME,
+        url=QDRANT_URL,
+        parse_workers=1,
+    )
+
+
+def plan_ingest(paths, pages_per_task=16):
+    ingest_id = get_current_job().id
+    tasks, unreadable = [], []
+    try:
+        pdfs = {path: find_pdfs(path) for path in paths}
+        # a typo'd path would otherwise be planned as 0 pages and show up as finished
+        empty = [path for path, found in pdfs.items() if not found]
+        if empty:
+            raise ValueError(f"no pdfs found at {', '.join(empty)}")
+        for pdf in (pdf for found in pdfs.values() for pdf in found):
+            try:
+                tasks.extend(plan_page_ranges([pdf], pages_per_task))
+            except Exception as error:
+                unreadable.append((str(pdf), error))  # one broken pdf doesn't stop the rest of the corpus
+    except Exception as error:
+        progress.plan_failed(ingest_id, error)
+        raise
+    files = len({path for path, _, _ in tasks}) + len(unreadable)
+    pages = sum(end - start for _, start, end in tasks)
+    # counted before the first task is enqueued, so a task can't finish before the totals exist.
+    # an unreadable pdf is a failed task of its own
+    progress.planned(ingest_id, files, pages, len(tasks) + len(unreadable))
+    for index, (path, error) in enumerate(unreadable):
+        if progress.task_failed(ingest_id, f"{ingest_id}-unreadable-{index}", path, 0, 0, error):
+            bump_generation(redis_connection, COLLECTION_NAME)  # nothing else to run
+
+    for first in range(0, len(tasks), ENQUEUE_BATCH):
+        ingest_queue.enqueue_many([
+            Queue.prepare_data(
+                INGEST_PAGE_RANGE, (ingest_id, path, start, end),
+                job_id=f"{ingest_id}-{index}", timeout=TASK_TIMEOUT, result_ttl=RESULT_TTL,
+                description=f"ingest {path} pages {start}-{end}",
+            )
+            for index, (path, start, end) in enumerate(tasks[first:first + ENQUEUE_BATCH], start=first)
+        ])
+    print(f"📚 ingest {ingest_id}: {files} files, {pages} pages -> {len(tasks)} page range jobs")
+    return {"files": files, "pages": pages, "tasks": len(tasks)}
+
+
+def ingest_page_range(ingest_id, path, start, end):
+    init()
+    task_id = get_current_job().id
+    try:
+        pages, chunks = engine.ingest_page_range(path, start, end)
+    except Exception as error:
+        if progress.task_failed(ingest_id, task_id, path, start, end, error):
+            bump_generation(redis_connection, COLLECTION_NAME)
+        raise  # still a failed job in rq, with the traceback
+    if progress.task_done(ingest_id, task_id, pages, chunks):
+        bump_generation(redis_connection, COLLECTION_NAME)
+    print(f"📄 {path} pages {start}-{end}: {chunks} chunks")
+    return {"pages": pages, "chunks": chunks}
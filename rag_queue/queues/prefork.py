@@ -0,0 +1,192 @@
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+from redis import Redis
+from rq import Queue, SimpleWorker
+
+from ..client.rq_client import WORKER_QUEUES
+from .batch_worker import BatchingWorker
+
+'''
+preforking worker pool - loads the heavy stuff once, then forks N rq workers.
+
+`rq worker -w rq.worker.SimpleWorker` runs 1 job at a time, and running N of them means N
+processes that each import worker.py, load the sentence-transformers model and connect to qdrant.
+
+here the parent process imports worker.py once (model + clients), warms the model up, and then
+forks the workers. the children share the model weights with the parent copy-on-write, so every
+extra worker starts instantly and only costs the memory it actually writes to.
+
+the parent then just babysits the children:
+- restart-on-crash - a child that exits gets forked again (with a backoff if it keeps crashing -
+                     the restart is scheduled, the loop keeps reaping / checking the other children)
+- health checks    - a child whose rq worker key vanished from redis (no heartbeat for worker_ttl)
+                     is considered hung, gets killed and restarted
+
+usage (from the root repo dir):
+python -m rag_queue.queues.prefork --workers 4
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkPool:
+    def __init__(self, workers=2, queue_names=WORKER_QUEUES, redis_host="localhost", redis_port=6379,
+                 worker_ttl=60, health_interval=10, startup_grace=30, threads_per_worker=None,
+                 worker_class=SimpleWorker):
+        self.workers = workers
+        self.queue_names = list(queue_names)
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.worker_ttl = worker_ttl
+        self.health_interval = health_interval
+        self.startup_grace = startup_grace
+        self.threads_per_worker = threads_per_worker
+        self.worker_class = worker_class
+
+        self.children = {}  # slot -> {"pid", "name", "started"}
+        self.restarts = {}  # slot -> consecutive quick crashes, used for the backoff
+        self.restart_at = {}  # slot -> monotonic time its replacement gets forked
+        self.stopping = False
+
+    def preload(self):
+        # everything imported here ends up in the parent's memory, and is shared with the children
+        from . import worker
+
+        worker.warmup()  # model + clients, and the first forward pass that allocates the torch buffers
+        # objects that exist now are moved out of the gc's reach, so the gc in the children doesn't
+        # write to them (which would copy the pages and undo the copy-on-write sharing)
+        gc.freeze()
+        return worker
+
+    def spawn(self, slot):
+        name = f"{socket.gethostname()}.prefork-{os.getpid()}-{slot}-{time.time_ns()}"
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_child(name)
+            except BaseException:
+                # the parent only sees the exit code, the cause has to end up in the logs from here
+                logger.exception("worker %s crashed", name)
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.children[slot] = {"pid": pid, "name": name, "started": time.monotonic()}
+        print(f"👶 worker {slot} started (pid {pid})")
+
+    def run_child(self, name):
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        from . import worker
+
+        # sockets opened by the parent must not be shared between processes
+        worker.reset_after_fork()
+        if self.threads_per_worker:
+            import torch
+            torch.set_num_threads(self.threads_per_worker)
+
+        connection = Redis(host=self.redis_host, port=self.redis_port)
+        queues = [Queue(queue_name, connection=connection) for queue_name in self.queue_names]
+        self.worker_class(queues, name=name, connection=connection, worker_ttl=self.worker_ttl).work()
+
+    def is_healthy(self, slot, connection):
+        child = self.children[slot]
+        if time.monotonic() - child["started"] < self.startup_grace:
+            return True
+        # the worker key expires when the worker stops heartbeating, and gets a "death" field on exit
+        key = self.worker_class.redis_worker_namespace_prefix + child["name"]
+        return bool(connection.exists(key)) and not connection.hexists(key, "death")
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for slot, child in list(self.children.items()):
+                if child["pid"] != pid:
+                    continue
+                del self.children[slot]
+                if self.stopping:
+                    break
+                uptime = time.monotonic() - child["started"]
+                self.restarts[slot] = self.restarts.get(slot, 0) + 1 if uptime < self.startup_grace else 0
+                backoff = min(2 ** self.restarts[slot], 60) if self.restarts[slot] else 0
+                print(f"💥 worker {slot} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}, restarting in {backoff}s")
+                self.restart_at[slot] = time.monotonic() + backoff
+
+    def restart_due(self):
+        for slot, restart_at in list(self.restart_at.items()):
+            if time.monotonic() >= restart_at:
+                del self.restart_at[slot]
+                self.spawn(slot)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        self.restart_at.clear()
+        for child in self.children.values():
+            try:
+                os.kill(child["pid"], signal.SIGTERM)  # rq does a warm shutdown, current job finishes
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        started = time.perf_counter()
+        self.preload()
+        print(f"🚀 model + clients loaded in {time.perf_counter() - started:.1f}s, forking {self.workers} workers")
+
+        for slot in range(self.workers):
+            self.spawn(slot)
+
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        connection = Redis(host=self.redis_host, port=self.redis_port)
+        last_check = time.monotonic()
+        while self.children or self.restart_at:
+            time.sleep(1)
+            self.reap()
+            if not self.stopping:
+                self.restart_due()
+            if self.stopping or time.monotonic() - last_check < self.health_interval:
+                continue
+            last_check = time.monotonic()
+            for slot in list(self.children):
+                if not self.is_healthy(slot, connection):
+                    print(f"🩺 worker {slot} stopped heartbeating, killing it")
+                    os.kill(self.children[slot]["pid"], signal.SIGKILL)  # reap() restarts it
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fork N rq workers that share one loaded embedding model")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queues", nargs="+", default=list(WORKER_QUEUES), help="in priority order")
+    parser.add_argument("--worker-ttl", type=int, default=60, help="seconds without a heartbeat before a worker is considered dead")
+    parser.add_argument("--health-interval", type=int, default=10)
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="torch intra-op threads in every child")
+    parser.add_argument("--batching", action="store_true",
+                        help="micro-batch embedding + retrieval across queued jobs (BATCH_SIZE / BATCH_WAIT_MS env vars)")
+    args = parser.parse_args()
+
+    PreforkPool(
+        workers=args.workers,
+        queue_names=args.queues,
+        worker_ttl=args.worker_ttl,
+        health_interval=args.health_interval,
+        threads_per_worker=args.threads_per_worker,
+        worker_class=BatchingWorker if args.batching else SimpleWorker,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
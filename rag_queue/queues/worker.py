@@ -1,41 +1,196 @@
-from openai import OpenAI
+from common.llm_client import get_client
 # from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from rq import get_current_job
 from dotenv import load_dotenv
 import os
+import pickle
+import time
 from pathlib import Path
-from langchain_huggingface import HuggingFaceEmbeddings
+from RAG.context import build_context
+from RAG.embeddings import get_embedding_model
+from RAG.config import COLLECTION_NAME
+from RAG.vector_stores import VECTOR_STORE, connect_lexical_index, connect_vector_store, hybrid_search
+from ..cache.answer_cache import AnswerCache
+from ..client.rq_client import QUEUE_NAMES, redis_connection
+from ..metrics import Trace, queue_wait, record
+from ..single_flight import SingleFlight
+from .batch_worker import PREFETCH_CLAIM_KEY
+from ..token_stream import TokenStream
 
 # Load .env from rag_queue directory
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
+# the heavy stuff is only built when the first job runs (init), or up front with warmup() -
+# importing this module (e.g. to resolve the job's function) loads no model and opens no connection
+client = None  # shared pooled client - rate limited, retries 429/5xx (common/llm_client.py)
+embedding_model = None  # same cached embedding model as RAG/main.py and RAG/chat.py
+vector_db = None  # Qdrant (or the embedded local store with VECTOR_STORE=local)
+lexical_index = None  # bm25 index built by RAG/main.py, fused with the dense results (None with HYBRID_SEARCH=0)
 
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/"
-)
+def connect_vector_db():
+    return connect_vector_store(embedding_model)
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
-)
+def init():
+    global client, embedding_model, vector_db, lexical_index
+    if embedding_model is not None:
+        return
+    if not API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in .env file")
+    client = get_client(api_key=API_KEY)
+    embedding_model = get_embedding_model()
+    vector_db = connect_vector_db()
+    lexical_index = connect_lexical_index()
+
+def warmup():
+    # eager init - the prefork parent calls it before forking, so the children share the loaded model
+    init()
+    embedding_model.embed_query("warmup")  # first call allocates the torch buffers
 
-# connect to Qdrant vector db
-vector_db = QdrantVectorStore.from_existing_collection(
-    embedding=embedding_model,
-    collection_name="learning-rag",
-    url="http://localhost:6333"  # assuming Qdrant is running locally on default port
+def reset_after_fork():
+    # called by the prefork pool in every child - the model is shared, but the qdrant / llm http
+    # connections are not (redis-py and the embedding cache's sqlite reconnect on their own)
+    global client, vector_db
+    if embedding_model is None:
+        return  # nothing built yet, the child will init() on its first job
+    client = get_client(api_key=API_KEY)  # the http pool + limits of this child, not the parent's
+    vector_db = connect_vector_db()
+
+# answers are reused for the same (normalized) query, or a query that's close enough in embedding space
+answer_cache = AnswerCache(
+    redis_connection,
+    ttl=int(os.getenv("ANSWER_CACHE_TTL", 3600)),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000)),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)),
+    collection=COLLECTION_NAME,
+    store=VECTOR_STORE,
 )
 
-def process_query(query: str):
-    print("Serching Chunks", query)
-    search_results = vector_db.similarity_search(query=query)
+SEARCH_K = 4  # same as similarity_search's default
+
+# identical queries enqueued while this job runs attach to it (see single_flight.py)
+single_flight = SingleFlight(redis_connection, QUEUE_NAMES)
+
+# retrieval done ahead of time by the batching worker (batch_worker.py) for the jobs queued behind
+# the one it runs: job id -> list with one pickled (embedding, search results, {stage: seconds}).
+# in redis, because any worker process may end up running those jobs. an empty entry means the
+# batch failed and the job does its own retrieval
+PREFETCH_RESULT_KEY = "rag:prefetch:{}:result"
+PREFETCH_TTL = 60  # seconds
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", 2.0))  # longest wait for a batch another worker is still on
+
+def prefetch_retrieval(connection, queries):
+    # {job id: query} -> one model forward pass + one batched qdrant request (+ bm25 lookups) for the whole batch
+    init()
+    answered = [job_id for job_id, query in queries.items() if answer_cache.contains(query)]
+    prefetch_failed(connection, answered)  # exact cache hits, nothing to retrieve
+    queries = {job_id: query for job_id, query in queries.items() if job_id not in answered}
+    if not queries:
+        return
+    texts = list(dict.fromkeys(queries.values()))
+    started = time.perf_counter()
+    embeddings = embedding_model.embed_documents(texts)
+    embedded = time.perf_counter()
+    results = hybrid_search(vector_db, lexical_index, texts, embeddings, k=SEARCH_K)
+    # every job of the batch is charged an equal share of the batched calls
+    spans = {"embed": (embedded - started) / len(texts), "search": (time.perf_counter() - embedded) / len(texts)}
+    retrieved = {text: (embedding, documents) for text, embedding, documents in zip(texts, embeddings, results)}
+
+    pipeline = connection.pipeline(transaction=False)
+    for job_id, query in queries.items():
+        key = PREFETCH_RESULT_KEY.format(job_id)
+        pipeline.rpush(key, pickle.dumps((*retrieved[query], spans)))
+        pipeline.expire(key, PREFETCH_TTL)
+    pipeline.execute()
+
+def prefetch_failed(connection, job_ids):
+    # wakes up whoever waits for these jobs' results, they do their own retrieval
+    pipeline = connection.pipeline(transaction=False)
+    for job_id in job_ids:
+        pipeline.rpush(PREFETCH_RESULT_KEY.format(job_id), b"")
+        pipeline.expire(PREFETCH_RESULT_KEY.format(job_id), PREFETCH_TTL)
+    pipeline.execute()
 
-    context = "\n\n\n".join(f"Page Content: {result.page_content}]\n Page Number: {result.metadata['page_label']}\nFile Location: {result.metadata['source']}"
-    for result in search_results)
+def take_prefetched(job):
+    # -> (embedding, search results, spans), (None, None, {}) when the job's retrieval wasn't prefetched
+    if job is None or not job.connection.exists(PREFETCH_CLAIM_KEY.format(job.id)):
+        return None, None, {}
+    # claimed by a batch - done already, or a worker is embedding it right now. one blocking wait
+    result = job.connection.blpop([PREFETCH_RESULT_KEY.format(job.id)], timeout=PREFETCH_WAIT)
+    if not result or not result[1]:
+        return None, None, {}
+    return pickle.loads(result[1])
+
+def stream_completion(message_history, token_stream):
+    # stream=True gives us the answer token by token, every delta goes straight to redis
+    deltas = []
+    for chunk in client.chat.completions.create(
+        model="gemini-2.5-flash",
+        messages=message_history,
+        stream=True
+    ):
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            deltas.append(delta)
+            token_stream.write(delta)
+    return "".join(deltas)
+
+def process_query(query: str, stream: bool = False):
+    init()
+    job = get_current_job()
+    trace = Trace()
+    if job is not None:
+        single_flight.refresh(query, job.origin, stream)
+    try:
+        with trace.span("job"):
+            return answer_query(query, stream, job, trace)
+    finally:
+        if job is not None:
+            # requests from now on start a new job (and most likely hit the answer cache)
+            single_flight.release(query, job.origin, job.id, stream)
+        # per stage timings: rag_queue_* histograms on the server's /metrics, and the job's meta
+        # for benchmarks/load.py. the queue wait comes from rq's own enqueued_at / started_at
+        record(redis_connection, trace, queue_wait(job))
+        if job is not None:
+            job.meta["timings"] = trace.timings()
+            job.save_meta()
+        print("⏱️", trace.timings())
+
+def answer_query(query, stream, job, trace):
+    token_stream = TokenStream(redis_connection, job.id) if stream and job else None
+
+    cached = answer_cache.get_exact(query)
+    if cached is not None:
+        print("♻️ exact cache hit", query)
+        if token_stream:
+            token_stream.write(cached)
+        trace.outcome = "exact_cache"
+        return cached
+
+    # embed once, the same vector is used for the semantic cache and for the search
+    query_embedding, search_results, spans = take_prefetched(job)
+    for stage, seconds in spans.items():
+        trace.add(stage, seconds)
+    if query_embedding is None:
+        with trace.span("embed"):
+            query_embedding = embedding_model.embed_query(query)
+    cached = answer_cache.get_similar(query_embedding)
+    if cached is not None:
+        print("♻️ semantic cache hit", query)
+        if token_stream:
+            token_stream.write(cached)
+        trace.outcome = "semantic_cache"
+        return cached
+
+    if search_results is None:
+        print("Serching Chunks", query)
+        with trace.span("search"):
+            search_results = hybrid_search(vector_db, lexical_index, [query], [query_embedding], k=SEARCH_K)[0]
+
+    # neighbouring chunks merged without their 400 char overlap, capped at CONTEXT_TOKEN_BUDGET tokens
+    with trace.span("prompt"):
+        context = build_context(search_results)
 
     SYSTEM_PROMPT = f'''
     you are a helpful AI assistant. who answers user queries based on the provided context.
@@ -53,11 +208,16 @@ def process_query(query: str):
         {"role": "user", "content": query}
     ]
 
-    response = client.chat.completions.create(
-    model="gemini-2.5-flash",
-    messages=message_history
-    )
-
-    raw_response = response.choices[0].message.content
+    with trace.span("llm"):
+        if token_stream:
+            raw_response = stream_completion(message_history, token_stream)
+        else:
+            response = client.chat.completions.create(
+            model="gemini-2.5-flash",
+            messages=message_history
+            )
+            raw_response = response.choices[0].message.content
     print("💡", raw_response)
+    answer_cache.set(query, query_embedding, raw_response)
+    trace.outcome = "answered"
     return raw_response
\ No newline at end of file
@@ -1,26 +1,180 @@
 from dotenv import load_dotenv
 load_dotenv()
-from .client.rq_client import queue
-from .queues.worker import process_query
-from fastapi import FastAPI, Query
-from dotenv import load_dotenv
+import json
+import uuid
+from typing import Literal
+from .admission import JOB_TTL, AdmissionController, Overloaded
+from .client.rq_client import PLAN_INGEST, PROCESS_QUERY, ingest_queue, queues, redis_connection
+from .client.async_client import async_redis, job_exists, job_status, jobs_payloads, iter_job_events, latest_result, wait_for_result, result_payload
+from .ingest_progress import IngestProgress
+from .metrics import CONTENT_TYPE, export, increment
+from .single_flight import SingleFlight
+from fastapi import FastAPI, Query, HTTPException
+from pydantic import BaseModel, Field
+from rq import Queue
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 app = FastAPI()
 
+MAX_WAIT = 30  # seconds a long-poll request is allowed to hang
+SSE_PING = 15  # seconds between keep-alive comments on an sse stream
+MAX_BATCH = 1000  # queries / job ids per bulk request
+
+# high - interactive users, low - bulk clients. workers always drain high first (see rq_client.py)
+Priority = Literal["high", "default", "low"]
+admission = AdmissionController(redis_connection, queues)
+single_flight = SingleFlight(redis_connection, queues)
+ingest_progress = IngestProgress(redis_connection)
+
+class ChatBatch(BaseModel):
+    queries: list[str] = Field(..., min_length=1, max_length=MAX_BATCH)
+    stream: bool = False
+    priority: Priority = "low"
+
+class JobsStatus(BaseModel):
+    job_ids: list[str] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+class IngestRequest(BaseModel):
+    paths: list[str] = Field(..., min_length=1, max_length=MAX_BATCH)  # pdfs / directories, as the workers see them
+    pages_per_task: int = Field(16, ge=1, le=1000)
+
 @app.get("/")
 def root():
     return {'"status": Server is up and running'}
 
+def admit(priority, count=1):
+    # over capacity -> 429, the client should come back after Retry-After seconds
+    try:
+        admission.admit(priority, count)
+    except Overloaded as error:
+        increment(redis_connection, "rag_queue_rejected_total", priority, count)
+        raise HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
 @app.post("/chat")
-def chat(query: str = Query(..., description="THe chat query of the user")):
-    job = queue.enqueue(process_query, query)
+def chat(
+    query: str = Query(..., description="THe chat query of the user"),
+    stream: bool = Query(False, description="stream the answer token by token on /jobs/{job_id}/events"),
+    priority: Priority = Query("high", description="queue to use, bulk traffic should send low"),
+):
+    # the same question already queued / running -> wait for that job instead of asking the llm twice.
+    # looked up before admission control: attaching costs no work, so it's never turned away
+    job_id = single_flight.lookup(query, priority, stream)
+    if job_id is None:
+        admit(priority)
+        job_id, attached = single_flight.claim(query, priority, JOB_TTL[priority], stream)
+    else:
+        attached = True
+    if attached:
+        increment(redis_connection, "rag_queue_coalesced_total", priority)
+        return {'status: attached',f'job_id: {job_id}'}
+    try:
+        # ttl - still queued after that long means nobody waits for the answer anymore, rq drops it
+        job = queues[priority].enqueue(PROCESS_QUERY, query, stream, ttl=JOB_TTL[priority], job_id=job_id)
+    except Exception:
+        # otherwise every identical request would get this job id (and a 404) until the key expires
+        single_flight.release(query, priority, job_id, stream)
+        raise
     return {'status: queued',f'job_id: {job.id}'}
 
+@app.post("/chat/batch")
+def chat_batch(batch: ChatBatch):
+    # enqueue_many writes every job in one redis pipeline, instead of a round trip per query
+    queries = list(dict.fromkeys(batch.queries))
+    in_flight = single_flight.lookup_many(queries, batch.priority, batch.stream)
+    # only the queries that need a new job count towards admission control
+    if len(queries) > len(in_flight):
+        admit(batch.priority, len(queries) - len(in_flight))
+    claimed = single_flight.claim_many([query for query in queries if query not in in_flight],
+                                       batch.priority, JOB_TTL[batch.priority], batch.stream)
+    claimed.update({query: (job_id, True) for query, job_id in in_flight.items()})
+    new = [(query, job_id) for query, (job_id, attached) in claimed.items() if not attached]
+    if new:
+        try:
+            queues[batch.priority].enqueue_many([
+                Queue.prepare_data(PROCESS_QUERY, (query, batch.stream), ttl=JOB_TTL[batch.priority], job_id=job_id)
+                for query, job_id in new
+            ])
+        except Exception:
+            for query, job_id in new:
+                single_flight.release(query, batch.priority, job_id, batch.stream)
+            raise
+    coalesced = len(batch.queries) - len(new)
+    if coalesced:
+        increment(redis_connection, "rag_queue_coalesced_total", batch.priority, coalesced)
+    # in request order, duplicates get the same job id
+    return {"status": "queued", "job_ids": [claimed[query][0] for query in batch.queries], "coalesced": coalesced}
+
 @app.get("/job-status")
-def get_result(job_id: str = Query(..., description="Job ID")):
-    job = queue.fetch_job(job_id=job_id)
-    result = job.return_value()
+async def get_result(
+    job_id: str = Query(..., description="Job ID"),
+    wait: float = Query(0, ge=0, le=MAX_WAIT, description="long-poll: seconds to wait for the job to finish"),
+):
+    if not await job_exists(job_id):
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+
+    result = await latest_result(job_id)
+    if result is None and wait:
+        # long-poll - the request hangs until the worker writes the result (or wait runs out)
+        result = await wait_for_result(job_id, wait)
+
+    return result_payload(job_id, result, status=await job_status(job_id))
+
+@app.post("/jobs/status")
+async def get_results(request: JobsStatus):
+    # same payload as /job-status for every job (in request order), unknown ids come back as "not_found"
+    return {"jobs": await jobs_payloads(request.job_ids)}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    if not await job_exists(job_id):
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+
+    async def events():
+        yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': await job_status(job_id)})}\n\n"
+        # token events only show up for jobs enqueued with stream=true, the result event always comes last
+        async for kind, value in iter_job_events(job_id, SSE_PING):
+            if kind == "token":
+                yield f"event: token\ndata: {json.dumps({'delta': value})}\n\n"
+            elif kind == "result":
+                yield f"event: result\ndata: {json.dumps(result_payload(job_id, value))}\n\n"
+                return
+            elif not await job_exists(job_id):  # expired / deleted while we were waiting
+                yield f"event: error\ndata: {json.dumps({'job_id': job_id, 'error': 'job not found'})}\n\n"
+                return
+            else:
+                yield ": ping\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/ingest")
+def ingest(request: IngestRequest):
+    # the plan job fans out into page range jobs on the workers (queues/ingest.py), its id is the ingest id
+    ingest_id = str(uuid.uuid4())
+    ingest_progress.start(ingest_id, request.paths)
+    ingest_queue.enqueue(PLAN_INGEST, request.paths, request.pages_per_task, job_id=ingest_id, result_ttl=24 * 3600)
+    return {"status": "queued", "ingest_id": ingest_id}
+
+@app.get("/ingest/{ingest_id}")
+def ingest_status(ingest_id: str):
+    # pages done / chunks embedded / failures so far, plus pages/sec and an eta while it runs
+    status = ingest_progress.get(ingest_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"ingest {ingest_id} not found")
+    return status
 
-    return {"result": result}
+@app.get("/metrics")
+async def metrics():
+    # prometheus scrape target - per stage histograms written by every worker, plus the queue depths
+    depths = {name: await async_redis.llen(queue.key) for name, queue in queues.items()}
+    return PlainTextResponse(await export(async_redis, depths), media_type=CONTENT_TYPE)
 
-# rq worker -w rq.worker.SimpleWorker - command from root repo dir to start worker
\ No newline at end of file
+# rq worker high default low ingest -w rq.worker.SimpleWorker - command from root repo dir to start worker (queues in priority order)
+# python -m rag_queue.queues.prefork --workers 4 - N workers that share one loaded model (see queues/prefork.py)
+# curl "localhost:8000/job-status?job_id=<id>&wait=30" - long-poll, returns as soon as the job is done
+# curl -N localhost:8000/jobs/<id>/events - sse stream, pushes the result when the job finishes
+# curl -X POST "localhost:8000/chat?query=...&stream=true" - the events stream also relays the answer token by token
+# curl -X POST localhost:8000/chat/batch -H "Content-Type: application/json" -d '{"queries": ["...", "..."]}' - one pipelined enqueue
+# curl -X POST localhost:8000/jobs/status -H "Content-Type: application/json" -d '{"job_ids": ["<id>", "<id>"]}'
+# curl localhost:8000/metrics - embed / search / prompt / llm / job latency histograms + queue wait, for prometheus
+# curl -X POST localhost:8000/ingest -H "Content-Type: application/json" -d '{"paths": ["RAG/"]}' - index pdfs on the workers
+# curl localhost:8000/ingest/<ingest_id> - pages done, chunks embedded, failures
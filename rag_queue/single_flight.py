@@ -0,0 +1,106 @@
+import hashlib
+import uuid
+
+from redis.exceptions import WatchError
+
+from .cache.answer_cache import normalize_query
+
+'''
+single-flight for /chat - identical queries that are queued or running at the same time share one job.
+
+when a question trends, the same query arrives hundreds of times within seconds - before the first
+answer is even in the answer cache. without this, every copy is its own process_query job with its
+own retrieval and llm call.
+
+redis layout: rag:inflight:{priority}:{sha256 of the normalized query}[:stream] -> job id of the job answering it
+- the first request claims the key (SET NX) and enqueues the job under that id
+- every identical request finds the key and gets the same job id back, so it long-polls /
+  streams the one job and gets the same result
+- the worker deletes the key when the job ends (release), only if it still points at its own job
+
+keys are per priority, and a request also attaches to a job of a higher priority (never a lower
+one - an interactive user shouldn't end up waiting behind bulk traffic). stream=true jobs get their
+own keys: a streaming request only attaches to a job that publishes its tokens, a plain request
+attaches to either (it only needs the result). they expire together with
+the job's queue ttl, so a job dropped from the queue doesn't leave a key behind; the worker
+extends it when the job starts (refresh) to cover the time it runs.
+'''
+
+RUNNING_TTL = 600  # seconds a started job keeps its key, in case the worker dies without releasing it
+
+
+class SingleFlight:
+    def __init__(self, connection, priorities, prefix="rag:inflight"):
+        self.connection = connection
+        self.priorities = list(priorities)  # highest first
+        self.prefix = prefix
+
+    def key(self, query, priority, stream=False):
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{priority}:{digest}" + (":stream" if stream else "")
+
+    def eligible(self, priority, stream):
+        # (priority, stream) of the jobs a request may attach to
+        names = self.priorities[:self.priorities.index(priority) + 1]
+        return [(name, flag) for name in names for flag in ((True,) if stream else (False, True))]
+
+    def lookup_many(self, queries, priority, stream=False):
+        # -> {query: job_id} for the queries already queued / running at this or a higher priority. 1 round trip
+        queries = list(dict.fromkeys(queries))
+        eligible = self.eligible(priority, stream)
+        pipeline = self.connection.pipeline(transaction=False)
+        for query in queries:
+            for name, flag in eligible:
+                pipeline.get(self.key(query, name, flag))
+        replies = iter(pipeline.execute())
+        found = {}
+        for query in queries:
+            job_id = next((reply for reply in [next(replies) for _ in eligible] if reply), None)
+            if job_id:
+                found[query] = job_id.decode()
+        return found
+
+    def lookup(self, query, priority, stream=False):
+        return self.lookup_many([query], priority, stream).get(query)
+
+    def claim_many(self, queries, priority, ttl, stream=False):
+        # -> {query: (job_id, attached)}. attached=False means the caller has to enqueue the job under job_id
+        queries = list(dict.fromkeys(queries))  # duplicates inside one batch share a job too
+        claimed = {query: (job_id, True) for query, job_id in self.lookup_many(queries, priority, stream).items()}
+        free = [query for query in queries if query not in claimed]
+        if not free:
+            return claimed
+
+        # 1 more for the rest - claim them, the ones another request claimed in the meantime attach to it
+        new_ids = {query: str(uuid.uuid4()) for query in free}
+        pipeline = self.connection.pipeline(transaction=False)
+        for query in free:
+            pipeline.set(self.key(query, priority, stream), new_ids[query], nx=True, ex=ttl)
+            pipeline.get(self.key(query, priority, stream))
+        replies = pipeline.execute()
+        for query, won, current in zip(free, replies[::2], replies[1::2]):
+            if won or current is None:  # None - claimed and released already, just run it again
+                claimed[query] = (new_ids[query], False)
+            else:
+                claimed[query] = (current.decode(), True)
+        return claimed
+
+    def claim(self, query, priority, ttl, stream=False):
+        return self.claim_many([query], priority, ttl, stream)[query]
+
+    def refresh(self, query, priority, stream=False, ttl=RUNNING_TTL):
+        self.connection.expire(self.key(query, priority, stream), ttl)
+
+    def release(self, query, priority, job_id, stream=False):
+        key = self.key(query, priority, stream)
+        with self.connection.pipeline() as pipeline:
+            try:
+                pipeline.watch(key)
+                current = pipeline.get(key)
+                if current is None or current.decode() != job_id:
+                    return  # expired and claimed by a newer job, that one is not ours to delete
+                pipeline.multi()
+                pipeline.delete(key)
+                pipeline.execute()
+            except WatchError:
+                pass
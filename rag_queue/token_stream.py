@@ -0,0 +1,26 @@
+'''
+per-job token streams, so the user sees the answer while it's being generated.
+
+the worker appends every token delta from the llm to a redis stream (rag:tokens:<job_id>),
+and the server relays the stream to the client over sse (/jobs/<job_id>/events).
+the full answer is still the job's return value, so /job-status keeps working as before.
+'''
+
+STREAM_TTL = 3600  # seconds the deltas are kept around after the last write
+
+
+def token_stream_key(job_id):
+    return f"rag:tokens:{job_id}"
+
+
+class TokenStream:
+    def __init__(self, connection, job_id, ttl=STREAM_TTL):
+        self.connection = connection
+        self.key = token_stream_key(job_id)
+        self.ttl = ttl
+
+    def write(self, delta):
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.xadd(self.key, {"delta": delta})
+        pipeline.expire(self.key, self.ttl)
+        pipeline.execute()
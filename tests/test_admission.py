@@ -0,0 +1,62 @@
+import fakeredis
+import pytest
+from rq import Queue
+from rq.job import Job
+from rq.worker_registration import WORKERS_BY_QUEUE_KEY
+
+from rag_queue.admission import JOB_TTL, AdmissionController, Overloaded
+from rag_queue.client.rq_client import PROCESS_QUERY, QUEUE_NAMES
+from rag_queue.metrics import RECENT_JOBS_KEY
+
+
+@pytest.fixture
+def connection():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def admission(connection):
+    queues = {name: Queue(name, connection=connection) for name in QUEUE_NAMES}
+    connection.rpush(RECENT_JOBS_KEY, 2.0, 4.0)  # 3s per job
+    for name in QUEUE_NAMES:
+        connection.sadd(WORKERS_BY_QUEUE_KEY % name, "worker-1", "worker-2")
+    return AdmissionController(connection, queues, max_wait={"high": 15, "default": 60, "low": 600})
+
+
+def fill(connection, priority, jobs):
+    queue = Queue(priority, connection=connection)
+    return [queue.enqueue(PROCESS_QUERY, f"query {index}", False, ttl=JOB_TTL[priority]) for index in range(jobs)]
+
+
+def test_wait_counts_work_at_the_same_or_a_higher_priority(connection, admission):
+    fill(connection, "high", 2)
+    fill(connection, "low", 20)
+    assert admission.estimate_wait("high") == 3 * 3.0 / 2
+    assert admission.estimate_wait("default", count=4) == 6 * 3.0 / 2
+    assert admission.estimate_wait("low") == 23 * 3.0 / 2
+
+
+def test_admit_sheds_the_low_queue_first(connection, admission):
+    fill(connection, "low", 400)
+    assert admission.admit("high") == 1.5  # interactive users don't queue behind bulk work
+
+    with pytest.raises(Overloaded) as overloaded:
+        admission.admit("low")
+    assert overloaded.value.priority == "low" and overloaded.value.retry_after >= 1
+    admission.max_wait["low"] = 10**6
+    assert admission.admit("low") > 600
+    admission.max_depth = 400
+    with pytest.raises(Overloaded):
+        admission.admit("low")  # too deep, whatever the estimate says
+
+
+def test_expired_jobs_are_not_counted(connection, admission):
+    expired = fill(connection, "default", 5)
+    fill(connection, "default", 2)
+    # what the job ttl does to a job nobody picked up in time - its key is gone, its id is still queued
+    connection.delete(*[Job.key_for(job.id) for job in expired])
+    assert connection.llen("rq:queue:default") == 7
+
+    depths, _, _ = admission.snapshot()
+    assert depths["default"] == 2 and connection.llen("rq:queue:default") == 2
+    assert admission.estimate_wait("default") == 3 * 3.0 / 2
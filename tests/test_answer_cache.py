@@ -0,0 +1,45 @@
+import fakeredis
+
+from rag_queue.cache.answer_cache import AnswerCache, bump_generation
+from rag_queue.ingest_progress import IngestProgress
+
+
+def make_cache(connection, **kwargs):
+    kwargs.setdefault("generation_check", 0)  # re-read the generation on every lookup
+    return AnswerCache(connection, **kwargs)
+
+
+def test_exact_and_semantic_hits():
+    cache = make_cache(fakeredis.FakeRedis())
+    cache.set("What is Node.js?", [1.0, 0.0], "a runtime")
+
+    assert cache.get_exact("what is node.js") == "a runtime"
+    assert cache.get_similar([0.99, 0.01]) == "a runtime"
+    assert cache.get_similar([0.0, 1.0]) is None
+
+
+def test_collections_and_stores_do_not_share_answers():
+    connection = fakeredis.FakeRedis()
+    make_cache(connection, collection="docs").set("q", [1.0, 0.0], "from docs")
+
+    for other in (make_cache(connection, collection="papers"), make_cache(connection, collection="docs", store="local")):
+        assert other.get_exact("q") is None
+        assert other.get_similar([1.0, 0.0]) is None
+
+
+def test_finished_ingestion_starts_the_cache_over():
+    connection = fakeredis.FakeRedis()
+    cache = make_cache(connection, collection="docs")
+    cache.set("q", [1.0, 0.0], "old corpus")
+
+    progress = IngestProgress(connection)
+    progress.start("ingest", ["docs/"])
+    progress.planned("ingest", files=1, pages=2, tasks=2)
+    assert not progress.task_done("ingest", "task-0", pages=1, chunks=3)
+    assert progress.task_failed("ingest", "task-1", "a.pdf", 1, 2, ValueError("broken"))
+    assert not progress.task_done("ingest", "task-0", pages=1, chunks=3)  # a rerun doesn't finish it twice
+    bump_generation(connection, "docs")
+
+    assert cache.get_exact("q") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+    assert make_cache(connection, collection="papers", generation_check=60).scope().endswith(":0")
@@ -0,0 +1,154 @@
+import multiprocessing
+import sys
+import threading
+import time
+import types
+
+import fakeredis
+import pytest
+from redis import Redis
+from rq import Queue, get_current_job
+
+import rag_queue.queues
+from rag_queue.client.rq_client import PROCESS_QUERY, QUEUE_NAMES
+from rag_queue.queues.batch_worker import BatchingWorker
+
+
+@pytest.fixture
+def connection():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def prefetches(monkeypatch):
+    # stands in for queues/worker.py, so no model / qdrant is loaded - records every prefetch batch
+    batches = []
+    fake = types.SimpleNamespace(
+        prefetch_retrieval=lambda connection, queries: batches.append(list(queries.values())),
+        prefetch_failed=lambda connection, job_ids: None,
+    )
+    monkeypatch.setitem(sys.modules, "rag_queue.queues.worker", fake)
+    monkeypatch.setattr(rag_queue.queues, "worker", fake, raising=False)
+    return batches
+
+
+def make_worker(connection, name):
+    queues = [Queue(queue_name, connection=connection) for queue_name in QUEUE_NAMES]
+    return BatchingWorker(queues, name=name, connection=connection, batch_size=8, batch_wait_ms=0)
+
+
+def enqueue(connection, priority, query):
+    return Queue(priority, connection=connection).enqueue(PROCESS_QUERY, query, False)
+
+
+def test_high_job_is_not_delayed_behind_a_low_batch(connection, prefetches):
+    for index in range(5):
+        enqueue(connection, "low", f"low {index}")
+    worker = make_worker(connection, "w1")
+
+    job, queue = worker.dequeue_job_and_maintain_ttl(None)
+    assert (queue.name, job.args[0]) == ("low", "low 0")
+    assert prefetches == [["low 0", "low 1", "low 2", "low 3", "low 4"]]
+
+    high = enqueue(connection, "high", "interactive")
+    job, queue = worker.dequeue_job_and_maintain_ttl(None)
+    assert (queue.name, job.id) == ("high", high.id)
+
+
+def test_peeked_jobs_stay_queued(connection, prefetches):
+    for index in range(5):
+        enqueue(connection, "low", f"low {index}")
+    make_worker(connection, "w1").dequeue_job_and_maintain_ttl(None)
+
+    # nothing is held in the worker's memory - a crash now loses nothing, and admission still counts them
+    low = Queue("low", connection=connection)
+    assert low.count == 4
+
+    # a second worker pops the next one, the rest were already claimed for prefetching by the first
+    job, _ = make_worker(connection, "w2").dequeue_job_and_maintain_ttl(None)
+    assert job.args[0] == "low 1"
+    assert len(prefetches) == 1
+    assert low.count == 3
+
+
+def test_only_the_popped_jobs_queue_is_peeked(connection, prefetches):
+    enqueue(connection, "high", "interactive")
+    for index in range(3):
+        enqueue(connection, "low", f"low {index}")
+
+    job, queue = make_worker(connection, "w1").dequeue_job_and_maintain_ttl(None)
+    assert queue.name == "high"
+    assert prefetches == []  # nothing else queued on high, so nothing to batch with
+
+
+class RecordingModel:
+    # counts every text embedded, in redis - the workers are separate processes
+    def __init__(self, connection):
+        self.connection = connection
+
+    def embed_documents(self, texts):
+        time.sleep(0.2)  # slow enough that the other worker pops a job of the batch while it's embedded
+        self.connection.rpush("embedded", *texts)
+        self.connection.rpush("batches", len(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def fake_process_query(query, stream=False):
+    from rag_queue.queues import worker
+
+    job = get_current_job()
+    embedding, _, _ = worker.take_prefetched(job)
+    if embedding is None:
+        embedding = worker.embedding_model.embed_query(query)
+    job.connection.rpush("answered", f"{query}={embedding[0]:.0f}")
+    job.connection.sadd("workers", job.worker_name)
+    time.sleep(0.05)  # the llm call - keeps the first worker from running the whole burst alone
+
+
+def run_worker(port):
+    connection = Redis(port=port)
+    from rag_queue.queues import worker
+
+    worker.embedding_model = RecordingModel(connection)
+    queues = [Queue(queue_name, connection=connection) for queue_name in QUEUE_NAMES]
+    BatchingWorker(queues, connection=connection, batch_size=8, batch_wait_ms=0).work(burst=True)
+
+
+def test_two_workers_embed_a_burst_exactly_once(monkeypatch):
+    from rag_queue.queues import worker
+
+    monkeypatch.setattr(worker, "init", lambda: None)
+    monkeypatch.setattr(worker, "process_query", fake_process_query)
+    monkeypatch.setattr(worker, "hybrid_search", lambda store, index, queries, embeddings, k: [[] for _ in queries])
+    monkeypatch.setattr(worker, "answer_cache", types.SimpleNamespace(contains=lambda query: False))
+
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    try:
+        connection = Redis(port=port)
+        queries = [f"query {index:02d}" for index in range(6)]
+        for query in queries:
+            Queue("default", connection=connection).enqueue(PROCESS_QUERY, query, False)
+
+        # forked, so the workers see the patched worker module
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=run_worker, args=(port,)) for _ in range(2)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join(30)
+            assert process.exitcode == 0
+
+        answered = sorted(answer.decode() for answer in connection.lrange("answered", 0, -1))
+        assert answered == [f"{query}={len(query)}" for query in queries]
+        embedded = sorted(text.decode() for text in connection.lrange("embedded", 0, -1))
+        assert embedded == queries  # every query of the burst embedded once, by whichever worker claimed it
+        assert max(int(size) for size in connection.lrange("batches", 0, -1)) > 1
+        assert connection.scard("workers") == 2  # both took jobs of the batch
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,53 @@
+import pytest
+from langchain_core.documents import Document
+
+import RAG.context as context
+from RAG.context import build_context, merge_chunks
+
+
+class CharEncoding:
+    # one token per character - exact counts, no tiktoken download
+    def encode(self, text):
+        return [ord(char) for char in text]
+
+    def decode(self, tokens):
+        return "".join(chr(token) for token in tokens)
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    monkeypatch.setattr(context, "encoding", CharEncoding)
+
+
+def chunk(text, page=1, start_index=0, source="node.pdf"):
+    return Document(page_content=text, metadata={"source": source, "page": page, "page_label": str(page + 1), "start_index": start_index})
+
+
+def test_overlapping_chunks_are_merged_in_reading_order():
+    first = "the event loop runs callbacks. timers fire after the poll phase is done."
+    second = "timers fire after the poll phase is done. setImmediate runs in the check phase."
+    # retrieved in rank order, the second half of the page first
+    packed = build_context([chunk(second, start_index=42), chunk(first), chunk(first)], max_tokens=10_000)
+
+    merged = "the event loop runs callbacks. timers fire after the poll phase is done. setImmediate runs in the check phase."
+    assert packed.count("timers fire") == 1 and f"Page Content: {merged}]" in packed
+    assert merge_chunks(["short", "other text without any overlap"]) == "short\nother text without any overlap"
+
+
+def test_budget_is_a_hard_limit():
+    pages = [chunk(f"page {page} " + "x" * 300, page=page) for page in range(5)]
+    full = build_context(pages, max_tokens=10_000)
+    assert all(f"page {page} " in full for page in range(5))
+
+    budget = 2 * len(build_context(pages[:1])) + len(context.SEPARATOR) * 2 + 150
+    packed = build_context(pages, max_tokens=budget)
+    assert len(packed) <= budget
+    assert "page 0 " in packed and "page 1 " in packed and "page 3 " not in packed
+    assert "page 2 " in packed and packed.count("x") < 700  # the page that didn't fit is cut, not dropped
+
+
+def test_a_cut_too_small_to_be_useful_is_dropped():
+    pages = [chunk("a" * 300, page=0), chunk("b" * 300, page=1)]
+    one_page = len(build_context(pages[:1], max_tokens=10_000))
+    packed = build_context(pages, max_tokens=one_page + context.MIN_PARTIAL_TOKENS)  # room for < MIN_PARTIAL_TOKENS chars
+    assert "b" * 10 not in packed and "a" * 300 in packed
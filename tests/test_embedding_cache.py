@@ -0,0 +1,30 @@
+import sqlite3
+
+from RAG.embeddings import CachedEmbeddings
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def last_used(path, cache, text):
+    return sqlite3.connect(path).execute("SELECT last_used FROM embeddings WHERE key = ?", (cache.key(text),)).fetchone()[0]
+
+
+def test_disk_hits_are_touched_in_bulk(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    model = CountingModel()
+    cache = CachedEmbeddings(model, "model", path=path, memory_size=0)
+    cache.embed_documents(["a", "b"])
+    written = last_used(path, cache, "a")
+
+    assert cache.embed_documents(["a"]) == [[1.0, 1.0]] and model.calls == 2
+    assert last_used(path, cache, "a") == written  # a read is not a write anymore
+
+    cache.embed_documents([str(index) for index in range(1000)])  # the eviction pass flushes the touches
+    assert last_used(path, cache, "a") > written
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import AiAgents.engine as engine
+from AiAgents.engine import HistoryPolicy, count_tokens
+
+
+class CharEncoding:
+    def encode(self, text):
+        return list(text)
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    monkeypatch.setattr(engine, "encoding", CharEncoding)
+
+
+HEAD = [{"role": "system", "content": "you are an agent"}, {"role": "user", "content": "weather in goa?"}]
+
+
+def plan(number):
+    return {"role": "assistant", "content": json.dumps({"STEP": "PLAN", "CONTENT": f"step {number} " + "thinking " * 20})}
+
+
+def summary(messages):
+    return [message["content"] for message in messages if message["content"].startswith("summary of")]
+
+
+def test_everything_verbatim_while_it_fits():
+    steps = [plan(number) for number in range(3)]
+    assert HistoryPolicy(max_history_tokens=10_000).build(HEAD, steps) == HEAD + steps
+
+
+def test_older_steps_are_summarised():
+    steps = [plan(number) for number in range(10)]
+    messages = HistoryPolicy(max_history_tokens=2_000, keep_recent=3).build(HEAD, steps)
+
+    assert messages[:2] == HEAD and messages[-3:] == steps[-3:]
+    [text] = summary(messages)
+    assert text.count("\n- PLAN: step") == 7 and "step 0" in text
+    assert count_tokens(messages) <= 2_000
+
+
+def test_oldest_summary_lines_then_recent_messages_go_first():
+    steps = [plan(number) for number in range(10)]
+    policy = HistoryPolicy(keep_recent=3)
+    policy.max_history_tokens = count_tokens(HEAD + steps[-3:]) + 400  # room for a few summary lines only
+    messages = policy.build(HEAD, steps)
+    [text] = summary(messages)
+    assert "step 0" not in text and "step 6" in text and messages[-3:] == steps[-3:]
+
+    policy.max_history_tokens = count_tokens(HEAD + steps[-1:]) + 10  # only the newest step still fits
+    messages = policy.build(HEAD, steps)
+    assert messages == HEAD + steps[-1:]
@@ -0,0 +1,39 @@
+import types
+from pathlib import Path
+
+import fakeredis
+import pytest
+from rq import Queue
+
+from rag_queue.ingest_progress import IngestProgress
+from rag_queue.queues import ingest
+
+CORPUS = Path(__file__).parent.parent / "RAG"
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    connection = fakeredis.FakeRedis()
+    progress = IngestProgress(connection)
+    monkeypatch.setattr(ingest, "progress", progress)
+    monkeypatch.setattr(ingest, "ingest_queue", Queue("ingest", connection=connection))
+    monkeypatch.setattr(ingest, "get_current_job", lambda: types.SimpleNamespace(id="ingest-1"))
+    progress.start("ingest-1", [])
+    return progress
+
+
+def test_path_without_pdfs_fails_the_plan(progress, tmp_path):
+    with pytest.raises(ValueError, match="no pdfs found"):
+        ingest.plan_ingest([str(CORPUS), str(tmp_path / "typo")])
+
+    status = progress.get("ingest-1")
+    assert status["state"] == "failed" and "typo" in status["error"]
+    assert ingest.ingest_queue.count == 0  # nothing was enqueued for the good path either
+
+
+def test_plan_fans_out_page_ranges(progress):
+    planned = ingest.plan_ingest([str(CORPUS)], pages_per_task=50)
+
+    status = progress.get("ingest-1")
+    assert status["state"] == "running" and status["tasks_total"] == planned["tasks"] > 0
+    assert ingest.ingest_queue.count == planned["tasks"]
@@ -0,0 +1,104 @@
+import functools
+
+import RAG.vector_stores as vector_stores
+from RAG.ingest import IngestionEngine
+from RAG.lexical import LexicalIndex
+from RAG.local_store import LocalVectorStore
+from RAG.splitter import CharacterSplitter
+
+
+class LengthEmbeddings:
+    def embed_documents(self, texts):
+        self.embedded = getattr(self, "embedded", 0) + len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def make_pdf(path, pages):
+    # smallest pdf pypdf extracts text from - one line of helvetica per page
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def test_search_delete_and_merge(tmp_path):
+    index = LexicalIndex("test", path=tmp_path, max_segments=2)
+    for number in range(3):  # 3 flushes -> merged back into one segment
+        index.add([f"doc {number}"], [f"fs.readFileSync example {number}"])
+        index.flush()
+    assert len(index.segments) == 1
+    index.add(["doc 3"], ["process.nextTick defers a callback"])
+    index.delete(["doc 0"])
+    index.flush()
+
+    assert sorted(id_ for id_, _ in index.search("readfilesync")) == ["doc 1", "doc 2"]
+    assert index.search("process.nextTick")[0][0] == "doc 3"
+    assert [id_ for id_, _ in LexicalIndex("test", path=tmp_path).search("nexttick")] == ["doc 3"]
+
+
+def test_two_writers_never_share_a_segment(tmp_path):
+    first, second = LexicalIndex("test", path=tmp_path), LexicalIndex("test", path=tmp_path)
+    first.add(["a"], ["alpha"])
+    second.add(["b"], ["beta"])
+    first.flush()
+    second.flush()  # same next_segment number as the first writer, still its own dir
+
+    segments = sorted(path.name for path in (tmp_path / "test.lexical").iterdir() if path.is_dir())
+    assert len(segments) == 2 and not any(name.startswith(".tmp") for name in segments)
+    assert [id_ for id_, _ in LexicalIndex("test", path=tmp_path).search("beta")] == ["b"]  # the last flush wins
+
+
+def test_reader_picks_up_an_index_built_after_it_started(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_stores, "LexicalIndex", functools.partial(LexicalIndex, path=tmp_path))
+    monkeypatch.setattr(vector_stores, "HYBRID_SEARCH", True)
+    reader = vector_stores.connect_lexical_index("test")
+    assert reader is not None and reader.search_many(["alpha"]) == [[]]
+
+    writer = LexicalIndex("test", path=tmp_path)
+    writer.add(["a"], ["alpha"])
+    writer.flush()
+    assert [[id_ for id_, _ in hits] for hits in reader.search_many(["alpha"])] == [["a"]]
+
+
+def test_incremental_run_backfills_a_missing_bm25_index(tmp_path):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    make_pdf(pdfs / "node.pdf", ["fs.readFileSync reads a whole file", "process.nextTick defers a callback"])
+    embeddings = LengthEmbeddings()
+
+    def run(lexical_index):
+        engine = IngestionEngine(
+            embeddings, collection_name="test", parse_workers=1, splitter=CharacterSplitter(),
+            incremental=True, manifest_path=tmp_path / "manifest.json",
+            local_store=LocalVectorStore(embeddings, collection_name="test", path=tmp_path),
+            lexical_index=lexical_index,
+        )
+        return engine.ingest(pdfs)
+
+    run(None)  # first run without the bm25 index (--no-lexical)
+    assert embeddings.embedded == 2
+
+    stats = run(LexicalIndex("test", path=tmp_path))
+    assert embeddings.embedded == 2 and stats.unchanged_chunks == 2  # nothing embedded again
+    index = LexicalIndex("test", path=tmp_path)
+    assert index.docs == 2 and index.search("nexttick")
+
+    stats = run(LexicalIndex("test", path=tmp_path))  # filled now, unchanged files are skipped again
+    assert stats.skipped_files == 1 and LexicalIndex("test", path=tmp_path).docs == 2
@@ -0,0 +1,87 @@
+import itertools
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+from common import llm_cache
+from common.llm_cache import CacheMiss, ResponseCache, request_key
+from common.llm_client import PooledLLMClient
+
+MESSAGES = [{"role": "user", "content": "what is node.js?"}]
+
+
+def completion(text):
+    return ChatCompletion.model_validate({
+        "id": "fake", "object": "chat.completion", "created": 0, "model": "fake",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+    })
+
+
+class Provider:
+    # stands in for openai.chat.completions.create, counts the calls that got through the cache
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        return completion(f"answer {self.calls}")
+
+
+def make_client(tmp_path, mode):
+    return PooledLLMClient(api_key="fake", base_url="http://localhost:1/v1/", max_retries=0,
+                           cache=ResponseCache(tmp_path / "llm.sqlite3", mode=mode))
+
+
+def answer(client, provider, **kwargs):
+    return client.cached_call("create", provider, {"model": "fake", "messages": MESSAGES, **kwargs}).choices[0].message.content
+
+
+def test_off_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    assert ResponseCache.from_env() is None
+    with pytest.raises(ValueError):
+        ResponseCache(mode="sometimes")
+
+
+def test_on_reads_through(tmp_path):
+    client, provider = make_client(tmp_path, "on"), Provider()
+    assert answer(client, provider) == "answer 1"
+    assert answer(client, provider) == "answer 1" and provider.calls == 1
+    assert answer(client, provider, temperature=0.2) == "answer 2"  # another request, another entry
+    assert client.cache.stats()["hits"] == 1
+
+
+def test_record_then_replay(tmp_path):
+    recorder, provider = make_client(tmp_path, "record"), Provider()
+    answer(recorder, provider)
+    assert answer(recorder, provider) == "answer 2" and provider.calls == 2  # always calls, overwrites
+
+    replay = make_client(tmp_path, "replay")
+    assert answer(replay, provider) == "answer 2" and provider.calls == 2
+    with pytest.raises(CacheMiss):
+        answer(replay, provider, temperature=0.2)
+    assert provider.calls == 2  # a replay miss never reaches the provider
+
+
+def test_request_key_is_canonical():
+    first = request_key("create", {"model": "fake", "messages": MESSAGES, "response_format": {"type": "json_object", "strict": True}})
+    second = request_key("create", {"response_format": {"strict": True, "type": "json_object"}, "messages": MESSAGES, "model": "fake"})
+    assert first == second
+    assert request_key("create", {"model": "fake", "timeout": 5}) == request_key("create", {"model": "fake"})  # transport only
+    assert request_key("create", {"model": "fake", "stream": True}) != request_key("create", {"model": "fake"})
+    assert request_key("parse", {"model": "fake"}) != request_key("create", {"model": "fake"})
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count()
+    monkeypatch.setattr(llm_cache.time, "time", lambda: next(clock))
+    cache = ResponseCache(tmp_path / "llm.sqlite3", max_bytes=20_000)
+    for index in range(100):  # ~40kb, the 100th write runs the eviction
+        if index == 99:
+            assert cache.get("key 0") is not None  # used recently -> kept
+        cache.set(f"key {index}", "create", {"text": f"{index:03d}" * 130})
+
+    (total,) = cache.conn.execute("SELECT SUM(size) FROM responses").fetchone()
+    assert total <= 20_000 * 0.9
+    assert cache.get("key 0") is not None and cache.get("key 99") is not None
+    assert cache.get("key 1") is None
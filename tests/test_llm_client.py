@@ -0,0 +1,118 @@
+import random
+import threading
+
+import httpx
+import pytest
+from openai import APIStatusError, RateLimitError
+
+from benchmarks.fake_llm import FakeLLMHandler, serve
+from common import llm_client
+from common.llm_client import PooledLLMClient
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def client(monkeypatch):
+    for name in ("LLM_RPM", "LLM_TPM", "LLM_CACHE"):
+        monkeypatch.delenv(name, raising=False)
+    return PooledLLMClient(api_key="fake", base_url="http://localhost:1/v1/", concurrency=1, backoff_cap=5.0)
+
+
+def test_rate_limits_are_off_unless_configured(client):
+    assert client.requests is None and client.tokens is None
+    assert PooledLLMClient(api_key="fake", rpm=120, tpm=1000).requests is not None
+
+
+def test_unread_stream_holds_no_slot(client):
+    streams = [FakeStream(["a", "b"]), FakeStream(["c"])]
+    first = client.call(lambda **kwargs: streams[0], {"stream": True})
+    # concurrency=1 - this used to block forever, the first stream held the only slot until gc
+    done = threading.Event()
+    threading.Thread(target=lambda: (client.call(lambda **kwargs: streams[1], {"stream": True}), done.set()), daemon=True).start()
+    assert done.wait(2)
+    assert list(first) == ["a", "b"] and streams[0].closed
+
+
+def test_retry_after_is_capped(client, monkeypatch):
+    slept = []
+    monkeypatch.setattr(llm_client.time, "sleep", slept.append)
+    response = httpx.Response(429, headers={"retry-after": "3600"}, request=httpx.Request("POST", "http://localhost:1/v1/"))
+    calls = iter([RateLimitError("slow down", response=response, body=None), "ok"])
+
+    def method(**kwargs):
+        result = next(calls)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert client.call(method, {}) == "ok"
+    assert slept and max(slept) <= 5.0
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    # benchmarks/fake_llm.py on an ephemeral port -> fake_llm(**settings) gives a client pointed at it
+    for name in ("LLM_RPM", "LLM_TPM", "LLM_CACHE"):
+        monkeypatch.delenv(name, raising=False)
+    servers = []
+
+    def start(concurrency=4, max_retries=5, **settings):
+        server = serve(port=0, latency_ms=5, jitter_ms=0, tokens_per_sec=1000, answer_tokens=12, **settings)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return PooledLLMClient(api_key="fake", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1/",
+                               concurrency=concurrency, max_retries=max_retries, backoff_base=0.01, backoff_cap=0.5)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def ask(client, question="what is node.js?", **kwargs):
+    return client.chat.completions.create(model="fake", messages=[{"role": "user", "content": question}], **kwargs)
+
+
+def test_errors_are_retried_until_they_give_up(fake_llm, monkeypatch):
+    slept = []
+    monkeypatch.setattr(llm_client.time, "sleep", slept.append)
+    client = fake_llm(error_rate=1.0, max_retries=2)
+    before = FakeLLMHandler.requests
+
+    with pytest.raises(APIStatusError) as error:
+        ask(client)
+    assert error.value.status_code in (429, 503)
+    assert FakeLLMHandler.requests - before == 3 and client.retries == 2
+    assert len(slept) == 2 and min(slept) >= 0.1  # the fake server's Retry-After: 0.1
+
+
+def test_overloaded_server_still_answers_every_call(fake_llm):
+    random.seed(7)  # the fake server draws its errors from the same random module
+    client = fake_llm(error_rate=0.5, max_retries=20)
+    answers = [ask(client, f"question {index}").choices[0].message.content for index in range(10)]
+    assert all(answer.startswith(f"fake answer to: question {index}") for index, answer in enumerate(answers))
+    assert client.retries > 0 and client.throttled <= client.retries
+
+
+def test_streaming_through_the_fake_server(fake_llm):
+    client = fake_llm(concurrency=1)
+    plain = ask(client).choices[0].message.content
+    streamed = "".join(chunk.choices[0].delta.content or "" for chunk in ask(client, stream=True) if chunk.choices)
+    assert streamed == plain
+
+    # a stream dropped halfway gives its slot (and connection) back, concurrency=1 would block otherwise
+    stream = ask(client, stream=True)
+    next(stream)
+    stream.close()
+    assert ask(client).choices[0].message.content == plain
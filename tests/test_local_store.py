@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from RAG.local_store import LocalVectorStore
+
+
+class AxisEmbeddings:
+    # "a" -> [1, 0, 0, 0], "b" -> [0, 1, 0, 0] ... so the nearest neighbour of a text is itself
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.full(4, 0.01, dtype=np.float32)
+        vector["abcd".index(text[0])] = 1.0
+        return vector.tolist()
+
+
+def make_store(tmp_path, **kwargs):
+    return LocalVectorStore(AxisEmbeddings(), collection_name="test", path=tmp_path, **kwargs)
+
+
+def ids_of(documents):
+    return [document.metadata["_id"] for document in documents]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = make_store(tmp_path)
+    store.add_texts(["a doc", "b doc", "c doc"], metadatas=[{"page": 1}, {"page": 2}, {"page": 3}], ids=["1", "2", "3"])
+    return store
+
+
+def test_search_returns_the_top_k(store):
+    documents = store.similarity_search("b query", k=2)
+    assert ids_of(documents)[0] == "2" and len(documents) == 2
+    assert documents[0].page_content == "b doc" and documents[0].metadata["page"] == 2
+    assert [ids_of(hits)[0] for hits in store.similarity_search_by_vectors(AxisEmbeddings().embed_documents(["c", "a"]), k=1)] == ["3", "1"]
+    assert len(store.similarity_search("a", k=10)) == 3  # k is capped at what's stored
+
+
+def test_delete_leaves_a_tombstone(store):
+    assert store.delete(["2"]) and not store.delete(["missing"])
+    assert store.count() == 2
+    assert "2" not in ids_of(store.similarity_search("b query", k=3))
+    assert store.get_by_ids(["1", "2"])[0].page_content == "a doc" and len(store.get_by_ids(["1", "2"])) == 1
+
+
+def test_re_upsert_overwrites_in_place(store):
+    store.add_texts(["d doc"], ids=["1"])
+    assert store.count() == 3 and store.rows == 3
+    assert ids_of(store.similarity_search("d query", k=1)) == ["1"]
+    assert store.get_by_ids(["1"])[0].page_content == "d doc"
+
+
+def test_reopened_from_disk(store, tmp_path):
+    store.delete(["3"])
+    store.add_texts(["d doc"], ids=["2"])
+
+    reopened = LocalVectorStore.from_existing_collection(AxisEmbeddings(), collection_name="test", path=tmp_path)
+    assert reopened.count() == 2
+    assert [document.page_content for document in reopened.get_by_ids(["1", "2", "3"])] == ["a doc", "d doc"]
+    assert ids_of(reopened.similarity_search("d query", k=1)) == ["2"]
+
+
+def test_missing_collection(tmp_path):
+    with pytest.raises(ValueError):
+        LocalVectorStore.from_existing_collection(AxisEmbeddings(), collection_name="nothing", path=tmp_path)
+
+
+@pytest.mark.parametrize("options", [{"dtype": "float16"}, {"quantization": "int8"}, {"quantization": "binary"}])
+def test_compact_layouts_find_the_same_neighbours(tmp_path, options):
+    store = make_store(tmp_path, **options)
+    store.add_texts(["a doc", "b doc", "c doc", "d doc"], ids=["1", "2", "3", "4"])
+    assert [ids_of(store.similarity_search(f"{letter} query", k=1)) for letter in "abcd"] == [["1"], ["2"], ["3"], ["4"]]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from RAG.quantization import BinaryQuantizer, ScalarQuantizer, make_quantizer, memory_report, recall_at_k
+
+
+@pytest.fixture
+def vectors():
+    vectors = np.random.default_rng(0).normal(size=(500, 64)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def top_k(scores, k):
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+
+def test_int8_round_trip(vectors):
+    quantizer = ScalarQuantizer.fit([vectors[:250], vectors[250:]])  # fitted block by block
+    codes = quantizer.encode(vectors)
+    assert codes.dtype == np.uint8 and codes.shape == vectors.shape
+
+    decoded = codes.astype(np.float32) * quantizer.scale + quantizer.low
+    assert np.abs(decoded - vectors).max() <= quantizer.scale.max() / 2 + 1e-6
+    # scoring straight on the codes is the dot product with the decoded vectors
+    queries = vectors[:5]
+    assert np.allclose(quantizer.scores(codes, queries), decoded @ queries.T, atol=1e-4)
+
+
+def test_binary_codes_keep_the_signs(vectors):
+    quantizer = make_quantizer("binary", [vectors])
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (500, 8)
+    assert np.array_equal(np.unpackbits(codes, axis=1).astype(bool), vectors > 0)
+    # a vector differs from itself in 0 bits - the best possible score
+    assert (np.argmax(quantizer.scores(codes, vectors[:10]), axis=0) == np.arange(10)).all()
+
+
+def test_recall_against_exact_search(vectors):
+    queries = vectors[:50]
+    exact = top_k(queries @ vectors.T, 10)
+    for quantizer, minimum in ((ScalarQuantizer.fit([vectors]), 0.9), (BinaryQuantizer(), 0.3)):
+        approximate = top_k(quantizer.scores(quantizer.encode(vectors), queries).T, 10)
+        assert minimum <= recall_at_k(exact, approximate) <= 1.0
+
+
+def test_recall_at_k_and_memory_report():
+    assert recall_at_k([[1, 2], [3, 4]], [[2, 1], [3, 5]]) == 0.75
+    assert recall_at_k([], []) == 1.0
+    assert memory_report(1000, 384, "binary")["saved_pct"] == 96.9
+    with pytest.raises(ValueError):
+        make_quantizer("pq", [])
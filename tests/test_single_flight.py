@@ -0,0 +1,79 @@
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from rq import Queue
+
+from rag_queue import server
+from rag_queue.admission import Overloaded
+from rag_queue.client.rq_client import QUEUE_NAMES
+from rag_queue.single_flight import SingleFlight
+
+
+@pytest.fixture
+def connection():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def single_flight(connection):
+    return SingleFlight(connection, QUEUE_NAMES)
+
+
+def test_stream_request_never_attaches_to_a_plain_job(single_flight):
+    plain, attached = single_flight.claim("what is node?", "high", 60)
+    assert not attached
+
+    streaming, attached = single_flight.claim("what is node?", "high", 60, stream=True)
+    assert not attached and streaming != plain
+    # a plain request only needs the result, a streaming job has it too
+    assert single_flight.lookup("what is node?", "high") in (plain, streaming)
+    single_flight.release("what is node?", "high", plain)
+    assert single_flight.lookup("what is node?", "high") == streaming
+
+
+class FullQueue:
+    def admit(self, priority, count=1):
+        raise Overloaded(priority, 999, 30)
+
+
+class EmptyQueue:
+    def admit(self, priority, count=1):
+        return 0.0
+
+
+class BrokenQueue:
+    def enqueue(self, *args, **kwargs):
+        raise ConnectionError("redis went away")
+
+    def enqueue_many(self, *args, **kwargs):
+        raise ConnectionError("redis went away")
+
+
+@pytest.fixture
+def api(monkeypatch, connection, single_flight):
+    monkeypatch.setattr(server, "redis_connection", connection)
+    monkeypatch.setattr(server, "single_flight", single_flight)
+    monkeypatch.setattr(server, "queues", {name: Queue(name, connection=connection) for name in QUEUE_NAMES})
+    monkeypatch.setattr(server, "admission", EmptyQueue())
+    return TestClient(server.app, raise_server_exceptions=False)
+
+
+def test_duplicates_attach_even_when_the_queue_is_full(api, monkeypatch, single_flight):
+    job_id, _ = single_flight.claim("what is node?", "high", 60)
+    monkeypatch.setattr(server, "admission", FullQueue())
+
+    response = api.post("/chat", params={"query": "What is Node?"})
+    assert response.status_code == 200 and f"job_id: {job_id}" in response.json()
+    assert api.post("/chat", params={"query": "something new"}).status_code == 429
+
+    response = api.post("/chat/batch", json={"queries": ["what is node?"], "priority": "high"})
+    assert response.status_code == 200 and response.json()["job_ids"] == [job_id]
+
+
+def test_failed_enqueue_releases_the_key(api, monkeypatch, single_flight):
+    monkeypatch.setattr(server, "queues", {name: BrokenQueue() for name in QUEUE_NAMES})
+
+    assert api.post("/chat", params={"query": "what is node?"}).status_code == 500
+    assert api.post("/chat/batch", json={"queries": ["a", "b"]}).status_code == 500
+    assert single_flight.lookup("what is node?", "high") is None
+    assert single_flight.lookup_many(["a", "b"], "low") == {}
@@ -0,0 +1,76 @@
+import re
+
+import pytest
+
+from RAG.splitter import TokenTextSplitter, sentence_spans
+
+
+class Encodings(dict):
+    def __init__(self, offsets, words):
+        super().__init__(offset_mapping=offsets)
+        self.words = words
+
+    def word_ids(self, index):
+        return self.words[index]
+
+
+class WordPieceTokenizer:
+    # whitespace words, every 4 characters of a word are one token ("##" pieces share the word id)
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True):
+        offsets, words = [], []
+        for text in texts:
+            text_offsets, text_words = [], []
+            for word, match in enumerate(re.finditer(r"\S+", text)):
+                for start in range(match.start(), match.end(), 4):
+                    text_offsets.append((start, min(start + 4, match.end())))
+                    text_words.append(word)
+            offsets.append(text_offsets)
+            words.append(text_words)
+        return Encodings(offsets, words)
+
+
+def tokens(text):
+    return len(WordPieceTokenizer()([text])["offset_mapping"][0])
+
+
+def splitter(chunk_tokens=20, overlap_tokens=6):
+    return TokenTextSplitter(chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, tokenizer=WordPieceTokenizer())
+
+
+TEXT = " ".join(f"Sentence {index} has a few words in it." for index in range(30)) + \
+    "\n\n" + " ".join(["supercalifragilistic"] * 12) + ". The end."
+
+
+def test_chunks_never_exceed_the_token_budget():
+    chunks = list(splitter().split_text(TEXT))
+    assert len(chunks) > 10
+    assert all(0 < tokens(chunk) <= 20 for chunk, _ in chunks)
+    # everything is covered, the 12 word sentence too (cut on word boundaries)
+    assert chunks[0][0].startswith("Sentence 0 ") and chunks[-1][0].endswith("The end.")
+    assert sum(chunk.count("supercalifragilistic") for chunk, _ in chunks) >= 12
+
+
+def test_start_index_slices_back_to_the_chunk():
+    text = "  " + TEXT  # leading whitespace isn't part of the first chunk
+    for chunk, start_index in splitter().split_text(text):
+        assert text[start_index:start_index + len(chunk)] == chunk
+        assert chunk == chunk.strip()
+
+
+def test_neighbouring_chunks_overlap():
+    # a sentence is 10 tokens - 10 tokens of overlap carry the last one into the next chunk
+    first, second = [chunk for chunk, _ in splitter(chunk_tokens=20, overlap_tokens=10).split_text(TEXT)][:2]
+    last_sentence = first[first.rfind("Sentence"):]
+    assert tokens(last_sentence) == 10 and second.startswith(last_sentence)
+    # with 6 it doesn't fit, the chunks just follow each other
+    first, second = [chunk for chunk, _ in splitter(chunk_tokens=20, overlap_tokens=6).split_text(TEXT)][:2]
+    assert first.endswith("Sentence 1 has a few words in it.") and second.startswith("Sentence 2 ")
+
+
+def test_pages_keep_their_page_numbers():
+    pages = [(0, "First page. It is short."), (1, ""), (2, "Third page.")]
+    assert [(page, chunk) for page, chunk, _ in splitter().split_pages(pages)] == \
+        [(0, "First page. It is short."), (2, "Third page.")]
+    assert list(sentence_spans("  One.  Two!\n\nThree  ")) == [(2, 6), (8, 12), (14, 19)]
+    with pytest.raises(ValueError):
+        splitter(chunk_tokens=10, overlap_tokens=10)
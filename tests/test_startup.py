@@ -0,0 +1,13 @@
+import os
+
+from benchmarks.startup import HEAVY_MODULES, measure_import
+
+# generous on purpose - a cold ci box is slower than a laptop, this only has to catch a model import
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 2000))
+
+
+def test_server_import_is_light():
+    # fresh interpreter, so nothing imported by the other tests counts
+    result = measure_import("rag_queue.server")
+    assert result["heavy"] == [], f"rag_queue.server imports {result['heavy']} - those belong in the worker ({HEAVY_MODULES})"
+    assert result["ms"] < IMPORT_BUDGET_MS, f"importing rag_queue.server took {result['ms']:.0f}ms"
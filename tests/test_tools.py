@@ -0,0 +1,87 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import AiAgents.tools as tools
+from AiAgents.tools import ToolRuntime, weather_runtime
+
+
+class WeatherStub(BaseHTTPRequestHandler):
+    # /<city>?format=... -> "Sunny +30°C" after DELAY seconds, /slow takes 2s, /broken is a 503
+    DELAY = 0.3
+    lock = threading.Lock()
+    requests, active, max_active = [], 0, 0
+
+    def do_GET(self):
+        city = self.path.split("?")[0].strip("/")
+        with self.lock:
+            WeatherStub.requests.append(city)
+            WeatherStub.active += 1
+            WeatherStub.max_active = max(WeatherStub.max_active, WeatherStub.active)
+        try:
+            time.sleep(2.0 if city == "slow" else self.DELAY)
+            status, body = (503, "down") if city == "broken" else (200, f"Sunny +30°C in {city}")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body.encode())))
+            self.end_headers()
+            self.wfile.write(body.encode())
+        finally:
+            with self.lock:
+                WeatherStub.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def weather_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WeatherStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    WeatherStub.requests, WeatherStub.active, WeatherStub.max_active = [], 0, 0
+    monkeypatch.setattr(tools, "WEATHER_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield WeatherStub
+    server.shutdown()
+    server.server_close()
+
+
+def test_failures_are_not_cached():
+    runtime = ToolRuntime()
+    answers = iter([RuntimeError("upstream 503"), "sunny"])
+
+    @runtime.tool(ttl=600)
+    def weather(city):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    try:
+        assert runtime.run("weather", "goa").startswith("weather failed")
+        assert runtime.run("weather", "goa") == "sunny"  # tried again, not the cached error
+        assert runtime.run("weather", "goa") == "sunny"  # now cached
+        assert runtime.cache_hits == 1
+    finally:
+        runtime.close()
+
+
+def test_get_weather_end_to_end(weather_server):
+    runtime = weather_runtime(ttl=600, timeout=1.0)
+    try:
+        started = time.perf_counter()
+        outputs = runtime.run_many([("get_weather", city) for city in ("Goa", "Delhi", "Pune", "slow", "broken")])
+        elapsed = time.perf_counter() - started
+
+        assert outputs[:3] == [f"The Weather in {city} is Sunny +30°C in {city.lower()}" for city in ("Goa", "Delhi", "Pune")]
+        assert outputs[3] == "get_weather timed out after 1.0s"
+        assert outputs[4].startswith("get_weather failed") and "503" in outputs[4]
+        # all at once on pooled connections - one 0.3s round + the timeout, not 5 calls in a row
+        assert weather_server.max_active == 5 and elapsed < 1.8
+
+        assert runtime.run("get_weather", "Goa") == outputs[0]
+        assert runtime.cache_hits == 1 and weather_server.requests.count("goa") == 1
+        assert runtime.run("get_weather", "broken").startswith("get_weather failed")  # errors aren't cached
+        assert weather_server.requests.count("broken") == 2
+    finally:
+        runtime.close()